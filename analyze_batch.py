@@ -0,0 +1,69 @@
+# analyze_batch.py
+#
+# Bulk analysis from the command line (same engine as POST /analyze/batch):
+#   python analyze_batch.py urls.jsonl -o results.jsonl --parallel 8
+# Each input line is {"input_type": "text" | "url" | "topic", "input_value": ...}
+# (an optional "id" is copied to the output). Results are written in input
+# order, one line per record; re-running the same command resumes after the
+# last complete output line.
+
+import os
+import sys
+import time
+import json
+import argparse
+import contextlib
+
+
+def completed_lines(path):
+    """Number of complete lines in an earlier output file; drops a trailing partial line."""
+    if not os.path.exists(path): return 0
+    with open(path, 'rb+') as f:
+        data = f.read()
+        complete = data.rfind(b'\n') + 1
+        if complete < len(data): f.truncate(complete) # Interrupted mid-write
+    return data[:complete].count(b'\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a JSONL file of {input_type, input_value} records.")
+    parser.add_argument("input", help="JSONL input file ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout, no resume)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("BATCH_MAX_PARALLEL", "8")), help="Records analyzed concurrently")
+    parser.add_argument("--offset", type=int, help="Skip this many input records (default: resume from --output)")
+    parser.add_argument("--no-resume", action="store_true", help="Start over, overwriting --output")
+    parser.add_argument("--deadline", type=float, default=0, help="Latency budget per record in seconds (0 = ANALYSIS_DEADLINE_SECONDS)")
+    parser.add_argument("--history", action="store_true", help="Also add successful results to the analysis history")
+    parser.add_argument("--progress-every", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.offset is not None: offset = args.offset
+    elif args.output and not args.no_resume: offset = completed_lines(args.output)
+    else: offset = 0
+    if offset: print(f"[+] Resuming at record {offset}", file=sys.stderr)
+
+    os.environ.setdefault("JOBS_ENABLED", "0") # No background workers in a one-off run
+    os.environ.setdefault("WATCH_ENABLED", "0")
+    os.environ.setdefault("SEARCH_PREFETCH_INTERVAL_MINUTES", "0")
+    with contextlib.redirect_stdout(sys.stderr): # App logs go to stderr, results to --output/stdout
+        import app
+        source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8')
+        mode = 'w' if args.no_resume or (args.offset is None and offset == 0) else 'a'
+        sink = open(args.output, mode, encoding='utf-8') if args.output else sys.__stdout__
+        start = time.time(); done = errors = 0
+        try:
+            for output in app.analyze_batch(source, offset=offset, parallel=args.parallel, save_history=args.history, deadline_seconds=args.deadline or None):
+                sink.write(json.dumps(output) + "\n"); sink.flush()
+                done += 1; errors += output["status"] == "error"
+                if args.progress_every and done % args.progress_every == 0:
+                    print(f"[+] {offset + done} records done ({done / (time.time() - start):.2f}/s, {errors} errors)")
+        except KeyboardInterrupt:
+            print(f"[!] Interrupted after record {offset + done - 1}; re-run to resume.")
+        finally:
+            if sink is not sys.__stdout__: sink.close()
+            if source is not sys.stdin: source.close()
+        print(f"[+] {done} records in {time.time() - start:.1f} seconds ({errors} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 # ----------------------------------------------------------------------------
 # IMPORTS (requests, os, json, datetime, time, statistics, traceback, re)
 # ----------------------------------------------------------------------------
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import os
 import json
 from datetime import datetime
@@ -10,9 +10,32 @@ import statistics
 import traceback
 import re # For keyword matching in credibility mapping
 import requests # For Hugging Face API calls
+import threading
+import functools
+import queue
+import copy
+import sqlite3
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Import web scraping functions
-from web_scraper.main import scrape_article_content, fetch_articles_for_topic
+from web_scraper.main import scrape_article_content, fetch_articles_for_topic, scrape_urls, search_article_urls, prefetch_searches, normalize_url, is_usable_content, page_cache, search_cache, scrape_flights, search_flights
+import web_scraper.main as web_scraper_main
+from pipeline.cache import TieredCache, make_cache_key, normalize_text
+from pipeline.backends import load_local_classifiers
+from pipeline.batching import MicroBatcher
+from pipeline.chunking import split_into_windows, select_windows, approx_token_count, select_informative_sentences
+from pipeline.history_store import HistoryStore
+from pipeline.jobs import JobQueue
+from pipeline.singleflight import SingleFlight
+from pipeline.resilience import CircuitBreaker, CircuitOpenError, RetryBudget
+from pipeline.deadline import DeadlineExceeded, deadline_scope, current_deadline, remaining_time, budget_timeout, submit_with_context, hedged_call
+from pipeline.batch import iter_batch_records, ordered_parallel_map
+from pipeline.dedup import MinHasher, SignatureIndex, cluster_near_duplicates
+from pipeline.json_stream import JSONObjectStream
+from pipeline.topic_watch import TopicAggregate, TopicWatchStore, TopicWatcher, content_fingerprint, is_valid_article
+from pipeline.replay import UpstreamReplay, LatencyModel, fixture_key, parse_upstream_settings
+from pipeline.metrics import REGISTRY, ANALYSES, CACHE_LOOKUPS, UPSTREAM_RETRIES, observe_upstream, observe_stage, stage_span, track_stage, trace_scope, current_trace_id, valid_trace_id, new_trace_id, install_trace_logging
 
 # Import Together AI client and load environment variables
 from together import Together
@@ -25,11 +48,44 @@ load_dotenv()
 together_api_key = os.getenv("TOGETHER_API_KEY")
 hf_api_key = os.getenv("HF_API_KEY")
 
-if not together_api_key or not hf_api_key:
+def env_int(name, default):
+    """Reads an integer setting from the environment, falling back to the default."""
+    try: return int(os.getenv(name, default))
+    except (TypeError, ValueError): print(f"Warning: Invalid value for {name}, using {default}."); return default
+
+def env_float(name, default):
+    """Reads a float setting from the environment, falling back to the default."""
+    try: return float(os.getenv(name, default))
+    except (TypeError, ValueError): print(f"Warning: Invalid value for {name}, using {default}."); return default
+
+def env_flag(name, default):
+    """Reads a boolean setting (1/true/yes/on) from the environment."""
+    value = os.getenv(name)
+    if value is None: return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Per-call timeouts (seconds). HF_REQUEST_TIMEOUT bounds a single HTTP attempt;
+# the *_CALL_TIMEOUT values below bound a whole backend call including retries and queueing.
+HF_REQUEST_TIMEOUT = env_float("HF_REQUEST_TIMEOUT", 30)
+LLM_REQUEST_TIMEOUT = env_float("LLM_REQUEST_TIMEOUT", 60)
+LLM_MAX_RETRIES = env_int("LLM_MAX_RETRIES", 2) # Retries are done by llm_complete so they count against the retry budget
+
+# End-to-end latency budget per analysis (seconds, 0 = none). Every stage sizes its
+# timeouts from what is left, and whatever finished in time is returned as a partial result.
+ANALYSIS_DEADLINE_SECONDS = env_float("ANALYSIS_DEADLINE_SECONDS", 90)
+ANALYSIS_MAX_DEADLINE_SECONDS = env_float("ANALYSIS_MAX_DEADLINE_SECONDS", 300) # Cap for a per-request "deadline_seconds"
+SCRAPE_BUDGET_SHARE = env_float("SCRAPE_BUDGET_SHARE", 0.5) # Share of the remaining budget search + scraping may use
+TRACE_LOGS = env_flag("TRACE_LOGS", True) # Prefix log lines printed during a request with its trace id
+if TRACE_LOGS: install_trace_logging()
+
+# "remote" = Hugging Face Inference API, "local" = models loaded in this process (CPU)
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "remote").strip().lower()
+
+if not together_api_key or (not hf_api_key and CLASSIFIER_BACKEND not in ("local", "onnx")):
     print("FATAL: API Keys (TOGETHER_API_KEY, HF_API_KEY) not found.")
     exit(1)
 try:
-    together_client = Together(api_key=together_api_key)
+    together_client = Together(api_key=together_api_key, timeout=LLM_REQUEST_TIMEOUT, max_retries=0)
     print("Together AI client initialized successfully.")
 except Exception as e:
     print(f"FATAL: Could not initialize Together AI client: {e}")
@@ -38,72 +94,149 @@ hf_headers = {"Authorization": f"Bearer {hf_api_key}"}
 print("Hugging Face API Key loaded.")
 
 LLM_MODEL = "meta-llama/Llama-3-8b-chat-hf"
-HF_SENTIMENT_URL = "https://api-inference.huggingface.co/models/siebert/sentiment-roberta-large-english"
-HF_BIAS_URL = "https://api-inference.huggingface.co/models/bucketresearch/politicalBiasBERT"
+HF_SENTIMENT_MODEL = "siebert/sentiment-roberta-large-english"
+HF_BIAS_MODEL = "bucketresearch/politicalBiasBERT"
+HF_SENTIMENT_URL = f"https://api-inference.huggingface.co/models/{HF_SENTIMENT_MODEL}"
+HF_BIAS_URL = f"https://api-inference.huggingface.co/models/{HF_BIAS_MODEL}"
+UPSTREAM_NAMES = {HF_SENTIMENT_URL: "hf_sentiment", HF_BIAS_URL: "hf_bias"} # Metric labels
+LLM_PROMPT_VERSION = "v2" # Bump whenever the get_llm_features prompt changes so cached results are not reused
+
+# ----------------------------------------------------------------------------
+# CLASSIFIER BACKENDS (remote HF Inference API or local in-process models)
+# ----------------------------------------------------------------------------
+# Local models are loaded once at startup and shared by all requests. Any model
+# that fails to load falls back to the remote API. CLASSIFIER_BACKEND=onnx serves
+# them with onnxruntime from `python -m pipeline.onnx_export` output (int8 unless
+# ONNX_QUANTIZED=false).
+LOCAL_CLASSIFIER_SPECS = {
+    "sentiment": {"model": HF_SENTIMENT_MODEL},
+    "bias": {"model": HF_BIAS_MODEL, "labels": ["LEFT", "CENTER", "RIGHT"]}, # Same label order as run_all_models.py
+}
+if CLASSIFIER_BACKEND in ("local", "onnx"):
+    local_classifiers = load_local_classifiers(LOCAL_CLASSIFIER_SPECS, env_int("LOCAL_TORCH_THREADS", 0), runtime="onnx" if CLASSIFIER_BACKEND == "onnx" else "torch",
+                                               onnx_dir=os.getenv("ONNX_MODEL_DIR", "models/onnx"), quantized=env_flag("ONNX_QUANTIZED", True))
+else: local_classifiers = {}
+if local_classifiers: print(f"Local classifiers loaded: {', '.join(sorted(local_classifiers))}")
+
+def classifier_backend(kind):
+    """Which backend serves a classifier kind ('sentiment' or 'bias'): 'local', 'onnx', 'onnx-int8' or 'remote'."""
+    return local_classifiers[kind].backend_id if kind in local_classifiers else "remote"
+
+def batched_result(kind, future):
+    """Waits for a micro-batched classification within the latency budget; an error response if it runs out."""
+    try: return future.result(timeout=remaining_time())
+    except FutureTimeoutError: future.cancel(); return {"error": f"{kind} classification did not finish within the latency budget."}
+
+def classify_text(kind, api_url, text):
+    """Runs a classifier through the configured backend; returns the HF API response shape."""
+    if kind in classifier_batchers: return batched_result(kind, classifier_batchers[kind].submit(text))
+    if kind in local_classifiers: return local_classifiers[kind].classify(text)
+    if not hf_api_key: return {"error": f"No local {kind} model loaded and HF_API_KEY is not set."}
+    return query_hf_api(api_url, text)
+
+def classify_batch(kind, api_url, texts):
+    """Classifies several texts with one local forward pass or one API call; one response per text."""
+    if kind in local_classifiers:
+        try: return [[labels] for labels in local_classifiers[kind].classify_batch(texts)]
+        except Exception as e: print(f"Error during local batch inference: {e}"); traceback.print_exc(); return [{"error": f"Local inference error: {e}"}] * len(texts)
+    if not hf_api_key: return [{"error": f"No local {kind} model loaded and HF_API_KEY is not set."}] * len(texts)
+    if len(texts) == 1: return [query_hf_api(api_url, texts[0])]
+    result = query_hf_api(api_url, texts)
+    if isinstance(result, dict) and "error" in result: return [result] * len(texts)
+    if isinstance(result, list) and len(result) == len(texts):
+        # Batched responses hold one label/score list (or one top prediction) per input
+        return [[r] if isinstance(r, list) else [[r]] for r in result]
+    print(f"Unexpected batched response from {api_url}; classifying {len(texts)} texts individually.")
+    return [query_hf_api(api_url, t) for t in texts]
+
+# ----------------------------------------------------------------------------
+# RESULT CACHE (content-addressed, memory LRU + SQLite)
+# ----------------------------------------------------------------------------
+RESULT_CACHE_ENABLED = env_flag("RESULT_CACHE_ENABLED", True)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join('cache', 'results.sqlite3'))
+result_cache = TieredCache(
+    RESULT_CACHE_PATH,
+    memory_entries=env_int("RESULT_CACHE_MEMORY_ENTRIES", 1024),
+    disk_max_bytes=env_int("RESULT_CACHE_MAX_MB", 256) * 1024 * 1024,
+    default_ttl=env_float("RESULT_CACHE_TTL_HOURS", 168) * 3600,
+) if RESULT_CACHE_ENABLED else None
+
+model_flights = SingleFlight("model") # Identical concurrent model calls share one upstream request
+
+def cache_get_or_compute(namespace, key_parts, compute):
+    """
+    Returns the cached result for `key_parts`, or computes it and caches it if it has no error.
+    Concurrent misses for the same key wait on a single computation.
+    """
+    key = make_cache_key(namespace, *key_parts)
+    if result_cache is None: return model_flights.do(key, compute)
+    cached = result_cache.get(key)
+    CACHE_LOOKUPS.inc(cache=namespace, result="hit" if cached is not None else "miss")
+    if cached is not None: print(f"Result cache hit for {namespace} ({key[:12]})."); return cached
+    def compute_and_store():
+        cached = result_cache.peek(key) # A flight that just finished may have stored it; the miss is already counted
+        if cached is not None: return cached
+        result = compute()
+        if isinstance(result, dict) and "error" not in result: result_cache.set(key, result)
+        return result
+    return model_flights.do(key, compute_and_store)
+
+def cached_result(namespace, model_ids):
+    """
+    Decorator for single-text model calls. Looks the normalized text up in the
+    result cache before calling the backend; only successful results are stored.
+    `model_ids` is called at lookup time so backend/model switches change the key.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(text):
+            if not isinstance(text, str) or not text.strip(): return func(text)
+            return cache_get_or_compute(namespace, (*model_ids(), normalize_text(text)), lambda: func(text))
+        return wrapper
+    return decorator
 
 # ----------------------------------------------------------------------------
 # Flask App Initialization
 # ----------------------------------------------------------------------------
 app = Flask(__name__)
 
+# Background threads (job workers, ...) start with the first request instead of
+# at import time, so processes that only import app.py (the debug reloader's
+# watcher process, analyze_batch.py, benchmarks) never run them.
+background_starters = []
+background_started = False
+background_lock = threading.Lock()
+
+def start_background_workers():
+    """Starts every registered background thread once per process."""
+    global background_started
+    with background_lock:
+        if background_started: return
+        background_started = True
+    for start in background_starters: start()
+
 # ----------------------------------------------------------------------------
-# HISTORY HANDLING (Added functions to modify history)
+# HISTORY HANDLING (SQLite store; imports the old history.json on first run)
 # ----------------------------------------------------------------------------
-HISTORY_FILE = os.path.join('static', 'data', 'history.json')
+HISTORY_FILE = os.path.join('static', 'data', 'history.json') # Legacy JSON history, imported once
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join('instance', 'history.sqlite3')) # Outside static/ so it is never served
+HISTORY_PAGE_SIZE = env_int("HISTORY_PAGE_SIZE", 20) # Entries shown in the sidebar
+HISTORY_MAX_ENTRIES = env_int("HISTORY_MAX_ENTRIES", 0) # 0 = keep everything
+history_store = HistoryStore(HISTORY_DB, legacy_json_path=HISTORY_FILE)
 
-def load_history():
-    """Load analysis history from JSON file. Create it if it doesn't exist."""
-    history_dir = os.path.dirname(HISTORY_FILE)
-    if not os.path.exists(history_dir):
-        try: os.makedirs(history_dir)
-        except OSError as e: print(f"Error creating directory {history_dir}: {e}"); return []
-    if not os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f: json.dump([], f)
-            return []
-        except IOError as e: print(f"Error creating history file {HISTORY_FILE}: {e}"); return []
+def load_history(limit=None, offset=0, input_type=None):
+    """Load a newest-first page of analysis history."""
     try:
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            history_data = json.load(f)
-            # Ensure data is a list and items have 'id'
-            if not isinstance(history_data, list):
-                print(f"Warning: History file {HISTORY_FILE} is not a valid JSON list. Resetting.")
-                return []
-            # Ensure IDs are integers if they exist
-            for item in history_data:
-                if 'id' in item:
-                    try:
-                        item['id'] = int(item['id'])
-                    except (ValueError, TypeError):
-                        print(f"Warning: Invalid ID found in history item: {item}. Skipping ID conversion.")
-
-            return history_data
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {HISTORY_FILE}: {e}. Resetting history.")
-        return []
+        return history_store.list(limit=limit or HISTORY_PAGE_SIZE, offset=offset, input_type=input_type)
     except Exception as e:
         print(f"Unexpected error loading history: {e}")
         traceback.print_exc()
         return []
 
-def save_history_file(history_data):
-    """Saves the provided history data list to the JSON file."""
-    try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history_data, f, indent=2)
-        return True
-    except IOError as e:
-        print(f"Error writing history file {HISTORY_FILE}: {e}")
-        return False
-    except Exception as e:
-        print(f"Unexpected error saving history: {e}")
-        traceback.print_exc()
-        return False
-
+@track_stage("history_write", is_error=lambda saved: saved is False)
 def add_to_history(input_type, input_value, results):
-    """Adds a new analysis result to the history."""
-    history = load_history()
-    if not isinstance(results, dict): return
+    """Adds a new analysis result to the history. Returns False if it could not be saved."""
+    if not isinstance(results, dict): return None
 
     bias_label = results.get('bias', 'N/A')
     sentiment_label = results.get('sentiment', 'N/A')
@@ -112,67 +245,243 @@ def add_to_history(input_type, input_value, results):
     if not isinstance(bias_value, (int, float)): bias_value = 0
     if not isinstance(sentiment_value, (int, float)): sentiment_value = 0
 
-    # Generate a unique ID (using timestamp is generally safe enough for this scale)
-    new_id = int(time.time() * 1000)
-
-    entry = {
-        'id': new_id, # Use generated ID
-        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'input_type': input_type,
-        'input_value': (input_value[:100] + '...') if isinstance(input_value, str) and len(input_value) > 100 else input_value,
-        'results': {
-            'bias': bias_label.capitalize() if isinstance(bias_label, str) else 'N/A',
-            'sentiment': sentiment_label.capitalize() if isinstance(sentiment_label, str) else 'N/A',
-            'bias_value': int(bias_value), 'sentiment_value': int(sentiment_value)
-        }
+    entry_results = {
+        'bias': bias_label.capitalize() if isinstance(bias_label, str) else 'N/A',
+        'sentiment': sentiment_label.capitalize() if isinstance(sentiment_label, str) else 'N/A',
+        'bias_value': int(bias_value), 'sentiment_value': int(sentiment_value)
     }
-    history.insert(0, entry)
-    max_history = 20
-    if len(history) > max_history: history = history[:max_history]
+    truncated = isinstance(input_value, str) and len(input_value) > 100
+    try:
+        history_store.add(
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), input_type,
+            (input_value[:100] + '...') if truncated else input_value,
+            entry_results, full_input_value=input_value if truncated and input_type != 'text' else None) # Full topics/URLs for prefetch
+        if HISTORY_MAX_ENTRIES: history_store.trim(HISTORY_MAX_ENTRIES)
+        return True
+    except Exception as e:
+        print(f"Unexpected error saving history: {e}")
+        traceback.print_exc()
+        return False
+
+# ----------------------------------------------------------------------------
+# UPSTREAM HEALTH (circuit breakers + retry budget)
+# ----------------------------------------------------------------------------
+# One breaker per upstream endpoint. While a circuit is open, calls to it fail
+# fast and the pipeline returns a degraded result (e.g. classifier-only, no
+# LLM) instead of every request sitting through the full retry ladder. The
+# retry budget caps retries process-wide so an outage does not multiply load.
+BREAKER_SETTINGS = {
+    "window_seconds": env_float("BREAKER_WINDOW_SECONDS", 60),
+    "min_calls": env_int("BREAKER_MIN_CALLS", 5),
+    "error_rate_threshold": env_float("BREAKER_ERROR_RATE", 0.5),
+    "slow_call_seconds": env_float("BREAKER_SLOW_CALL_SECONDS", 20),
+    "slow_rate_threshold": env_float("BREAKER_SLOW_RATE", 0.8),
+    "open_seconds": env_float("BREAKER_OPEN_SECONDS", 30),
+}
+LLM_ENDPOINT = f"together:{LLM_MODEL}"
+circuit_breakers = {}; circuit_breakers_lock = threading.Lock()
+retry_budget = RetryBudget(ratio=env_float("RETRY_BUDGET_RATIO", 0.2), min_retries=env_int("RETRY_BUDGET_MIN", 10))
+
+def circuit_breaker(endpoint):
+    """Returns the (lazily created) breaker for one upstream endpoint."""
+    with circuit_breakers_lock:
+        if endpoint not in circuit_breakers: circuit_breakers[endpoint] = CircuitBreaker(endpoint, **BREAKER_SETTINGS)
+        return circuit_breakers[endpoint]
+
+def backend_endpoint(backend):
+    """The upstream endpoint a backend depends on, or None for in-process models."""
+    if backend == "llm": return LLM_ENDPOINT
+    if backend in local_classifiers: return None
+    return HF_SENTIMENT_URL if backend == "sentiment" else HF_BIAS_URL
+
+# Hedging: when a call runs past the endpoint's recent p95 latency, send one
+# identical backup request and take whichever answers first.
+HEDGE_REQUESTS = env_flag("HEDGE_REQUESTS", False)
+HEDGE_MIN_SECONDS = env_float("HEDGE_MIN_SECONDS", 1.0) # Never hedge before this
+hedge_executor = ThreadPoolExecutor(max_workers=max(1, env_int("HEDGE_MAX_WORKERS", 16)), thread_name_prefix="hedge")
+
+def hedge_delay(breaker):
+    """Seconds after which to hedge a call to this endpoint, or None (disabled / not enough samples)."""
+    if not HEDGE_REQUESTS: return None
+    p95 = breaker.latency_percentile(0.95)
+    return max(HEDGE_MIN_SECONDS, p95) if p95 is not None else None
+
+def call_with_hedging(breaker, fn):
+    """Runs fn(), hedged after the endpoint's p95 latency when hedging is enabled."""
+    delay = hedge_delay(breaker)
+    if delay is None or (remaining_time() is not None and remaining_time() <= delay): return fn()
+    result, hedged = hedged_call(fn, delay, hedge_executor)
+    if hedged: print(f"Hedged request to {breaker.name} after {delay:.2f} seconds.")
+    return result
 
-    save_history_file(history) # Use the dedicated save function
+def unavailable_backends():
+    """Backends whose upstream circuit is currently open."""
+    return [name for name in ("sentiment", "bias", "llm") if backend_endpoint(name) and circuit_breaker(backend_endpoint(name)).is_open()]
 
 # ----------------------------------------------------------------------------
-# API CALL FUNCTIONS (Unchanged)
+# API CALL FUNCTIONS
 # ----------------------------------------------------------------------------
+def post_hf_inference(api_url, timeout, inputs):
+    """One HF Inference API request: the parsed JSON, or requests' exception (replay substitutes this call)."""
+    response = requests.post(api_url, headers=hf_headers, json={"inputs": inputs}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
 def query_hf_api(api_url, text_input):
-    max_hf_input_chars = 1000; payload = {"inputs": text_input[:max_hf_input_chars]}; max_retries = 4; initial_delay = 5
-    last_error = "Unknown HF API Error"; response = None
+    # text_input may be a single string or a list of strings (batched request)
+    max_hf_input_chars = 1000; max_retries = 4; initial_delay = 5
+    inputs = [t[:max_hf_input_chars] for t in text_input] if isinstance(text_input, list) else text_input[:max_hf_input_chars]
+    last_error = "Unknown HF API Error"
+    breaker = circuit_breaker(api_url); upstream = UPSTREAM_NAMES.get(api_url, api_url)
+    if not breaker.allow():
+        print(f"Circuit open for {api_url}, failing fast."); return {"error": f"{api_url} is temporarily unavailable (circuit open)."}
+    retry_budget.record_request()
     for attempt in range(max_retries):
+        if attempt > 0 and not retry_budget.try_retry():
+            print(f"Error: Retry budget exhausted, not retrying {api_url}."); return {"error": f"{last_error} (retry budget exhausted)"}
+        if attempt > 0 and not breaker.allow():
+            print(f"Circuit opened for {api_url}, stopping retries."); return {"error": f"{last_error} (circuit open)"}
+        try: request_timeout = budget_timeout(HF_REQUEST_TIMEOUT)
+        except DeadlineExceeded as e: print(f"Error: {e} Not querying {api_url}."); return {"error": f"{last_error if attempt else 'Not attempted'} ({e})"}
+        if attempt > 0: UPSTREAM_RETRIES.inc(upstream=upstream)
         print(f"Querying {api_url} (Attempt {attempt+1}/{max_retries})...")
+        attempt_start = time.time()
         try:
-            response = requests.post(api_url, headers=hf_headers, json=payload, timeout=30)
-            response.raise_for_status(); return response.json()
-        except requests.exceptions.Timeout: last_error = f"Timeout connecting to {api_url}"; print(f"Warning: {last_error}")
+            result = call_with_hedging(breaker, lambda: post_hf_inference(api_url, request_timeout, inputs))
+            breaker.record(True, time.time() - attempt_start); observe_upstream(upstream, "ok", time.time() - attempt_start); return result
+        except requests.exceptions.Timeout: breaker.record(False, time.time() - attempt_start); observe_upstream(upstream, "timeout", time.time() - attempt_start); last_error = f"Timeout connecting to {api_url}"; print(f"Warning: {last_error}")
         except requests.exceptions.HTTPError as e:
+            status = e.response.status_code
+            breaker.record(status < 500 and status != 429, time.time() - attempt_start) # Client errors say nothing about upstream health
+            observe_upstream(upstream, "http_error", time.time() - attempt_start)
             last_error = f"HTTP error {e.response.status_code} from {api_url}: {e.response.reason}"; print(f"Warning: {last_error}")
-            if response is not None and response.status_code == 503:
+            if status == 503:
                 wait_time = initial_delay * (2 ** attempt); print(f"   -> Model may be loading. Waiting {wait_time} seconds before retry...")
                 if attempt == max_retries - 1: last_error = "Model failed to load or is unavailable after multiple retries."; print(f"Error: {last_error}"); return {"error": last_error}
+                elif remaining_time(wait_time + 1) <= wait_time: print("Error: Not enough latency budget left to wait for the model."); return {"error": f"{last_error} (latency budget exhausted)"}
                 else: time.sleep(wait_time); continue
             else: print(f"Error: Non-503 HTTP error encountered. Stopping retries."); return {"error": last_error}
-        except requests.exceptions.RequestException as e: last_error = f"Request exception connecting to {api_url}: {e}"; print(f"Warning: {last_error}")
-        except Exception as e: last_error = f"Unexpected error during HF API request to {api_url}: {e}"; print(f"Warning: {last_error}")
-        if attempt < max_retries - 1: general_wait = 2 * (attempt + 1); print(f"   -> Waiting {general_wait} seconds before general retry..."); time.sleep(general_wait)
+        except requests.exceptions.RequestException as e: breaker.record(False, time.time() - attempt_start); observe_upstream(upstream, "error", time.time() - attempt_start); last_error = f"Request exception connecting to {api_url}: {e}"; print(f"Warning: {last_error}")
+        except Exception as e: breaker.record(False, time.time() - attempt_start); observe_upstream(upstream, "error", time.time() - attempt_start); last_error = f"Unexpected error during HF API request to {api_url}: {e}"; print(f"Warning: {last_error}")
+        if attempt < max_retries - 1:
+            general_wait = 2 * (attempt + 1)
+            if remaining_time(general_wait + 1) <= general_wait: print("Error: Not enough latency budget left to retry."); return {"error": f"{last_error} (latency budget exhausted)"}
+            print(f"   -> Waiting {general_wait} seconds before general retry..."); time.sleep(general_wait)
     print(f"Error: Max retries ({max_retries}) exceeded for {api_url}.")
     return {"error": last_error}
 
+# ----------------------------------------------------------------------------
+# UPSTREAM RECORD / REPLAY (offline benchmarking, see benchmarks/loadtest.py)
+# ----------------------------------------------------------------------------
+# UPSTREAM_REPLAY=record captures HF, Together, DuckDuckGo and scrape responses
+# with their latencies to UPSTREAM_FIXTURES; UPSTREAM_REPLAY=replay serves them
+# back instead of calling out. HF and Together are replaced at the transport
+# (the HTTP request and the client's create call), so retries, circuit
+# breakers, budget timeouts and hedging run against replayed latencies and
+# errors: injected errors raise the client's connection error, and latencies
+# beyond a call's timeout its timeout error. The scraper is wrapped below its
+# single-flight and stage timing, so coalescing and metrics behave as in production.
+UPSTREAM_REPLAY = os.getenv("UPSTREAM_REPLAY", "off").strip().lower()
+UPSTREAM_FIXTURES = os.getenv("UPSTREAM_FIXTURES", os.path.join('benchmarks', 'fixtures', 'upstreams'))
+
+def llm_fixture_response(content):
+    """Rebuilds the parts of a Together chat completion that llm_complete reads."""
+    message = type("Message", (), {"content": content})()
+    return type("Completion", (), {"choices": [type("Choice", (), {"message": message})()]})()
+
+def raise_replay_error(message): raise RuntimeError(message)
+def raise_replay_timeout(message): raise TimeoutError(message) # llm_complete counts it as a timeout
+def raise_hf_replay_error(message): raise requests.exceptions.ConnectionError(message)
+def raise_hf_replay_timeout(message): raise requests.exceptions.Timeout(message)
+
+def llm_fixture_key(**kwargs):
+    """Fixture key of a chat completion, grouped by prompt template (its first words) for replay fallbacks."""
+    messages = kwargs.get("messages") or [{}]
+    template = " ".join(str(messages[0].get("content", "")).split()[:3])
+    return template, fixture_key(kwargs.get("model"), messages, kwargs.get("max_tokens"), kwargs.get("temperature"))
+
+upstream_replay = None
+if UPSTREAM_REPLAY != "off":
+    upstream_replay = UpstreamReplay(UPSTREAM_FIXTURES, UPSTREAM_REPLAY,
+                                     latency=parse_upstream_settings(os.getenv("UPSTREAM_REPLAY_LATENCY"), LatencyModel),
+                                     error_rates=parse_upstream_settings(os.getenv("UPSTREAM_REPLAY_ERRORS"), float),
+                                     strict=env_flag("UPSTREAM_REPLAY_STRICT", False), seed=env_int("UPSTREAM_REPLAY_SEED", 0))
+    print(f"Upstream replay mode: {UPSTREAM_REPLAY} (fixtures in {UPSTREAM_FIXTURES})")
+    post_hf_inference = upstream_replay.wrap_batched("hf", post_hf_inference, lambda api_url, timeout, text: (api_url, fixture_key(api_url, text)), raise_hf_replay_error,
+                                                     timeout_of=lambda api_url, timeout, inputs: timeout, on_timeout=raise_hf_replay_timeout)
+    create_completion = together_client.chat.completions.create
+    # Fixtures hold whole completions, so streamed calls are recorded and replayed unstreamed
+    together_client.chat.completions.create = upstream_replay.wrap(
+        "llm", lambda **kwargs: create_completion(**{k: v for k, v in kwargs.items() if k != "stream"}), llm_fixture_key, raise_replay_error,
+        encode=lambda response: response.choices[0].message.content, decode=llm_fixture_response, timeout_of=lambda **kwargs: kwargs.get("timeout"), on_timeout=raise_replay_timeout)
+    web_scraper_main.run_search = upstream_replay.wrap("search", web_scraper_main.run_search,
+                                                       lambda topic, max_results=5: fixture_key(" ".join(topic.lower().split()), max_results), lambda message: [])
+    web_scraper_main.fetch_article_content = upstream_replay.wrap("scrape", web_scraper_main.fetch_article_content,
+                                                                  lambda url: fixture_key(web_scraper_main.normalize_url(url)), lambda message: f"Error: {message}")
+
+# ----------------------------------------------------------------------------
+# CHUNKED CLASSIFICATION (long documents)
+# ----------------------------------------------------------------------------
+# Instead of classifying only the first ~1000 characters, long texts are split on
+# paragraph boundaries into token-budgeted windows, all windows are classified in
+# one batch, and label scores are averaged weighted by window length.
+CHUNKED_CLASSIFICATION = env_flag("CHUNKED_CLASSIFICATION", True)
+CHUNK_MAX_TOKENS = env_int("CHUNK_MAX_TOKENS", 200) # Keeps windows under the 1000-char remote cap and 512-token local cap
+CHUNK_MAX_PER_DOC = env_int("CHUNK_MAX_PER_DOC", 8) # Bounds latency for very long articles
+
+def chunking_key():
+    """Chunking settings that change classifier output (part of the result cache key)."""
+    return ("chunked", CHUNK_MAX_TOKENS, CHUNK_MAX_PER_DOC) if CHUNKED_CLASSIFICATION else ("single",)
+
+def chunk_token_counter(kind):
+    """Exact token counts with a local model's tokenizer, an estimate otherwise."""
+    if kind in local_classifiers:
+        tokenizer = local_classifiers[kind].tokenizer
+        return lambda text: len(tokenizer.tokenize(text))
+    return approx_token_count
+
+def classify_document(kind, api_url, text):
+    """
+    Classifies a whole document. Returns (response, chunks): `response` has the
+    HF API shape with length-weighted mean scores, `chunks` is the per-window
+    label distribution (None when the text fits in one window).
+    """
+    windows = select_windows(split_into_windows(text, CHUNK_MAX_TOKENS, chunk_token_counter(kind)), CHUNK_MAX_PER_DOC) if CHUNKED_CLASSIFICATION and isinstance(text, str) else []
+    if len(windows) <= 1: return classify_text(kind, api_url, text), None
+    print(f"   -> Classifying {kind} over {len(windows)} chunks...")
+    if kind in classifier_batchers: responses = [batched_result(kind, future) for future in [classifier_batchers[kind].submit(w) for w in windows]]
+    else: responses = classify_batch(kind, api_url, windows)
+    weighted_scores = {}; total_weight = 0; chunks = []; last_error = "Unexpected API response format"
+    for window, response in zip(windows, responses):
+        if isinstance(response, dict) and "error" in response: last_error = response["error"]; continue
+        if not (isinstance(response, list) and response and isinstance(response[0], list) and response[0]): continue
+        weight = len(window); total_weight += weight
+        for prediction in response[0]:
+            label = prediction.get('label', 'Unknown'); weighted_scores[label] = weighted_scores.get(label, 0) + prediction.get('score', 0) * weight
+        best_prediction = max(response[0], key=lambda x: x.get('score', 0))
+        chunks.append({"chars": weight, "label": best_prediction.get('label', 'Unknown'), "score": round(best_prediction.get('score', 0), 4)})
+    if not chunks: return {"error": last_error}, None
+    return [[{"label": label, "score": score / total_weight} for label, score in weighted_scores.items()]], chunks
+
+@cached_result("sentiment", lambda: (HF_SENTIMENT_URL, classifier_backend("sentiment"), *chunking_key()))
 def get_sentiment_hf(text):
-    print("Getting HF Sentiment (Binary)...")
-    result = query_hf_api(HF_SENTIMENT_URL, text)
+    print(f"Getting HF Sentiment (Binary, {classifier_backend('sentiment')})...")
+    result, chunks = classify_document("sentiment", HF_SENTIMENT_URL, text)
     if isinstance(result, dict) and "error" in result: return {"sentiment_binary": None, "error": result["error"]}
     try:
         if isinstance(result, list) and len(result) > 0 and isinstance(result[0], list) and result[0]:
             scores = result[0]; best_prediction = max(scores, key=lambda x: x.get('score', 0))
             label = best_prediction.get('label', 'Unknown').upper()
             sentiment_binary = 1 if label == 'POSITIVE' else 0
+            if chunks: return {"sentiment_binary": sentiment_binary, "sentiment_chunks": chunks}
             return {"sentiment_binary": sentiment_binary}
         else: print(f"Unexpected HF Sentiment API response format: {result}"); return {"sentiment_binary": None, "error": "Unexpected API response format"}
     except Exception as e: print(f"Error processing HF Sentiment response: {e}"); traceback.print_exc(); return {"sentiment_binary": None, "error": f"Processing error: {e}"}
 
+@cached_result("bias", lambda: (HF_BIAS_URL, classifier_backend("bias"), *chunking_key()))
 def get_bias_hf(text):
-    print("Getting HF Bias...")
-    result = query_hf_api(HF_BIAS_URL, text)
+    print(f"Getting HF Bias ({classifier_backend('bias')})...")
+    result, chunks = classify_document("bias", HF_BIAS_URL, text)
     if isinstance(result, dict) and "error" in result: return {"bias_label": "Error", "bias_score": 0, "error": result["error"]}
     try:
         if isinstance(result, list) and len(result) > 0 and isinstance(result[0], list) and result[0]:
@@ -182,14 +491,191 @@ def get_bias_hf(text):
             elif label_raw.upper() == 'RIGHT': bias_label = 'Right'
             elif label_raw.upper() == 'CENTER': bias_label = 'Center'
             else: bias_label = label_raw.capitalize()
+            if chunks: return { "bias_label": bias_label, "bias_score": int(best_prediction.get('score', 0) * 100), "bias_chunks": chunks }
             return { "bias_label": bias_label, "bias_score": int(best_prediction.get('score', 0) * 100) }
         else: print(f"Unexpected HF Bias API response format: {result}"); return {"bias_label": "Error", "bias_score": 0, "error": "Unexpected API response format"}
     except Exception as e: print(f"Error processing HF Bias response: {e}"); traceback.print_exc(); return {"bias_label": "Error", "bias_score": 0, "error": f"Processing error: {e}"}
 
+def iter_completion_text(response):
+    """Yields a chat completion's text: delta by delta for a stream, in one piece for a full (e.g. replayed) response."""
+    choices = getattr(response, 'choices', None)
+    if choices is not None: yield choices[0].message.content or ""; return
+    for chunk in response:
+        delta = chunk.choices[0].delta if chunk.choices else None
+        if delta is not None and delta.content: yield delta.content
+
+def llm_complete(prompt, max_tokens=1024, temperature=0.3, on_delta=None):
+    """
+    Sends one chat completion to the Together LLM and returns the raw message text.
+    Goes through the LLM circuit breaker (raises CircuitOpenError while it is open);
+    failed calls are retried up to LLM_MAX_RETRIES times within the retry budget.
+    With `on_delta`, the completion is streamed and on_delta(text) is called for each
+    piece as it arrives; returning True closes the stream early and returns the text so far.
+    """
+    breaker = circuit_breaker(LLM_ENDPOINT); retry_budget.record_request()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        request_timeout = budget_timeout(LLM_REQUEST_TIMEOUT) # Raises DeadlineExceeded once the budget is spent
+        if not breaker.allow(): raise CircuitOpenError(f"LLM {LLM_MODEL} is temporarily unavailable (circuit open).")
+        start_llm_time = time.time(); delivered = False
+        try:
+            create = lambda: together_client.chat.completions.create( model=LLM_MODEL, messages=[{"role": "user", "content": prompt}], temperature=temperature, max_tokens=max_tokens, timeout=request_timeout, **({"stream": True} if on_delta else {}) )
+            # Not hedged when streaming: a hedge would only race stream creation and leave the losing generation running
+            response = create() if on_delta else call_with_hedging(breaker, create)
+            if on_delta is None: content = response.choices[0].message.content
+            else:
+                pieces = []
+                for piece in iter_completion_text(response):
+                    pieces.append(piece); delivered = True
+                    if on_delta(piece):
+                        if hasattr(response, 'close'): response.close() # Stop generating (and paying for) the rest
+                        break
+                content = "".join(pieces)
+        except Exception as e:
+            status = getattr(e, 'status_code', None)
+            client_error = isinstance(status, int) and 400 <= status < 500 and status != 429
+            breaker.record(client_error, time.time() - start_llm_time); observe_upstream("together", "timeout" if "timeout" in type(e).__name__.lower() else "error", time.time() - start_llm_time)
+            if delivered or client_error or attempt == LLM_MAX_RETRIES or not retry_budget.try_retry(): raise # A retry would repeat streamed pieces
+            if remaining_time(float('inf')) <= min(2 ** attempt, 8): raise
+            print(f"Warning: LLM call failed ({e}), retrying (Attempt {attempt+2}/{LLM_MAX_RETRIES+1})..."); time.sleep(min(2 ** attempt, 8))
+            UPSTREAM_RETRIES.inc(upstream="together"); continue
+        llm_duration = time.time() - start_llm_time; breaker.record(True, llm_duration); observe_upstream("together", "ok", llm_duration); print(f"LLM response received in {llm_duration:.2f} seconds.")
+        return content
+
+def parse_llm_json(raw_response, required_keys):
+    """Extracts the outermost JSON object from an LLM response and checks the required keys."""
+    json_start = raw_response.find('{'); json_end = raw_response.rfind('}') + 1
+    if json_start != -1 and json_end != -1:
+        json_string = raw_response[json_start:json_end]
+        try:
+            parsed_json = json.loads(json_string)
+            if all(key in parsed_json for key in required_keys): print("Successfully parsed JSON response from LLM."); return parsed_json
+            return {"error": "LLM response missing required fields.", "raw_response": raw_response}
+        except json.JSONDecodeError as e:
+            salvaged = JSONObjectStream(); salvaged.feed(json_string) # Keeps every field that parses on its own
+            if all(key in salvaged.fields for key in required_keys):
+                print(f"Recovered {len(salvaged.fields)} fields from malformed LLM JSON ({e})."); return salvaged.fields
+            return {"error": f"Invalid JSON received from LLM: {e}", "raw_response": raw_response}
+    return {"error": "No valid JSON object found in LLM response.", "raw_response": raw_response}
+
+# ----------------------------------------------------------------------------
+# MAP-REDUCE SUMMARIZATION
+# ----------------------------------------------------------------------------
+# Map: articles longer than the LLM input limit are split into chunks that are
+# summarized in parallel; get_llm_features then analyzes the chunk summaries
+# instead of only the first 8000 characters.
+# Reduce: a topic's per-article results are synthesized by one more LLM call.
+# Chunk summaries, article features and the reduce output are all cached, so
+# adding an article to a topic costs only its own map calls plus one reduce.
+LLM_MAX_INPUT_CHARS = 8000
+LLM_MAP_REDUCE = env_flag("LLM_MAP_REDUCE", True)
+LLM_MAP_CHUNK_TOKENS = env_int("LLM_MAP_CHUNK_TOKENS", 1200)
+LLM_MAP_MAX_CHUNKS = env_int("LLM_MAP_MAX_CHUNKS", 12)
+LLM_MAP_PROMPT_VERSION = "v1"
+LLM_REDUCE_PROMPT_VERSION = "v1"
+# Map calls get their own pool: they are issued from inside article analysis tasks,
+# which already hold the shared pool and the LLM concurrency slot.
+llm_map_executor = ThreadPoolExecutor(max_workers=max(1, env_int("LLM_MAP_CONCURRENCY", 4)), thread_name_prefix="llm-map")
+
+def summarize_chunk(chunk):
+    """Map step: short factual summary of one article chunk (cached per chunk)."""
+    def compute():
+        prompt = f"""Summarize the following section of a news article in 2-4 neutral sentences. Keep concrete facts, names and numbers. Quote verbatim any loaded or one-sided wording. Provide ONLY the summary.
+Section:
+{chunk}"""
+        try: return {"summary": llm_complete(prompt, max_tokens=256).strip()}
+        except Exception as e: print(f"Error during chunk summarization: {e}"); return {"error": f"API communication error: {e}"}
+    return cache_get_or_compute("llm_map", (LLM_MODEL, LLM_MAP_PROMPT_VERSION, normalize_text(chunk)), compute)
+
+def condense_long_text(text):
+    """Replaces an over-long article by its parallel chunk summaries; falls back to truncation."""
+    chunks = select_windows(split_into_windows(text, LLM_MAP_CHUNK_TOKENS), LLM_MAP_MAX_CHUNKS)
+    print(f"Map step: summarizing {len(chunks)} chunks in parallel for LLM analysis...")
+    futures = [submit_with_context(llm_map_executor, summarize_chunk, chunk) for chunk in chunks]
+    results = []
+    for future in futures:
+        try: results.append(future.result(timeout=remaining_time()))
+        except FutureTimeoutError: results.append({"error": "Latency budget exhausted during map step."})
+    summaries = [r["summary"] for r in results if "error" not in r and r.get("summary")]
+    if len(summaries) < len(chunks):
+        print(f"Warning: {len(chunks) - len(summaries)} chunk summaries failed. Falling back to the unsummarized text for LLM.")
+        return compress_llm_input(text)
+    return "\n\n".join(f"[Part {i+1}/{len(summaries)}] {summary}" for i, summary in enumerate(summaries))[:LLM_MAX_INPUT_CHARS]
+
+@track_stage("llm_reduce")
+def synthesize_topic(topic, articles):
+    """Reduce step: one LLM call that writes a cross-article summary, findings and bias indicators."""
+    digest = [{"source_url": a.get('source_url', ''), "bias": a.get('bias_label', '?'),
+               "sentiment": "Positive" if a.get('sentiment_binary') == 1 else "Negative" if a.get('sentiment_binary') == 0 else "?",
+               "summary": a.get('summary', 'N/A'), "key_findings": a.get('key_findings', [])[:5], "bias_indicators": a.get('bias_indicators_llm', [])[:5]}
+              for a in articles]
+    def compute():
+        article_block = "\n\n".join(
+            f"Article {i+1} ({d['source_url']}) [bias: {d['bias']}, sentiment: {d['sentiment']}]\nSummary: {d['summary']}\nKey findings: {'; '.join(d['key_findings']) or 'N/A'}\nBias indicators: {'; '.join(d['bias_indicators']) or 'N/A'}"
+            for i, d in enumerate(digest))
+        prompt = f"""You are given analyses of {len(digest)} news articles about the topic "{topic}". Synthesize them and provide the output STRICTLY in JSON format:
+{{
+  "summary": "...", "key_findings": ["...", "..."], "bias_indicators": ["...", "..."]
+}}
+Instructions: Adhere strictly to JSON. The summary (4-6 sentences) must describe what the coverage agrees on and where the articles differ, neutrally. Key findings are the most important cross-article points (max 8). Bias indicators describe framing differences between the sources (max 8). Provide ONLY JSON.
+Articles:
+{article_block}"""
+        try:
+            print(f"Reduce step: synthesizing {len(digest)} articles for topic '{topic}'...")
+            return parse_llm_json(llm_complete(prompt, max_tokens=1024), ["summary", "key_findings"])
+        except Exception as e: print(f"Error during topic synthesis: {e}"); return {"error": f"API communication error: {e}"}
+    # Keyed by the article digests (order-independent), not the topic string
+    return cache_get_or_compute("llm_reduce", (LLM_MODEL, LLM_REDUCE_PROMPT_VERSION, sorted(json.dumps(d, sort_keys=True) for d in digest)), compute)
+
+# ----------------------------------------------------------------------------
+# LLM INPUT COMPRESSION & STREAMED FEATURES
+# ----------------------------------------------------------------------------
+# Articles longer than LLM_COMPRESS_TARGET_CHARS are sent as their most
+# informative sentences (see select_informative_sentences) rather than their
+# first characters, which cuts prompt tokens. The features are streamed: the
+# JSON is parsed as it arrives, each field is reported to the listener in
+# llm_field_listener as soon as it closes, and the stream is cut once every
+# field in the stop set is in (so trailing chatter is never generated).
+LLM_INPUT_COMPRESSION = env_flag("LLM_INPUT_COMPRESSION", True)
+LLM_COMPRESS_TARGET_CHARS = env_int("LLM_COMPRESS_TARGET_CHARS", 4000)
+LLM_STREAMING = env_flag("LLM_STREAMING", True)
+LLM_FEATURE_KEYS = ["summary", "key_findings", "bias_indicators_llm", "credibility_assessment", "recommended_searches"]
+LLM_REQUIRED_KEYS = ["summary", "key_findings", "credibility_assessment"]
+LLM_STREAM_STOP_AT_REQUIRED = env_flag("LLM_STREAM_STOP_AT_REQUIRED", False) # Also skips recommended_searches, the last field
+llm_field_listener = contextvars.ContextVar("llm_field_listener", default=None) # Called as listener(field, value)
+
+def llm_features_key():
+    """Settings that change get_llm_features output (its cache key)."""
+    return (LLM_MODEL, LLM_PROMPT_VERSION, LLM_MAP_REDUCE, LLM_INPUT_COMPRESSION and LLM_COMPRESS_TARGET_CHARS, LLM_STREAM_STOP_AT_REQUIRED)
+
+def compress_llm_input(text):
+    """Fits an article into the LLM input: its most informative sentences, or else its first LLM_MAX_INPUT_CHARS chars."""
+    if LLM_INPUT_COMPRESSION and len(text) > LLM_COMPRESS_TARGET_CHARS:
+        compressed = select_informative_sentences(text, LLM_COMPRESS_TARGET_CHARS)
+        print(f"Compressed LLM input from {len(text)} to {len(compressed)} chars."); return compressed
+    if len(text) > LLM_MAX_INPUT_CHARS: print(f"Warning: Truncating input text from {len(text)} to {LLM_MAX_INPUT_CHARS} chars for LLM.")
+    return text[:LLM_MAX_INPUT_CHARS]
+
+def stream_llm_fields(prompt, required_keys, stop_keys, max_tokens=1024):
+    """
+    Streams a JSON-answer completion, reporting each field to llm_field_listener as it
+    completes. Returns the parsed fields once the required ones are in, else parse_llm_json's result.
+    """
+    parser = JSONObjectStream(); listener = llm_field_listener.get()
+    def on_delta(piece):
+        for field, value in parser.feed(piece):
+            if listener is not None: listener(field, value)
+        return parser.done or all(key in parser.fields for key in stop_keys)
+    raw_response = llm_complete(prompt, max_tokens=max_tokens, on_delta=on_delta)
+    if all(key in parser.fields for key in required_keys):
+        if parser.errors: print(f"Warning: Dropped malformed LLM fields: {', '.join(map(str, parser.errors))}")
+        print("Successfully parsed JSON response from LLM."); return dict(parser.fields)
+    return parse_llm_json(raw_response, required_keys)
+
+@cached_result("llm", llm_features_key)
 def get_llm_features(text):
     if not text or not isinstance(text, str): return {"error": "Invalid text provided for LLM analysis."}
-    max_input_chars = 8000; truncated_text = text[:max_input_chars]
-    if len(text) > max_input_chars: print(f"Warning: Truncating input text from {len(text)} to {max_input_chars} chars for LLM.")
+    if len(text) > LLM_MAX_INPUT_CHARS and LLM_MAP_REDUCE: llm_input = condense_long_text(text)
+    else: llm_input = compress_llm_input(text)
     prompt = f"""Analyze the following text and provide the output STRICTLY in JSON format:
 {{
   "summary": "...", "key_findings": ["...", "..."], "bias_indicators_llm": ["...", "..."],
@@ -197,29 +683,218 @@ def get_llm_features(text):
 }}
 Instructions: Adhere strictly to JSON. Populate all fields (use "N/A" or [] if needed). Summary neutral (3-5 sentences). Bias indicators are phrases suggesting potential bias. Credibility is a brief assessment. Searches are related terms. Provide ONLY JSON.
 Text:
-{truncated_text}"""
+{llm_input}"""
     analysis_result = {"error": "LLM analysis failed."}
     try:
         print(f"Sending request to LLM: {LLM_MODEL} for generative features...")
-        start_llm_time = time.time()
-        response = together_client.chat.completions.create( model=LLM_MODEL, messages=[{"role": "user", "content": prompt}], temperature=0.3, max_tokens=1024, )
-        llm_duration = time.time() - start_llm_time; print(f"LLM response received in {llm_duration:.2f} seconds.")
-        raw_response = response.choices[0].message.content
-        json_start = raw_response.find('{'); json_end = raw_response.rfind('}') + 1
-        if json_start != -1 and json_end != -1:
-            json_string = raw_response[json_start:json_end]
-            try:
-                parsed_json = json.loads(json_string)
-                required_keys = ["summary", "key_findings", "credibility_assessment"]
-                if all(key in parsed_json for key in required_keys): analysis_result = parsed_json; print("Successfully parsed JSON response from LLM.")
-                else: analysis_result = {"error": "LLM response missing required fields.", "raw_response": raw_response}
-            except json.JSONDecodeError as e: analysis_result = {"error": f"Invalid JSON received from LLM: {e}", "raw_response": raw_response}
-        else: analysis_result = {"error": "No valid JSON object found in LLM response.", "raw_response": raw_response}
+        if LLM_STREAMING: analysis_result = stream_llm_fields(prompt, LLM_REQUIRED_KEYS, LLM_REQUIRED_KEYS if LLM_STREAM_STOP_AT_REQUIRED else LLM_FEATURE_KEYS)
+        else: analysis_result = parse_llm_json(llm_complete(prompt, max_tokens=1024), LLM_REQUIRED_KEYS)
     except Exception as e: print(f"Error during Together AI API call: {e}"); analysis_result = {"error": f"API communication error: {e}"}
     return analysis_result
 
 # ----------------------------------------------------------------------------
-# HELPER FUNCTION: Map Credibility Text to Level (Unchanged)
+# CONCURRENT EXECUTION (bounded thread pool + per-backend limits)
+# ----------------------------------------------------------------------------
+# All sentiment, bias and LLM calls for every article of a request are submitted
+# at once to a shared pool. Each backend additionally has its own semaphore so a
+# burst of requests cannot flood a single upstream.
+ANALYSIS_CONCURRENT = env_flag("ANALYSIS_CONCURRENT", True)
+ANALYSIS_MAX_WORKERS = env_int("ANALYSIS_MAX_WORKERS", 16)
+BACKEND_CONCURRENCY = {
+    "sentiment": env_int("HF_SENTIMENT_CONCURRENCY", 4),
+    "bias": env_int("HF_BIAS_CONCURRENCY", 4),
+    "llm": env_int("LLM_CONCURRENCY", 4),
+}
+BACKEND_CALL_TIMEOUTS = {
+    "sentiment": env_float("HF_SENTIMENT_CALL_TIMEOUT", 90),
+    "bias": env_float("HF_BIAS_CALL_TIMEOUT", 90),
+    "llm": env_float("LLM_CALL_TIMEOUT", 90),
+}
+# Topic requests search TOPIC_CANDIDATE_URLS links and stop scraping once TOPIC_MAX_ARTICLES are usable
+TOPIC_MAX_ARTICLES = env_int("TOPIC_MAX_ARTICLES", 3)
+TOPIC_CANDIDATE_URLS = env_int("TOPIC_CANDIDATE_URLS", 5)
+backend_semaphores = {name: threading.BoundedSemaphore(max(1, limit)) for name, limit in BACKEND_CONCURRENCY.items()}
+analysis_executor = ThreadPoolExecutor(max_workers=max(1, ANALYSIS_MAX_WORKERS), thread_name_prefix="analysis")
+
+# Micro-batching: concurrent sentiment/bias requests (across articles and HTTP requests)
+# are grouped into one batched forward pass or API call. The backend limit then
+# caps concurrent batches rather than concurrent texts.
+CLASSIFIER_BATCHING = env_flag("CLASSIFIER_BATCHING", True)
+CLASSIFIER_MAX_BATCH = env_int("CLASSIFIER_MAX_BATCH", 16)
+CLASSIFIER_BATCH_WINDOW_MS = env_float("CLASSIFIER_BATCH_WINDOW_MS", 15)
+
+def make_classifier_batcher(kind, api_url):
+    return MicroBatcher(kind, lambda texts: classify_batch(kind, api_url, texts), max_batch_size=CLASSIFIER_MAX_BATCH,
+                        max_wait_ms=CLASSIFIER_BATCH_WINDOW_MS, max_concurrent_batches=BACKEND_CONCURRENCY[kind])
+
+classifier_batchers = {"sentiment": make_classifier_batcher("sentiment", HF_SENTIMENT_URL), "bias": make_classifier_batcher("bias", HF_BIAS_URL)} if CLASSIFIER_BATCHING else {}
+
+def run_backend_call(backend, func, text):
+    """Runs one backend call while holding that backend's concurrency slot (timed as pipeline stage `backend`)."""
+    with stage_span(backend) as span:
+        if backend in classifier_batchers: result = func(text) # The batcher enforces the limit per batch
+        else:
+            with backend_semaphores[backend]: result = func(text)
+        if isinstance(result, dict) and "error" in result: span.fail()
+        return result
+
+def backend_error_result(backend, message):
+    """Builds the same error shape the backend functions return on failure."""
+    if backend == "sentiment": return {"sentiment_binary": None, "error": message}
+    if backend == "bias": return {"bias_label": "Error", "bias_score": 0, "error": message}
+    return {"error": message}
+
+def merge_article_results(source_url, sentiment_res, bias_res, llm_res):
+    """Combines the three backend results for one article into a single dict."""
+    combined_analysis = {'source_url': source_url}
+    if "error" in sentiment_res: print(f"   -> Sentiment warning/error ({source_url}): {sentiment_res['error']}")
+    if "error" in bias_res: print(f"   -> Bias warning/error ({source_url}): {bias_res['error']}")
+    combined_analysis.update(sentiment_res); combined_analysis.update(bias_res)
+    if "error" in llm_res:
+        print(f"   -> LLM warning/error ({source_url}): {llm_res['error']}")
+        llm_defaults = { "summary": "N/A", "key_findings": [], "bias_indicators_llm": [], "credibility_assessment": "N/A", "recommended_searches": [] }
+        combined_analysis.update(llm_defaults); combined_analysis["llm_error"] = llm_res["error"]
+    else: combined_analysis.update(llm_res)
+    return combined_analysis
+
+def run_article_analyses(texts_to_analyze, on_event=None):
+    """
+    Runs sentiment, bias and LLM analysis for every article.
+    In concurrent mode all calls are in flight at once; results are always
+    returned in the same order as the input articles. `on_event(stage, data)`
+    is called as soon as each individual backend result is available, and
+    with stage "llm_field" for each LLM field as it streams in.
+    """
+    backends = [("sentiment", get_sentiment_hf), ("bias", get_bias_hf), ("llm", get_llm_features)]
+    emitted = set(); emit_lock = threading.Lock()
+    def backend_func(index, name, func):
+        if name != "llm" or on_event is None: return func
+        def with_field_events(text):
+            token = llm_field_listener.set(lambda field, value: on_event("llm_field", {"index": index, "source_url": texts_to_analyze[index]['source_url'], "field": field, "value": value}))
+            try: return func(text)
+            finally: llm_field_listener.reset(token)
+        return with_field_events
+    def emit_result(index, name, result):
+        if on_event is None: return
+        with emit_lock:
+            if (index, name) in emitted: return
+            emitted.add((index, name))
+        on_event(name, {"index": index, "source_url": texts_to_analyze[index]['source_url'], "result": result})
+
+    if not ANALYSIS_CONCURRENT:
+        articles = []
+        for i, item in enumerate(texts_to_analyze):
+            print(f"--- Analyzing article {i+1} from: {item['source_url']} ---")
+            results = []
+            for name, func in backends:
+                results.append(run_backend_call(name, backend_func(i, name, func), item['text'])); emit_result(i, name, results[-1])
+            articles.append(merge_article_results(item['source_url'], *results))
+        return articles
+
+    print(f"--- Analyzing {len(texts_to_analyze)} article(s) concurrently ({len(texts_to_analyze) * len(backends)} calls) ---")
+    submitted_at = time.time()
+    futures = []
+    for i, item in enumerate(texts_to_analyze):
+        article_futures = []
+        for name, func in backends:
+            future = submit_with_context(analysis_executor, run_backend_call, name, backend_func(i, name, func), item['text'])
+            if on_event is not None:
+                future.add_done_callback(lambda f, i=i, name=name: emit_result(i, name, f.result()) if not f.cancelled() and f.exception() is None else None)
+            article_futures.append(future)
+        futures.append(article_futures)
+    articles = []
+    for i, (item, article_futures) in enumerate(zip(texts_to_analyze, futures)):
+        results = []
+        for (name, _), future in zip(backends, article_futures):
+            remaining = min(BACKEND_CALL_TIMEOUTS[name] - (time.time() - submitted_at), remaining_time(float('inf')))
+            try: results.append(future.result(timeout=max(0, remaining)))
+            except FutureTimeoutError:
+                message = "latency budget exhausted" if current_deadline() and current_deadline().expired() else f"timed out after {BACKEND_CALL_TIMEOUTS[name]:.0f} seconds"
+                future.cancel(); results.append(backend_error_result(name, f"{name} call {message}."))
+            except Exception as e:
+                print(f"Unexpected error in {name} call: {e}"); traceback.print_exc(); results.append(backend_error_result(name, f"Unexpected error: {e}"))
+            emit_result(i, name, results[-1]) # No-op if the done callback already emitted it
+        articles.append(merge_article_results(item['source_url'], *results))
+    print(f"Concurrent article analysis finished in {time.time() - submitted_at:.2f} seconds.")
+    return articles
+
+# ----------------------------------------------------------------------------
+# NEAR-DUPLICATE ARTICLES
+# ----------------------------------------------------------------------------
+# Syndicated copies of one story are clustered by MinHash similarity before the
+# model calls: each cluster is analyzed once and the result is copied to its
+# members, which are marked "duplicate_of" and counted once by the topic
+# aggregate. Analyzed articles also go into a persistent signature index, so
+# a copy of a story analyzed by an earlier request reuses that analysis.
+DEDUP_ENABLED = env_flag("DEDUP_ENABLED", True)
+DEDUP_THRESHOLD = env_float("DEDUP_THRESHOLD", 0.8) # Estimated Jaccard similarity of word 4-gram sets
+DEDUP_INDEX_ENABLED = env_flag("DEDUP_INDEX_ENABLED", True)
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join('cache', 'signatures.sqlite3'))
+minhasher = MinHasher(num_perm=128, shingle_size=4)
+signature_index = SignatureIndex(
+    DEDUP_INDEX_PATH,
+    ttl=env_float("RESULT_CACHE_TTL_HOURS", 168) * 3600, # Reused analyses age out like cached ones
+    max_entries=env_int("DEDUP_INDEX_MAX_ENTRIES", 50000),
+) if DEDUP_ENABLED and DEDUP_INDEX_ENABLED else None
+NEAR_DUPLICATES = REGISTRY.counter("near_duplicate_articles_total", "Articles answered with a near-duplicate's analysis instead of model calls.", ["scope"])
+
+def article_model_key():
+    """Identifies the models and prompts behind a stored article analysis."""
+    return make_cache_key("article", HF_SENTIMENT_URL, classifier_backend("sentiment"), HF_BIAS_URL, classifier_backend("bias"), *chunking_key(),
+                          *llm_features_key())
+
+def is_complete_analysis(article):
+    return is_valid_article(article) and 'llm_error' not in article
+
+def analyze_articles(texts_to_analyze, on_event=None, use_index=True):
+    """
+    Runs sentiment, bias and LLM analysis for every article (see run_article_analyses),
+    once per cluster of near-duplicates and not at all for copies of an indexed article.
+    `use_index=False` (direct text input) skips the signature index both ways: a user's
+    edited text may differ from a stored one in exactly the word that matters.
+    """
+    if not DEDUP_ENABLED: return run_article_analyses(texts_to_analyze, on_event)
+    with stage_span("dedup"):
+        signatures = [minhasher.signature(item['text']) for item in texts_to_analyze]
+        clusters = cluster_near_duplicates(signatures, DEDUP_THRESHOLD)
+        model_key = article_model_key()
+        index = signature_index if use_index else None
+        matches = {cluster[0]: index.find(signatures[cluster[0]], model_key, DEDUP_THRESHOLD) for cluster in clusters} if index else {}
+    members = {cluster[0]: cluster for cluster in clusters}
+    to_run = [rep for rep in members if not matches.get(rep)]
+    duplicates = len(texts_to_analyze) - len(clusters)
+    if duplicates or len(to_run) < len(clusters):
+        print(f"Near-duplicates: {duplicates} in-request copies, {len(clusters) - len(to_run)} article(s) matched the signature index; analyzing {len(to_run)} of {len(texts_to_analyze)}.")
+    NEAR_DUPLICATES.inc(duplicates, scope="request"); NEAR_DUPLICATES.inc(len(clusters) - len(to_run), scope="index")
+
+    def emit_for_members(stage, data):
+        for i in members[to_run[data["index"]]]: on_event(stage, {**data, "index": i, "source_url": texts_to_analyze[i]['source_url']})
+    analyzed = run_article_analyses([texts_to_analyze[rep] for rep in to_run], emit_for_members if on_event else None)
+    results = dict(zip(to_run, analyzed))
+    for rep, match in matches.items():
+        if not match: continue
+        article = dict(match["analysis"], source_url=texts_to_analyze[rep]['source_url'])
+        if match["url"] != article['source_url']: article['near_duplicate_of'] = {"source_url": match["url"], "similarity": round(match["similarity"], 3)}
+        results[rep] = article
+        if on_event is not None:
+            for i in members[rep]:
+                for name in ("sentiment", "bias", "llm"): on_event(name, {"index": i, "source_url": texts_to_analyze[i]['source_url'], "result": article})
+    if index:
+        for rep, article in zip(to_run, analyzed):
+            if not is_complete_analysis(article): continue
+            try: index.add(article['source_url'], signatures[rep], model_key, {k: v for k, v in article.items() if k != 'source_url'})
+            except sqlite3.Error as e: print(f"Warning: Could not index article signature: {e}")
+
+    articles = [None] * len(texts_to_analyze)
+    for rep, cluster in members.items():
+        for i in cluster:
+            article = copy.deepcopy(results[rep]); article['source_url'] = texts_to_analyze[i]['source_url']
+            if i != rep: article['duplicate_of'] = texts_to_analyze[rep]['source_url']; article.pop('near_duplicate_of', None)
+            articles[i] = article
+    return articles
+
+# ----------------------------------------------------------------------------
+# HELPER FUNCTION: Map Credibility Text to Level
 # ----------------------------------------------------------------------------
 def map_credibility_to_level(assessment_text):
     if not assessment_text or not isinstance(assessment_text, str): return "Medium"
@@ -233,43 +908,111 @@ def map_credibility_to_level(assessment_text):
     return "Medium"
 
 # ----------------------------------------------------------------------------
-# CORE ANALYSIS PIPELINE FUNCTION (Unchanged)
+# TOPIC AGGREGATION (several articles -> one result)
+# ----------------------------------------------------------------------------
+def topic_aggregate_for(articles_analyzed):
+    """TopicAggregate over analyzed articles (topic watches keep theirs up to date incrementally instead)."""
+    aggregate = TopicAggregate()
+    for a in articles_analyzed: aggregate.add(a, map_credibility_to_level(a.get('credibility_assessment')))
+    return aggregate
+
+def aggregate_topic_results(topic, articles_analyzed, aggregate=None):
+    """
+    Result fields for a multi-article topic: (fields, sentiment_dist, bias_dist).
+    Counts come from `aggregate` (default: built from the articles); texts are
+    combined from the articles and, with LLM_MAP_REDUCE, synthesized. Articles
+    marked "duplicate_of" another are only listed under analysis.duplicates.
+    """
+    aggregate = aggregate or topic_aggregate_for(articles_analyzed)
+    if not aggregate.valid:
+        print("Warning: All articles for topic analysis had errors."); analysis_data = articles_analyzed[0] # Fallback
+        fields = {'analysis': analysis_data, 'sentiment': "Error", 'bias': analysis_data.get('bias_label', 'Error'), 'summary': analysis_data.get('summary', 'N/A'),
+                  'sentiment_value': 0, 'bias_value': analysis_data.get('bias_score', 0)}
+        analysis_data['credibility_level'] = map_credibility_to_level(analysis_data.get('credibility_assessment'))
+        return fields, {"Positive": 0, "Negative": 0, "Neutral": 0}, {fields['bias']: fields['bias_value']}
+    overall_sentiment_label, overall_sentiment_value = aggregate.sentiment()
+    overall_bias, avg_bias_score = aggregate.bias()
+    duplicates = [{"source_url": a.get('source_url', ''), "duplicate_of": a['duplicate_of']} for a in articles_analyzed if a.get('duplicate_of')]
+    articles_analyzed = [a for a in articles_analyzed if not a.get('duplicate_of')] # Near-duplicate copies repeat their representative
+    combined_summary = "\n\n---\n\n".join([f"Article {i+1} ({a.get('source_url', '')}):\n{a.get('summary', 'N/A')}" for i, a in enumerate(articles_analyzed)])
+    combined_findings = [f"[{a.get('bias_label', '?')}/{('Pos' if a.get('sentiment_binary')==1 else 'Neg' if a.get('sentiment_binary')==0 else '?')}] {finding}" for a in articles_analyzed for finding in a.get('key_findings', [])]
+    combined_indicators = [f"[{a.get('bias_label', '?')}] {indicator}" for a in articles_analyzed for indicator in a.get('bias_indicators_llm', [])]
+    overall_credibility_text = articles_analyzed[0].get('credibility_assessment', 'N/A')
+    combined_searches = list(set(s for a in articles_analyzed for s in a.get('recommended_searches', [])))
+    article_summaries = combined_summary
+    llm_articles = [a for a in articles_analyzed if 'llm_error' not in a]
+    synthesis = synthesize_topic(topic, llm_articles) if LLM_MAP_REDUCE and llm_articles else {"error": "No article summaries to synthesize."}
+    if "error" not in synthesis:
+        combined_summary = synthesis.get('summary') or combined_summary
+        combined_findings = [str(f) for f in synthesis.get('key_findings', [])] or combined_findings
+        combined_indicators = [str(i) for i in synthesis.get('bias_indicators', [])] or combined_indicators
+    else: print(f"   -> Topic synthesis warning/error: {synthesis['error']}")
+    analysis = {
+        'sentiment': overall_sentiment_label, 'sentiment_score': overall_sentiment_value, 'political_bias': overall_bias, 'political_bias_score': avg_bias_score,
+        'summary': combined_summary, 'key_findings': combined_findings[:10], 'bias_indicators': combined_indicators[:10],
+        'credibility_assessment': overall_credibility_text, 'credibility_level': aggregate.credibility_level(),
+        'recommended_searches': combined_searches[:5], 'article_summaries': article_summaries }
+    if duplicates: analysis['duplicates'] = duplicates
+    fields = {'analysis': analysis, 'sentiment': overall_sentiment_label, 'bias': overall_bias, 'summary': combined_summary,
+              'sentiment_value': overall_sentiment_value, 'bias_value': avg_bias_score}
+    return fields, aggregate.sentiment_distribution(), aggregate.bias_distribution()
+
+# ----------------------------------------------------------------------------
+# CORE ANALYSIS PIPELINE FUNCTION
 # ----------------------------------------------------------------------------
-def perform_analysis(input_type, input_value):
+analysis_flights = SingleFlight("analysis")
+
+def analysis_input_key(input_type, input_value):
+    """Key identifying equivalent analysis requests (whitespace-insensitive; topics also case-insensitive)."""
+    value = normalize_text(input_value)
+    if input_type == 'topic': value = value.lower()
+    return make_cache_key("analysis", input_type, value)
+
+def perform_analysis(input_type, input_value, on_event=None, deadline_seconds=None, trace_id=None):
+    """
+    Runs the full pipeline. `on_event(stage, data)`, if given, receives intermediate results (scrape, sentiment, bias, llm).
+    Identical requests arriving while one is in flight share its search, scrapes and model calls.
+    `deadline_seconds` is the end-to-end latency budget (default ANALYSIS_DEADLINE_SECONDS, 0 = none).
+    Log lines are tagged with `trace_id` (default: the current request's, or a new one).
+    """
+    budget = ANALYSIS_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    run = lambda emit: run_analysis_pipeline(input_type, input_value, emit)
+    with trace_scope(trace_id or current_trace_id()), stage_span("analysis") as span, deadline_scope(budget): # Followers wait within the budget too
+        results = analysis_flights.do_with_events(analysis_input_key(input_type, input_value), run, on_event)
+        outcome = "error" if "error" in results else "partial" if results.get('partial') else "ok"
+        if outcome == "error": span.fail()
+        ANALYSES.inc(input_type=input_type, outcome=outcome)
+        return results
+
+def run_analysis_pipeline(input_type, input_value, on_event=None):
+    """Runs the full pipeline for one request (see perform_analysis)."""
     start_time = time.time(); final_results = {}; articles_analyzed = []
     try:
         texts_to_analyze = []
+        scrape_budget = remaining_time() * SCRAPE_BUDGET_SHARE if current_deadline() else None # Leave the rest for the models
         if input_type == 'text': texts_to_analyze.append({'text': input_value, 'source_url': 'Direct Text Input'}); final_results['source_display'] = "Direct Text Input"
         elif input_type == 'url':
-            print(f"Scraping URL: {input_value}"); article_text = scrape_article_content(input_value)
-            if not isinstance(article_text, str) or "error" in article_text.lower() or "no extractable" in article_text.lower(): raise ValueError(f"Scraping failed: {article_text if isinstance(article_text, str) else 'Unknown error'}")
+            print(f"Scraping URL: {input_value}")
+            with deadline_scope(scrape_budget): article_text = scrape_article_content(input_value)
+            if not is_usable_content(article_text): raise ValueError(f"Scraping failed: {article_text if isinstance(article_text, str) else 'Unknown error'}")
             texts_to_analyze.append({'text': article_text, 'source_url': input_value}); final_results['source_display'] = input_value
         elif input_type == 'topic':
-            print(f"Fetching articles for topic: {input_value}"); fetched_articles = fetch_articles_for_topic(input_value, max_articles=3)
+            print(f"Fetching articles for topic: {input_value}")
+            with deadline_scope(scrape_budget) as scrape_deadline: fetched_articles = fetch_articles_for_topic(input_value, max_articles=TOPIC_CANDIDATE_URLS, stop_after=TOPIC_MAX_ARTICLES)
+            if scrape_deadline and scrape_deadline.expired(): final_results['partial'] = True # Some candidate URLs were not scraped in time
             if not fetched_articles: raise ValueError(f"Could not find articles for topic: {input_value}")
             for article in fetched_articles:
                 content = article.get('content'); url = article.get('url', 'Unknown URL')
-                if content and isinstance(content, str) and "error" not in content.lower() and "no extractable" not in content.lower(): texts_to_analyze.append({'text': content, 'source_url': url})
-                else: print(f"   -> Skipping article {url} due to scraping/content issue.")
+                if not is_usable_content(content): print(f"   -> Skipping article {url} due to scraping/content issue.")
+                elif len(texts_to_analyze) < TOPIC_MAX_ARTICLES: texts_to_analyze.append({'text': content, 'source_url': url})
             if not texts_to_analyze: raise ValueError(f"Could not get content for any articles for topic: {input_value}")
             final_results['source_display'] = f"Topic: {input_value} ({len(texts_to_analyze)} articles processed)"
         else: raise ValueError(f"Invalid input_type: {input_type}")
 
-        for i, item in enumerate(texts_to_analyze):
-            print(f"--- Analyzing article {i+1} from: {item['source_url']} ---"); text = item['text']
-            combined_analysis = {'source_url': item['source_url']}
-            sentiment_res = get_sentiment_hf(text); bias_res = get_bias_hf(text)
-            if "error" in sentiment_res: print(f"   -> Sentiment warning/error: {sentiment_res['error']}")
-            if "error" in bias_res: print(f"   -> Bias warning/error: {bias_res['error']}")
-            combined_analysis.update(sentiment_res); combined_analysis.update(bias_res)
-            llm_res = get_llm_features(text)
-            if "error" in llm_res:
-                print(f"   -> LLM warning/error: {llm_res['error']}")
-                llm_defaults = { "summary": "N/A", "key_findings": [], "bias_indicators_llm": [], "credibility_assessment": "N/A", "recommended_searches": [] }
-                combined_analysis.update(llm_defaults); combined_analysis["llm_error"] = llm_res["error"]
-            else: combined_analysis.update(llm_res)
-            articles_analyzed.append(combined_analysis)
+        if on_event is not None: on_event("scrape", {"source_display": final_results.get('source_display', 'N/A'), "articles": [{"index": i, "source_url": item['source_url'], "chars": len(item['text'])} for i, item in enumerate(texts_to_analyze)]})
+        articles_analyzed = analyze_articles(texts_to_analyze, on_event, use_index=input_type != 'text') # Only scraped articles are syndicated copies
 
+        aggregation_start = time.time()
         if not articles_analyzed: raise ValueError("No analysis results were generated.")
         formatted_results = { 'analysis': {}, 'visualization_data': {}, 'source_display': final_results.get('source_display', 'N/A') }
 
@@ -286,63 +1029,256 @@ def perform_analysis(input_type, input_value):
             for b_label in ['Left', 'Center', 'Right']:
                  if b_label not in bias_dist: bias_dist[b_label] = 0
         else:
-            valid_articles = [a for a in articles_analyzed if a.get('sentiment_binary') is not None and 'error' not in a.get('bias_label', 'Error').lower()]
-            if not valid_articles:
-                 print("Warning: All articles for topic analysis had errors."); analysis_data = articles_analyzed[0] # Fallback
-                 formatted_results['analysis'] = analysis_data; formatted_results['sentiment'] = "Error"; formatted_results['bias'] = analysis_data.get('bias_label', 'Error')
-                 formatted_results['summary'] = analysis_data.get('summary', 'N/A'); formatted_results['sentiment_value'] = 0; formatted_results['bias_value'] = analysis_data.get('bias_score', 0)
-                 formatted_results['analysis']['credibility_level'] = map_credibility_to_level(analysis_data.get('credibility_assessment'))
-                 sentiment_dist = {"Positive": 0, "Negative": 0, "Neutral": 0}; bias_dist = {formatted_results['bias']: formatted_results['bias_value']}
-            else:
-                avg_sentiment_binary = statistics.mean([a.get('sentiment_binary', 0) for a in valid_articles])
-                overall_sentiment_label = "Positive" if avg_sentiment_binary >= 0.5 else "Negative"; overall_sentiment_value = 100 if overall_sentiment_label == "Positive" else 0
-                avg_bias_score = statistics.mean([a.get('bias_score', 0) for a in valid_articles]) if valid_articles else 0
-                bias_labels = [a.get('bias_label', 'N/A') for a in valid_articles]; overall_bias = statistics.mode(bias_labels) if bias_labels else 'N/A'
-                combined_summary = "\n\n---\n\n".join([f"Article {i+1} ({a.get('source_url', '')}):\n{a.get('summary', 'N/A')}" for i, a in enumerate(articles_analyzed)])
-                combined_findings = [f"[{a.get('bias_label', '?')}/{('Pos' if a.get('sentiment_binary')==1 else 'Neg' if a.get('sentiment_binary')==0 else '?')}] {finding}" for a in articles_analyzed for finding in a.get('key_findings', [])]
-                combined_indicators = [f"[{a.get('bias_label', '?')}] {indicator}" for a in articles_analyzed for indicator in a.get('bias_indicators_llm', [])]
-                credibility_levels = [map_credibility_to_level(a.get('credibility_assessment')) for a in articles_analyzed]; overall_credibility_level = statistics.mode(credibility_levels) if credibility_levels else "Medium"
-                overall_credibility_text = articles_analyzed[0].get('credibility_assessment', 'N/A')
-                combined_searches = list(set(s for a in articles_analyzed for s in a.get('recommended_searches', [])))
-                formatted_results['analysis'] = {
-                    'sentiment': overall_sentiment_label, 'sentiment_score': overall_sentiment_value, 'political_bias': overall_bias, 'political_bias_score': int(avg_bias_score),
-                    'summary': combined_summary, 'key_findings': combined_findings[:10], 'bias_indicators': combined_indicators[:10],
-                    'credibility_assessment': overall_credibility_text, 'credibility_level': overall_credibility_level,
-                    'recommended_searches': combined_searches[:5] }
-                formatted_results['sentiment'] = overall_sentiment_label; formatted_results['bias'] = overall_bias; formatted_results['summary'] = combined_summary
-                formatted_results['sentiment_value'] = overall_sentiment_value; formatted_results['bias_value'] = int(avg_bias_score)
-                pos_count = sum(1 for a in valid_articles if a.get('sentiment_binary') == 1); neg_count = len(valid_articles) - pos_count; total_valid = len(valid_articles)
-                sentiment_dist = {"Positive": int((pos_count / total_valid) * 100) if total_valid else 0, "Negative": int((neg_count / total_valid) * 100) if total_valid else 0, "Neutral": 0 }
-                bias_dist = {};
-                for label in ['Left', 'Center', 'Right']: scores = [a.get('bias_score', 0) for a in valid_articles if a.get('bias_label') == label]; bias_dist[label] = int(statistics.mean(scores)) if scores else 0
+            topic_fields, sentiment_dist, bias_dist = aggregate_topic_results(input_value, articles_analyzed)
+            formatted_results.update(topic_fields)
 
         formatted_results['visualization_data'] = { 'sentiment_distribution': sentiment_dist, 'bias_distribution': bias_dist }
+        if final_results.get('partial') or (current_deadline() and current_deadline().expired()):
+            formatted_results['partial'] = True; print(f"Latency budget of {current_deadline().budget:.0f} seconds exhausted, returning partial results.")
+        degraded = unavailable_backends()
+        if degraded: formatted_results['degraded_backends'] = degraded; print(f"Returning degraded result, unavailable upstream(s): {', '.join(degraded)}")
         formatted_results['sentiment_value'] = max(0, min(100, formatted_results.get('sentiment_value', 0)))
         formatted_results['bias_value'] = max(0, min(100, formatted_results.get('bias_value', 0)))
         if 'analysis' in formatted_results and 'bias_indicators_llm' in formatted_results['analysis']:
              formatted_results['analysis']['bias_indicators'] = formatted_results['analysis'].pop('bias_indicators_llm')
 
+        observe_stage("aggregation", time.time() - aggregation_start)
         print(f"Analysis pipeline completed in {time.time() - start_time:.2f} seconds.")
         return formatted_results
 
     except ValueError as ve: print(f"ValueError during analysis pipeline: {ve}"); return {"error": f"{ve}"}
     except Exception as e: print(f"Unexpected error during analysis pipeline: {e}"); traceback.print_exc(); return {"error": f"An unexpected analysis error occurred: {getattr(e, 'message', str(e))}"}
 
+# ----------------------------------------------------------------------------
+# BACKGROUND JOB QUEUE
+# ----------------------------------------------------------------------------
+# POST /jobs queues an analysis and returns immediately; a pool of worker
+# threads runs perform_analysis and records progress in a SQLite table so
+# queued and interrupted jobs survive a restart.
+JOBS_ENABLED = env_flag("JOBS_ENABLED", True)
+JOBS_DB = os.getenv("JOBS_DB", os.path.join('instance', 'jobs.sqlite3'))
+JOBS_WORKERS = env_int("JOBS_WORKERS", 2)
+JOBS_DEADLINE_SECONDS = env_float("JOBS_DEADLINE_SECONDS", 0) # Background jobs have no latency budget by default
+
+def run_analysis_job(payload, report_progress):
+    """JobQueue handler: runs one analysis, reporting stage and completed backend calls as progress."""
+    input_type, input_value = payload['input_type'], payload['input_value']
+    progress = {"stage": "queued", "articles": None, "completed_calls": 0, "total_calls": None}; progress_lock = threading.Lock()
+    def on_event(stage, data):
+        with progress_lock:
+            progress["stage"] = stage
+            if stage == "scrape": progress["articles"] = len(data["articles"]); progress["total_calls"] = 3 * len(data["articles"])
+            elif stage in ("sentiment", "bias", "llm"): progress["completed_calls"] += 1
+            report_progress(dict(progress))
+    report_progress({**progress, "stage": "scrape"})
+    with trace_scope(payload.get('trace_id')):
+        results = perform_analysis(input_type, input_value, on_event=on_event, deadline_seconds=JOBS_DEADLINE_SECONDS)
+        if "error" not in results: add_to_history(input_type, input_value, results)
+    return results
+
+job_queue = JobQueue(JOBS_DB, run_analysis_job, num_workers=JOBS_WORKERS) if JOBS_ENABLED else None
+if job_queue: background_starters.append(job_queue.start)
+
+# ----------------------------------------------------------------------------
+# TOPIC WATCHES (scheduled incremental topic analysis)
+# ----------------------------------------------------------------------------
+# POST /watches registers a topic that a background thread re-searches every
+# interval. Only new URLs, and known URLs not checked for WATCH_RECHECK_MINUTES,
+# are scraped; only articles whose content fingerprint changed are analyzed,
+# and the stored aggregate is adjusted by exactly those articles.
+WATCH_ENABLED = env_flag("WATCH_ENABLED", True)
+WATCH_DB = os.getenv("WATCH_DB", os.path.join('instance', 'watches.sqlite3'))
+WATCH_POLL_SECONDS = env_float("WATCH_POLL_SECONDS", 30)
+WATCH_DEFAULT_INTERVAL_MINUTES = env_float("WATCH_DEFAULT_INTERVAL_MINUTES", 60)
+WATCH_MIN_INTERVAL_MINUTES = env_float("WATCH_MIN_INTERVAL_MINUTES", 5)
+WATCH_CANDIDATE_URLS = env_int("WATCH_CANDIDATE_URLS", 10) # Search results considered per refresh
+WATCH_RECHECK_MINUTES = env_float("WATCH_RECHECK_MINUTES", 360) # Known URLs are re-scraped (for changes) at most this often
+WATCH_MAX_ARTICLES = env_int("WATCH_MAX_ARTICLES", 30) # Per watch; articles not seen in search results for longest are dropped first
+WATCH_LEASE_MINUTES = env_float("WATCH_LEASE_MINUTES", 15) # A claimed refresh that never finishes (process died) is retried after this
+
+def credibility_of(article): return map_credibility_to_level(article.get('credibility_assessment'))
+
+def watch_results(topic, analyses, aggregate):
+    """The /analyze-shaped topic result for a watch's indexed articles."""
+    fields, sentiment_dist, bias_dist = aggregate_topic_results(topic, analyses, aggregate)
+    results = {**fields, 'source_display': f"Topic watch: {topic} ({len(analyses)} articles)",
+               'visualization_data': {'sentiment_distribution': sentiment_dist, 'bias_distribution': bias_dist}}
+    degraded = unavailable_backends()
+    if degraded: results['degraded_backends'] = degraded
+    results['sentiment_value'] = max(0, min(100, results.get('sentiment_value', 0)))
+    results['bias_value'] = max(0, min(100, results.get('bias_value', 0)))
+    return results
+
+def refresh_watch(watch):
+    """TopicWatcher callback: one incremental refresh of a watched topic (see the section comment)."""
+    watch_id, topic = watch['id'], watch['topic']
+    start = time.time(); next_run_at = start + watch['interval_seconds']
+    with trace_scope(f"watch{watch_id}-{new_trace_id()[:6]}"), stage_span("watch_refresh") as span:
+        print(f"--- Refreshing topic watch {watch_id}: {topic} ---")
+        urls = search_article_urls(topic, max_results=WATCH_CANDIDATE_URLS, use_cache=False) # A watch wants current results
+        if not urls:
+            span.fail(); topic_watches.record_failure(watch_id, {"error": f"Could not find articles for topic: {topic}"}, next_run_at); return
+        index = topic_watches.articles(watch_id)
+        found = {}
+        for url in urls:
+            if len(found) < WATCH_MAX_ARTICLES: found.setdefault(normalize_url(url), url) # More would be evicted again right away
+        to_scrape = [(key, url) for key, url in found.items() if key not in index or start - index[key]['checked_at'] >= WATCH_RECHECK_MINUTES * 60]
+        contents = {article['url']: article['content'] for article in scrape_urls([url for _, url in to_scrape])}
+        changed = []; unchanged = []; failed = 0
+        for key, url in to_scrape:
+            content = contents.get(url)
+            if not is_usable_content(content): print(f"   -> Skipping article {url} due to scraping/content issue."); failed += 1; continue
+            fingerprint = content_fingerprint(content)
+            if key in index and index[key]['content_hash'] == fingerprint: unchanged.append(key)
+            else: changed.append((key, url, content, fingerprint))
+        print(f"Watch {watch_id}: {len(found)} URL(s) found, {len(to_scrape)} scraped, {len(changed)} new/changed, {len(unchanged)} unchanged.")
+
+        aggregate = TopicAggregate.from_dict(watch['aggregate'])
+        analyses = {key: row['analysis'] for key, row in index.items()} # Oldest first
+        last_seen = {key: start if key in found else row['last_seen'] for key, row in index.items()}
+        upserts = []
+        new_analyses = analyze_articles([{'text': content, 'source_url': url} for _, url, content, _ in changed]) if changed else []
+        for (key, url, _, fingerprint), analysis in zip(changed, new_analyses):
+            copy_of = normalize_url(analysis.get('near_duplicate_of', {}).get('source_url', ''))
+            if copy_of != key and copy_of in analyses: analysis['duplicate_of'] = analysis.pop('near_duplicate_of')['source_url'] # Syndicated copy of an article this watch already has
+            if key in analyses: aggregate.remove(analyses[key], credibility_of(analyses[key]))
+            aggregate.add(analysis, credibility_of(analysis)); analyses[key] = analysis; last_seen[key] = start
+            complete = is_valid_article(analysis) and 'llm_error' not in analysis # Incomplete analyses are redone at the next check
+            upserts.append({"url_key": key, "url": url, "content_hash": fingerprint if complete else None, "analysis": analysis})
+        evicted = sorted(analyses, key=lambda key: last_seen[key])[:max(0, len(analyses) - WATCH_MAX_ARTICLES)]
+        for key in evicted: aggregate.remove(analyses[key], credibility_of(analyses[key])); del analyses[key]
+        upserts = [article for article in upserts if article["url_key"] not in evicted]
+
+        results = None
+        if analyses and (upserts or evicted or not topic_watches.get(watch_id, with_results=True)['results']):
+            with stage_span("aggregation"): results = watch_results(topic, list(analyses.values()), aggregate)
+        status = {"new": sum(1 for key, *_ in changed if key not in index), "changed": sum(1 for key, *_ in changed if key in index),
+                  "unchanged": len(unchanged), "skipped_recent": len(found) - len(to_scrape), "scrape_failed": failed,
+                  "evicted": len(evicted), "articles": len(analyses), "seconds": round(time.time() - start, 2)}
+        if not analyses: status["error"] = f"Could not get content for any articles for topic: {topic}"; span.fail()
+        topic_watches.save_refresh(watch_id, upserts, [key for key in found if key in index], unchanged, evicted, aggregate, results, status, next_run_at)
+        print(f"Topic watch {watch_id} refreshed in {status['seconds']:.2f} seconds: {json.dumps(status)}")
+
+topic_watches = TopicWatchStore(WATCH_DB) if WATCH_ENABLED else None
+topic_watcher = TopicWatcher(topic_watches, refresh_watch, poll_interval=WATCH_POLL_SECONDS, lease_seconds=WATCH_LEASE_MINUTES * 60) if WATCH_ENABLED else None
+if topic_watcher: background_starters.append(topic_watcher.start)
+
+# ----------------------------------------------------------------------------
+# SEARCH PREFETCH (warms the search cache for popular topics)
+# ----------------------------------------------------------------------------
+# Every SEARCH_PREFETCH_INTERVAL_MINUTES the most requested topics of the last
+# SEARCH_PREFETCH_DAYS (from the history) get a background search if their
+# cached results are not fresh, so repeated topics skip the search entirely.
+SEARCH_PREFETCH_INTERVAL_MINUTES = env_float("SEARCH_PREFETCH_INTERVAL_MINUTES", 10) # 0 = off
+SEARCH_PREFETCH_TOPICS = env_int("SEARCH_PREFETCH_TOPICS", 10)
+SEARCH_PREFETCH_DAYS = env_float("SEARCH_PREFETCH_DAYS", 7)
+
+def popular_topics(limit=SEARCH_PREFETCH_TOPICS, days=SEARCH_PREFETCH_DAYS):
+    """Most analyzed topics of the last `days` days, most frequent (then most recent) first."""
+    since_id = int((time.time() - days * 86400) * 1000) # History ids are millisecond timestamps
+    return [topic for topic, _ in history_store.popular_values('topic', since_id=since_id, limit=limit)]
+
+def prefetch_popular_searches():
+    """Prefetch hook: queues background searches for popular topics; returns (queued, topics)."""
+    try: topics = popular_topics()
+    except sqlite3.Error as e: print(f"Warning: Could not read popular topics: {e}"); return 0, []
+    queued = prefetch_searches(topics, max_results=TOPIC_CANDIDATE_URLS)
+    if queued: print(f"Search prefetch: refreshing {queued} of {len(topics)} popular topic(s).")
+    return queued, topics
+
+def search_prefetch_loop():
+    while True:
+        prefetch_popular_searches()
+        time.sleep(SEARCH_PREFETCH_INTERVAL_MINUTES * 60)
+
+if search_cache is not None and SEARCH_PREFETCH_INTERVAL_MINUTES > 0:
+    background_starters.append(lambda: threading.Thread(target=search_prefetch_loop, name="search-prefetch", daemon=True).start())
+
+# ----------------------------------------------------------------------------
+# BULK ANALYSIS (POST /analyze/batch and analyze_batch.py)
+# ----------------------------------------------------------------------------
+# Records run through perform_analysis with bounded parallelism, so they share
+# the micro-batched classifiers, the result cache and in-flight coalescing.
+BATCH_MAX_PARALLEL = env_int("BATCH_MAX_PARALLEL", 8)
+
+def analyze_batch_record(index, record, error, save_history=False, deadline_seconds=None, trace_prefix=None):
+    """Analyzes one batch record; returns its output line (dict)."""
+    output = {"offset": index}
+    if record is not None:
+        if "id" in record: output["id"] = record["id"]
+        output["input_type"] = record.get("input_type"); output["input_value"] = record.get("input_value")
+        error = error or validate_analysis_input(record.get("input_type"), record.get("input_value"))
+    if error: output.update(status="error", error=error); return output
+    input_type, input_value = record["input_type"], record["input_value"].strip()
+    try:
+        results = perform_analysis(input_type, input_value, deadline_seconds=deadline_seconds, trace_id=f"{trace_prefix}.{index}" if trace_prefix else None)
+    except Exception as e:
+        traceback.print_exc(); results = {"error": f"An unexpected analysis error occurred: {e}"}
+    if "error" in results: output.update(status="error", error=results["error"]); return output
+    if save_history: add_to_history(input_type, input_value, results)
+    output.update(status="ok", result=results)
+    return output
+
+def analyze_batch(lines, offset=0, parallel=BATCH_MAX_PARALLEL, save_history=False, deadline_seconds=None, trace_prefix=None):
+    """Yields one output dict per JSONL record in `lines` (after the first `offset`), in input order."""
+    return ordered_parallel_map(lambda item: analyze_batch_record(*item, save_history=save_history, deadline_seconds=deadline_seconds, trace_prefix=trace_prefix),
+                                iter_batch_records(lines, offset), parallel)
+
 # ----------------------------------------------------------------------------
 # FLASK ROUTES
 # ----------------------------------------------------------------------------
+@app.before_request
+def ensure_background_workers():
+    if not background_started: start_background_workers()
+
+@app.before_request
+def start_trace():
+    """Every request gets a trace id (the client's X-Request-ID if valid) that tags its log lines."""
+    g.trace_id = valid_trace_id(request.headers.get('X-Request-ID')) or new_trace_id()
+    g.trace_scope = trace_scope(g.trace_id); g.trace_scope.__enter__()
+
+@app.after_request
+def add_trace_header(response):
+    if 'trace_id' in g: response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    scope = g.pop('trace_scope', None)
+    if scope is not None:
+        try: scope.__exit__(None, None, None)
+        except ValueError: pass # Streamed responses may finish in a different context
+
 @app.route('/')
 def index():
     history = load_history()
     return render_template('index.html', history=history)
 
+def requested_deadline():
+    """Optional per-request "deadline_seconds" (capped by ANALYSIS_MAX_DEADLINE_SECONDS); None means the default budget."""
+    value = (request.json or {}).get('deadline_seconds') if request.is_json else None
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0: return None
+    return min(float(value), ANALYSIS_MAX_DEADLINE_SECONDS)
+
+def validate_analysis_input(input_type, input_value):
+    """Error message for an invalid input_type/input_value pair, or None."""
+    if not input_type or input_type not in ['text', 'url', 'topic']: return "Invalid input_type specified"
+    if not input_value or not isinstance(input_value, str) or not input_value.strip(): return "Input value cannot be empty"
+    return None
+
+def parse_analyze_request():
+    """Validates an analyze request body. Returns (input_type, input_value, None) or (None, None, error_response)."""
+    if not request.is_json: return None, None, (jsonify({"error": "Request must be JSON"}), 415)
+    data = request.json; input_type = data.get('input_type'); input_value = data.get('input_value')
+    error = validate_analysis_input(input_type, input_value)
+    if error: return None, None, (jsonify({"error": error}), 400)
+    return input_type, input_value, None
+
 @app.route('/analyze', methods=['POST'])
 def analyze_route():
-    if not request.is_json: return jsonify({"error": "Request must be JSON"}), 415
-    data = request.json; input_type = data.get('input_type'); input_value = data.get('input_value')
-    if not input_type or input_type not in ['text', 'url', 'topic']: return jsonify({"error": "Invalid input_type specified"}), 400
-    if not input_value or not isinstance(input_value, str) or not input_value.strip(): return jsonify({"error": "Input value cannot be empty"}), 400
-    results = perform_analysis(input_type, input_value.strip())
+    input_type, input_value, error_response = parse_analyze_request()
+    if error_response: return error_response
+    results = perform_analysis(input_type, input_value.strip(), deadline_seconds=requested_deadline(), trace_id=g.trace_id)
     if "error" in results:
          if isinstance(results.get('analysis'), dict) and "raw_response" in results['analysis']: print(f"LLM Raw Response leading to error:\n{results['analysis']['raw_response']}")
          elif "error" in results: print(f"Analysis pipeline error: {results.get('error')}")
@@ -350,24 +1286,151 @@ def analyze_route():
     add_to_history(input_type, input_value.strip(), results) # Use add_to_history
     return jsonify(results)
 
+def sse_event(stage, data):
+    """Formats one Server-Sent Event."""
+    return f"event: {stage}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream_route():
+    """
+    Streaming variant of /analyze (Server-Sent Events over the POST response).
+    Emits `scrape`, then `sentiment` / `bias` / `llm` per article as each is ready,
+    then `result` with the same payload /analyze returns (or `error`).
+    """
+    input_type, input_value, error_response = parse_analyze_request()
+    if error_response: return error_response
+    input_value = input_value.strip(); events = queue.Queue(); deadline_seconds = requested_deadline(); trace_id = g.trace_id
+
+    def run_pipeline():
+        with trace_scope(trace_id):
+            try:
+                results = perform_analysis(input_type, input_value, on_event=lambda stage, data: events.put((stage, data)), deadline_seconds=deadline_seconds)
+                if "error" in results: print(f"Analysis pipeline error: {results.get('error')}"); events.put(("error", {"error": results["error"]}))
+                else: add_to_history(input_type, input_value, results); events.put(("result", results))
+            except Exception as e: traceback.print_exc(); events.put(("error", {"error": f"An unexpected analysis error occurred: {e}"}))
+            finally: events.put(None)
+    threading.Thread(target=run_pipeline, name="analyze-stream", daemon=True).start()
+
+    def generate():
+        yield sse_event("start", {"input_type": input_type, "trace_id": trace_id})
+        while True:
+            try: item = events.get(timeout=15)
+            except queue.Empty: yield ": keep-alive\n\n"; continue
+            if item is None: break
+            yield sse_event(*item)
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch_route():
+    """
+    Bulk analysis: the body is JSONL of {"input_type", "input_value"} records; the
+    response streams one JSONL result per record in input order (application/x-ndjson).
+    Query parameters: offset (skip that many records, to resume), parallel, history=1.
+    """
+    offset = max(0, request.args.get('offset', 0, type=int) or 0)
+    parallel = max(1, min(BATCH_MAX_PARALLEL, request.args.get('parallel', BATCH_MAX_PARALLEL, type=int) or BATCH_MAX_PARALLEL))
+    save_history = request.args.get('history', '0').lower() in ('1', 'true', 'yes', 'on')
+    lines = request.get_data(as_text=True).splitlines(); trace_id = g.trace_id
+    print(f"Batch analysis of {len(lines)} line(s) from offset {offset} with parallelism {parallel}...")
+    def generate():
+        for output in analyze_batch(lines, offset=offset, parallel=parallel, save_history=save_history, trace_prefix=trace_id):
+            yield json.dumps(output) + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues an analysis and returns its job id (202). An identical queued/running job is reused."""
+    if job_queue is None: return jsonify({"error": "Background jobs are disabled."}), 503
+    input_type, input_value, error_response = parse_analyze_request()
+    if error_response: return error_response
+    input_value = input_value.strip()
+    try:
+        job_id, deduplicated = job_queue.submit({"input_type": input_type, "input_value": input_value, "trace_id": g.trace_id}, dedup_key=analysis_input_key(input_type, input_value))
+    except Exception as e:
+        print(f"Error queueing job: {e}"); traceback.print_exc()
+        return jsonify({"error": "Failed to queue job."}), 500
+    if deduplicated: print(f"Reusing in-flight job {job_id} for {input_type}: {input_value[:80]}")
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}", "deduplicated": deduplicated}), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Job status: queued | running | done | failed, with progress and, once done, the /analyze result."""
+    if job_queue is None: return jsonify({"error": "Background jobs are disabled."}), 503
+    job = job_queue.get(job_id)
+    if job is None: return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+@app.route('/watches', methods=['POST'])
+def add_watch():
+    """Registers a topic watch: {"topic": ..., "interval_minutes": 60}. The first refresh starts right away."""
+    if topic_watches is None: return jsonify({"error": "Topic watches are disabled."}), 503
+    data = request.get_json(silent=True) or {}
+    topic = data.get('topic')
+    if not isinstance(topic, str) or not topic.strip(): return jsonify({"error": "Missing topic"}), 400
+    try: interval_minutes = float(data.get('interval_minutes', WATCH_DEFAULT_INTERVAL_MINUTES))
+    except (TypeError, ValueError): return jsonify({"error": "Invalid interval_minutes"}), 400
+    if interval_minutes < WATCH_MIN_INTERVAL_MINUTES: return jsonify({"error": f"interval_minutes must be at least {WATCH_MIN_INTERVAL_MINUTES:g}"}), 400
+    watch, created = topic_watches.add(topic, interval_minutes * 60)
+    topic_watcher.wake()
+    return jsonify({**watch, "status_url": f"/watches/{watch['id']}"}), 201 if created else 200
+
+@app.route('/watches')
+def list_watches():
+    if topic_watches is None: return jsonify({"error": "Topic watches are disabled."}), 503
+    return jsonify({"watches": topic_watches.list()})
+
+@app.route('/watches/<int:watch_id>')
+def get_watch(watch_id):
+    """A watch with its latest /analyze-shaped result and the indexed articles."""
+    if topic_watches is None: return jsonify({"error": "Topic watches are disabled."}), 503
+    watch = topic_watches.get(watch_id, with_results=True)
+    if watch is None: return jsonify({"error": "Watch not found."}), 404
+    watch["articles"] = [{"url": row["url"], "first_seen": row["first_seen"], "last_seen": row["last_seen"], "changed_at": row["changed_at"],
+                          "sentiment_binary": row["analysis"].get("sentiment_binary"), "bias_label": row["analysis"].get("bias_label")}
+                         for row in topic_watches.articles(watch_id).values()]
+    return jsonify(watch)
+
+@app.route('/watches/<int:watch_id>/refresh', methods=['POST'])
+def refresh_watch_now(watch_id):
+    """Makes a watch due immediately (202); poll GET /watches/<id> for the result."""
+    if topic_watches is None: return jsonify({"error": "Topic watches are disabled."}), 503
+    if not topic_watches.schedule(watch_id, time.time()): return jsonify({"error": "Watch not found."}), 404
+    topic_watcher.wake()
+    return jsonify({"watch_id": watch_id, "status_url": f"/watches/{watch_id}"}), 202
+
+@app.route('/watches/<int:watch_id>', methods=['DELETE'])
+def delete_watch(watch_id):
+    if topic_watches is None: return jsonify({"error": "Topic watches are disabled."}), 503
+    if not topic_watches.delete(watch_id): return jsonify({"success": False, "error": "Watch not found."}), 404
+    return jsonify({"success": True, "message": "Watch deleted."})
+
 # --- NEW HISTORY DELETION ROUTES ---
+@app.route('/history')
+def list_history():
+    """Paginated history: /history?page=1&per_page=20&input_type=topic"""
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    per_page = max(1, min(200, request.args.get('per_page', HISTORY_PAGE_SIZE, type=int) or HISTORY_PAGE_SIZE))
+    input_type = request.args.get('input_type') or None
+    try:
+        items = history_store.list(limit=per_page, offset=(page - 1) * per_page, input_type=input_type)
+        return jsonify({"items": items, "page": page, "per_page": per_page, "total": history_store.count(input_type)})
+    except Exception as e:
+        print(f"Error listing history: {e}")
+        return jsonify({"error": "Failed to load history."}), 500
+
 @app.route('/history/delete/<int:item_id>', methods=['DELETE'])
 def delete_history_item(item_id):
     """Deletes a specific item from the history."""
     print(f"Attempting to delete history item with ID: {item_id}")
-    history = load_history()
-    # Filter out the item with the matching ID
-    # Make sure IDs loaded from JSON are integers for comparison
-    original_length = len(history)
-    history = [item for item in history if item.get('id') != item_id]
-
-    if len(history) < original_length:
-        if save_history_file(history):
-            print(f"Successfully deleted item {item_id}.")
-            return jsonify({"success": True, "message": "History item deleted."}), 200
-        else:
-            print(f"Error saving history file after attempting to delete item {item_id}.")
-            return jsonify({"success": False, "error": "Failed to save updated history."}), 500
+    try:
+        deleted = history_store.delete(item_id)
+    except Exception as e:
+        print(f"Error deleting history item {item_id}: {e}")
+        return jsonify({"success": False, "error": "Failed to save updated history."}), 500
+
+    if deleted:
+        print(f"Successfully deleted item {item_id}.")
+        return jsonify({"success": True, "message": "History item deleted."}), 200
     else:
         print(f"Item with ID {item_id} not found in history.")
         return jsonify({"success": False, "error": "Item not found."}), 404
@@ -376,16 +1439,60 @@ def delete_history_item(item_id):
 def clear_history():
     """Clears all items from the history."""
     print("Attempting to clear all history...")
-    if save_history_file([]): # Save an empty list
+    try:
+        history_store.clear()
         print("History cleared successfully.")
         return jsonify({"success": True, "message": "History cleared."}), 200
-    else:
-        print("Error saving empty history file.")
+    except Exception as e:
+        print(f"Error clearing history: {e}")
         return jsonify({"success": False, "error": "Failed to clear history."}), 500
 # --- END NEW ROUTES ---
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the result cache, the scraper's page and search caches and the near-duplicate signature index."""
+    stats = {"enabled": True, **result_cache.stats()} if result_cache is not None else {"enabled": False}
+    stats["pages"] = page_cache.stats() if page_cache else {"enabled": False}
+    stats["searches"] = search_cache.stats() if search_cache else {"enabled": False}
+    stats["signatures"] = signature_index.stats() if signature_index else {"enabled": False}
+    stats["coalesced"] = {"analysis": analysis_flights.stats(), "model": model_flights.stats(), "scrape": scrape_flights.stats(), "search": search_flights.stats()}
+    return jsonify(stats)
+
+@app.route('/search/prefetch', methods=['POST'])
+def search_prefetch():
+    """Runs the search prefetch hook now (e.g. from cron); the searches run in the background."""
+    if search_cache is None: return jsonify({"error": "Search cache is disabled."}), 503
+    queued, topics = prefetch_popular_searches()
+    return jsonify({"queued": queued, "topics": topics}), 202
+
+@app.route('/upstreams')
+def upstream_health():
+    """Circuit breaker state per upstream endpoint and the retry budget."""
+    with circuit_breakers_lock: breakers = dict(circuit_breakers)
+    health = {"breakers": {name: breaker.stats() for name, breaker in breakers.items()}, "retry_budget": retry_budget.stats()}
+    if upstream_replay is not None: health["replay"] = upstream_replay.stats()
+    return jsonify(health)
+
+# Values read from existing stats at scrape time
+BREAKER_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+def breaker_states():
+    with circuit_breakers_lock: breakers = dict(circuit_breakers)
+    return {(name,): BREAKER_STATE_VALUES[breaker.state] for name, breaker in breakers.items()}
+REGISTRY.callback("upstream_circuit_state", "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).", ["endpoint"], breaker_states)
+REGISTRY.callback("retry_budget_denied_total", "Retries refused by the retry budget.", [], lambda: {(): retry_budget.stats()["denied"]}, kind="counter")
+REGISTRY.callback("coalesced_requests_total", "Requests that joined an identical in-flight computation.", ["flight"],
+                  lambda: {(f.name,): f.stats()["followers"] for f in (analysis_flights, model_flights, scrape_flights, search_flights)}, kind="counter")
+REGISTRY.callback("topic_watches", "Registered topic watches.", [], lambda: {(): topic_watches.count()} if topic_watches else {})
+REGISTRY.callback("jobs", "Background jobs by status.", ["status"], lambda: {(status,): count for status, count in job_queue.counts().items()} if job_queue else {})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: per-stage and per-upstream latency histograms, retries, cache lookups, errors and in-flight calls."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # ----------------------------------------------------------------------------
 # MAIN EXECUTION
 # ----------------------------------------------------------------------------
 if __name__ == '__main__':
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true": start_background_workers() # The reloader's serving child; its parent only watches files
     app.run(host='0.0.0.0', port=8001, debug=True)
@@ -0,0 +1,67 @@
+# Benchmark: single-pass lxml extraction vs. the original BeautifulSoup heuristic
+#
+# Usage:
+#   python benchmarks/bench_extraction.py                  # bundled fixtures
+#   python benchmarks/bench_extraction.py saved_pages/ -n 50
+
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from web_scraper.extractor import extract_article_text, extract_article_text_soup
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def time_extractor(func, html, name, repeats):
+    """Median wall time (ms) of `repeats` extractions."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()): # Silence fallback warnings
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func(html, name)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark article extraction on saved HTML pages.")
+    parser.add_argument('fixtures', nargs='?', default=FIXTURES_DIR, help="Directory of saved .html files")
+    parser.add_argument('-n', '--repeats', type=int, default=20, help="Extractions per page and engine")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    if not paths:
+        print(f"No .html fixtures found in {args.fixtures}")
+        sys.exit(1)
+
+    print(f"[+] Benchmarking {len(paths)} page(s), {args.repeats} repeats each\n")
+    print(f"{'page':<32} {'KB':>6} {'soup ms':>9} {'lxml ms':>9} {'speedup':>8}  same output")
+    total_soup = total_fast = 0.0
+    mismatches = 0
+    for path in paths:
+        name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            html = f.read()
+        with contextlib.redirect_stdout(io.StringIO()):
+            same = extract_article_text(html, name) == extract_article_text_soup(html, name)
+        mismatches += not same
+        soup_ms = time_extractor(extract_article_text_soup, html, name, args.repeats)
+        fast_ms = time_extractor(extract_article_text, html, name, args.repeats)
+        total_soup += soup_ms; total_fast += fast_ms
+        print(f"{name[:32]:<32} {len(html) / 1024:>6.1f} {soup_ms:>9.2f} {fast_ms:>9.2f} {soup_ms / fast_ms:>7.1f}x  {'yes' if same else 'NO'}")
+
+    print(f"\n[+] Total: soup {total_soup:.2f} ms, lxml {total_fast:.2f} ms ({total_soup / total_fast:.1f}x faster)")
+    if mismatches:
+        print(f"[!] {mismatches} page(s) produced different output")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
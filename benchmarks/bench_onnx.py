@@ -0,0 +1,98 @@
+# Benchmark: PyTorch fp32 vs. ONNX Runtime fp32 vs. ONNX Runtime dynamic int8
+#
+# Export first (python -m pipeline.onnx_export), then:
+#   python benchmarks/bench_onnx.py --limit 500
+#   python benchmarks/bench_onnx.py --model bucketresearch/politicalBiasBERT --limit 300
+#
+# Each variant runs in its own process so peak memory is measured separately.
+# Exits 1 if a variant agrees with the PyTorch predictions on fewer than
+# --tolerance of the texts.
+
+import os
+import sys
+import time
+import argparse
+import resource
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline.backends import onnx_model_dir
+from pipeline.evaluation import DEFAULT_DATASET, load_labelled_csv, length_bucketed_batches, load_classifier, percentile
+from pipeline.onnx_export import DEFAULT_ONNX_DIR
+
+VARIANTS = ["torch", "onnx", "onnx-int8"]
+LABELS = ["Positive", "Negative"] # The model is binary; Neutral rows would only count as misses
+
+
+def run_variant(model, runtime, texts, batch_size, max_length, threads):
+    """Predicts every text with one variant; runs in a fresh process."""
+    classifier = load_classifier(model, max_length, runtime, threads)
+    predictions = [None] * len(texts)
+    per_text_ms = []
+    start = time.perf_counter()
+    for batch in length_bucketed_batches(texts, batch_size):
+        batch_start = time.perf_counter()
+        rows = classifier.classify_batch([texts[i] for i in batch])
+        per_text_ms.extend([(time.perf_counter() - batch_start) * 1000 / len(batch)] * len(batch))
+        for i, row in zip(batch, rows): predictions[i] = max(row, key=lambda item: item["score"])["label"]
+    seconds = time.perf_counter() - start
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    return {"predictions": predictions, "seconds": seconds, "per_text_ms": per_text_ms, "peak_rss_mb": peak_rss_mb}
+
+
+def model_size_mb(model, runtime, onnx_dir):
+    if runtime == "torch":
+        if not os.path.isdir(model): return None # Hub model: size lives in the HF cache
+        return sum(os.path.getsize(os.path.join(model, name)) for name in os.listdir(model) if name.endswith((".bin", ".safetensors"))) / 1e6
+    return os.path.getsize(os.path.join(onnx_dir, "model.int8.onnx" if runtime == "onnx-int8" else "model.onnx")) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX Runtime (fp32/int8) classifiers on the labelled CSV.")
+    parser.add_argument("--model", default="siebert/sentiment-roberta-large-english")
+    parser.add_argument("--onnx-dir", default=os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR), help="pipeline.onnx_export --output directory")
+    parser.add_argument("--data", default=DEFAULT_DATASET)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads per variant (0 = library default)")
+    parser.add_argument("--variant", action="append", choices=VARIANTS, help="Variants to run (repeatable, default: all)")
+    parser.add_argument("--tolerance", type=float, default=0.99, help="Minimum prediction agreement with PyTorch fp32")
+    args = parser.parse_args()
+
+    texts, gold = load_labelled_csv(args.data, labels=LABELS, limit=args.limit)
+    export_dir = onnx_model_dir(args.onnx_dir, args.model)
+    variants = args.variant or VARIANTS
+    if "torch" not in variants: variants = ["torch"] + variants # Reference for agreement
+    print(f"[+] Benchmarking {args.model} on {len(texts)} texts (batch size {args.batch_size})\n")
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for runtime in variants:
+        model = args.model if runtime == "torch" else export_dir
+        pool = context.Pool(1)
+        try: results[runtime] = pool.apply(run_variant, (model, runtime, texts, args.batch_size, args.max_length, args.threads))
+        except Exception: pool.terminate(); raise
+        pool.close(); pool.join()
+
+    reference = results["torch"]["predictions"]
+    print(f"{'variant':<10} {'MB':>8} {'peak RSS':>9} {'texts/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'accuracy':>9} {'agreement':>10}")
+    failures = 0
+    for runtime in variants:
+        result = results[runtime]
+        predictions = result["predictions"]
+        agreement = sum(a == b for a, b in zip(predictions, reference)) / len(texts) if texts else 1.0
+        correct = [str(p).capitalize() == g for p, g in zip(predictions, gold)]
+        size = model_size_mb(args.model if runtime == "torch" else export_dir, runtime, export_dir)
+        failures += agreement < args.tolerance
+        print(f"{runtime:<10} {f'{size:.1f}' if size is not None else '-':>8} {result['peak_rss_mb']:>8.0f}M {len(texts) / result['seconds']:>8.1f} "
+              f"{percentile(result['per_text_ms'], 50):>7.1f} {percentile(result['per_text_ms'], 95):>7.1f} "
+              f"{sum(correct) / len(correct):>9.3f} {agreement:>10.3f}")
+    print("\nAccuracy compares predicted labels with the CSV's Sentiment column and is only meaningful for sentiment models.")
+    if failures:
+        print(f"[!] {failures} variant(s) agree with PyTorch fp32 on fewer than {args.tolerance:.0%} of texts")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
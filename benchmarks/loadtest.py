@@ -0,0 +1,153 @@
+# Load test: drives /analyze at a given concurrency against replayed upstreams
+#
+# Record fixtures once against the real upstreams:
+#   UPSTREAM_REPLAY=record UPSTREAM_FIXTURES=benchmarks/fixtures/upstreams python app.py   (then use the app)
+# Replay them offline:
+#   python benchmarks/loadtest.py --fixtures benchmarks/fixtures/upstreams --requests 200 --concurrency 1,8,32
+#   python benchmarks/loadtest.py --latency "llm=lognormal:2,0.6; *=recorded" --errors "llm=0.05"
+#   python benchmarks/loadtest.py --url http://localhost:8001 --workload requests.jsonl   # a running server in replay mode
+#
+# benchmarks/fixtures/upstreams_synthetic/ is a small synthetic fixture set (made-up
+# responses, typical latencies) so the harness runs out of the box; unrecorded
+# inputs are answered with a recorded response of the same kind.
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline.evaluation import DEFAULT_DATASET, percentile
+from pipeline.metrics import STAGE_SECONDS
+
+SYNTHETIC_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstreams_synthetic')
+
+
+def load_workload(args):
+    """[{"input_type": ..., "input_value": ...}] from --workload JSONL, or --requests texts from the CSV."""
+    if args.workload:
+        with open(args.workload, 'r', encoding='utf-8') as f: items = [json.loads(line) for line in f if line.strip()]
+    else:
+        import csv
+        with open(args.data, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            texts = [row.get('Description') for row in csv.DictReader(f) if (row.get('Description') or '').strip()]
+        items = [{"input_type": "text", "input_value": text} for text in texts]
+    if not items: raise SystemExit("Empty workload.")
+    random.Random(args.seed).shuffle(items)
+    return [items[i % len(items)] for i in range(args.requests)] if args.requests else items
+
+
+def in_process_client(args, temp_dir):
+    """Imports app.py in replay mode with throwaway caches and returns a request function."""
+    os.environ.update({
+        "UPSTREAM_REPLAY": "replay", "UPSTREAM_FIXTURES": args.fixtures, "UPSTREAM_REPLAY_SEED": str(args.seed),
+        "UPSTREAM_REPLAY_LATENCY": args.latency or "", "UPSTREAM_REPLAY_ERRORS": args.errors or "",
+        "UPSTREAM_REPLAY_STRICT": "1" if args.strict else "0",
+        "RESULT_CACHE_ENABLED": "1" if args.result_cache else "0", "RESULT_CACHE_PATH": os.path.join(temp_dir, 'results.sqlite3'),
+        "DEDUP_INDEX_ENABLED": "1" if args.result_cache else "0", "DEDUP_INDEX_PATH": os.path.join(temp_dir, 'signatures.sqlite3'),
+        "SEARCH_CACHE_ENABLED": "1" if args.result_cache else "0", "SEARCH_CACHE_PATH": os.path.join(temp_dir, 'searches.sqlite3'),
+        "WATCH_ENABLED": "0", "SEARCH_PREFETCH_INTERVAL_MINUTES": "0",
+        "PAGE_CACHE_ENABLED": "0", "HISTORY_DB": os.path.join(temp_dir, 'history.sqlite3'), "JOBS_ENABLED": "0", "TRACE_LOGS": "0",
+    })
+    os.environ.setdefault("TOGETHER_API_KEY", "replay"); os.environ.setdefault("HF_API_KEY", "replay") # Never used while replaying
+    import app
+    client_app = app.app
+    def post(payload):
+        response = client_app.test_client().post('/analyze', json=payload)
+        return response.status_code, response.get_json(silent=True) or {}
+    return post, app
+
+
+def http_client(args):
+    import requests
+    session = requests.Session()
+    def post(payload):
+        response = session.post(args.url.rstrip('/') + '/analyze', json=payload, timeout=args.timeout)
+        try: body = response.json()
+        except ValueError: body = {}
+        return response.status_code, body
+    return post
+
+
+def run_level(post, workload, concurrency, deadline):
+    """Sends the whole workload with `concurrency` requests in flight; returns per-request (seconds, outcome)."""
+    def send(item):
+        payload = dict(item, **({"deadline_seconds": deadline} if deadline else {}))
+        start = time.perf_counter()
+        try: status, body = post(payload)
+        except Exception: return time.perf_counter() - start, "exception"
+        outcome = "error" if status >= 400 or "error" in body else "partial" if body.get("partial") else "ok"
+        return time.perf_counter() - start, outcome
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool: results = list(pool.map(send, workload))
+    return results, time.perf_counter() - start
+
+
+def stage_means(before):
+    """Mean seconds per pipeline stage since `before` (a STAGE_SECONDS.totals() snapshot)."""
+    means = {}
+    for (stage,), (count, total) in STAGE_SECONDS.totals().items():
+        prev_count, prev_total = before.get((stage,), (0, 0.0))
+        if count > prev_count: means[stage] = (total - prev_total) / (count - prev_count)
+    return means
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /analyze against recorded (replayed) upstream responses.")
+    parser.add_argument("--fixtures", default=os.getenv("UPSTREAM_FIXTURES") or SYNTHETIC_FIXTURES, help="Fixture directory written by UPSTREAM_REPLAY=record")
+    parser.add_argument("--workload", help="JSONL of {input_type, input_value} requests (default: texts from --data)")
+    parser.add_argument("--data", default=DEFAULT_DATASET)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level (workload is cycled; 0 = each item once)")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", help='Latency models, e.g. "llm=lognormal:2,0.6; hf=fixed:0.3; *=recorded" (see pipeline.replay.LatencyModel)')
+    parser.add_argument("--errors", help='Injected error rates, e.g. "llm=0.05; scrape=0.1"')
+    parser.add_argument("--strict", action="store_true", help="Fail unrecorded inputs instead of falling back to a similar recording")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the result, search and near-duplicate caches on (repeated inputs become cache hits)")
+    parser.add_argument("--deadline", type=float, default=0, help="deadline_seconds sent with each request (0 = server default)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Drive a running server instead of an in-process app (start it with UPSTREAM_REPLAY=replay)")
+    parser.add_argument("--timeout", type=float, default=300, help="HTTP timeout with --url")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the app's log output")
+    args = parser.parse_args()
+
+    workload = load_workload(args)
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    temp_dir = tempfile.mkdtemp(prefix="loadtest-")
+    quiet = lambda: contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    app_module = None
+    if args.url: post = http_client(args)
+    else:
+        with quiet(): post, app_module = in_process_client(args, temp_dir)
+    print(f"[+] {len(workload)} requests per level against {args.url or 'in-process app'} (fixtures: {args.fixtures})\n")
+    print(f"{'conc':>5} {'req/s':>8} {'ok':>5} {'partial':>8} {'errors':>7} {'p50 s':>7} {'p90 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7}")
+
+    report = []
+    for concurrency in levels:
+        before = STAGE_SECONDS.totals()
+        with quiet(): results, wall = run_level(post, workload, concurrency, args.deadline)
+        latencies = [seconds for seconds, _ in results]
+        outcomes = {name: sum(1 for _, outcome in results if outcome == name) for name in ("ok", "partial", "error", "exception")}
+        row = {"concurrency": concurrency, "requests": len(results), "seconds": round(wall, 3), "throughput": round(len(results) / wall, 3), **outcomes,
+               **{f"p{q}": round(percentile(latencies, q), 4) for q in (50, 90, 95, 99)}, "max": round(max(latencies), 4)}
+        if app_module is not None: row["stage_mean_seconds"] = {stage: round(mean, 4) for stage, mean in sorted(stage_means(before).items())}
+        report.append(row)
+        print(f"{concurrency:>5} {row['throughput']:>8.2f} {row['ok']:>5} {row['partial']:>8} {row['error'] + row['exception']:>7} "
+              f"{row['p50']:>7.3f} {row['p90']:>7.3f} {row['p95']:>7.3f} {row['p99']:>7.3f} {row['max']:>7.3f}")
+
+    if app_module is not None:
+        print("\nMean seconds per stage (last level): " + ", ".join(f"{stage} {mean:.3f}" for stage, mean in report[-1]["stage_mean_seconds"].items()))
+        print(f"Replay: {json.dumps(app_module.upstream_replay.stats())}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump({"fixtures": args.fixtures, "latency": args.latency, "errors": args.errors, "levels": report}, f, indent=2)
+        print(f"[+] Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
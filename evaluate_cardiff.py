@@ -1,19 +1,10 @@
 # Updated evaluate_sentiment_siebert.py to include Neutral in the report
 
-import pandas as pd
-from transformers import pipeline
-from sklearn.metrics import classification_report, confusion_matrix
-import seaborn as sns
-import matplotlib.pyplot as plt
+import argparse
+from pipeline.evaluation import add_evaluation_args, checkpoint_path_for, load_labelled_csv, evaluate, format_stats
 
-# =====================
-# Load Multi-class Sentiment Model (Cardiff)
-# =====================
-print("[+] Loading Cardiff sentiment model...")
-sentiment_pipeline = pipeline(
-    "sentiment-analysis", 
-    model="cardiffnlp/twitter-roberta-base-sentiment"
-)
+MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment"
+LABELS = ["Positive", "Neutral", "Negative"]
 
 # Map model labels to human-readable
 label_map = {
@@ -22,54 +13,51 @@ label_map = {
     "LABEL_2": "Positive"
 }
 
-def get_sentiment(text):
-    try:
-        result = sentiment_pipeline(text[:512])[0]
-        return label_map[result["label"]]
-    except:
-        return "Neutral"  # fallback to neutral
-
-# =====================
-# Load and Keep All Classes
-# =====================
-print("[+] Loading dataset...")
-df = pd.read_csv("/Users/vibhabhavikatti/Documents/NLP/Capstone/news_sentiment_analysis.csv")
-
-# Capitalize labels
-df["Sentiment"] = df["Sentiment"].str.capitalize()
-
-# Keep all three classes
-print(f"[+] Using {len(df)} samples across classes: {df['Sentiment'].value_counts().to_dict()}")
-
-# =====================
-# Run Predictions
-# =====================
-print("[+] Predicting sentiments...")
-df["predicted"] = df["Description"].apply(get_sentiment)
-
-# =====================
-# Evaluation Report (include Neutral)
-# =====================
-print("\n=== Classification Report ===")
-print(classification_report(
-    df["Sentiment"], 
-    df["predicted"], 
-    labels=["Positive", "Neutral", "Negative"]
-))
-
-# =====================
-# Confusion Matrix (3x3)
-# =====================
-cm = confusion_matrix(
-    df["Sentiment"], 
-    df["predicted"], 
-    labels=["Positive", "Neutral", "Negative"]
-)
-
-sns.heatmap(cm, annot=True, fmt='d', cmap="Blues", 
-            xticklabels=["Positive", "Neutral", "Negative"], 
-            yticklabels=["Positive", "Neutral", "Negative"])
-plt.xlabel("Predicted")
-plt.ylabel("Actual")
-plt.title("Confusion Matrix: Sentiment (3-class)")
-plt.show()
+def main():
+    args = add_evaluation_args(argparse.ArgumentParser(description="Evaluate the Cardiff 3-class sentiment model."), MODEL_NAME).parse_args()
+
+    # =====================
+    # Load and Keep All Classes
+    # =====================
+    print("[+] Loading dataset...")
+    texts, gold = load_labelled_csv(args.data, limit=args.limit)
+    counts = {label: gold.count(label) for label in sorted(set(gold))}
+    print(f"[+] Using {len(texts)} samples across classes: {counts}")
+
+    # =====================
+    # Run Predictions (batched, length-bucketed, resumable)
+    # =====================
+    print(f"[+] Predicting sentiments with {args.model}...")
+    predicted, report, stats = evaluate(
+        texts, gold, args.model, label_map=label_map, labels=LABELS, fallback_label="Neutral",
+        batch_size=args.batch_size, num_workers=args.workers, max_length=args.max_length,
+        checkpoint_path=checkpoint_path_for(args, args.model),
+        token_store_dir=None if args.no_token_store else args.token_store, runtime=args.runtime)
+
+    # =====================
+    # Evaluation Report (include Neutral)
+    # =====================
+    print("\n=== Classification Report ===")
+    print(report)
+    print("=== Throughput & Latency ===")
+    print(format_stats(stats))
+
+    # =====================
+    # Confusion Matrix (3x3)
+    # =====================
+    if args.no_plot: return
+    from sklearn.metrics import confusion_matrix
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    cm = confusion_matrix(gold, predicted, labels=LABELS)
+
+    sns.heatmap(cm, annot=True, fmt='d', cmap="Blues",
+                xticklabels=LABELS,
+                yticklabels=LABELS)
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.title("Confusion Matrix: Sentiment (3-class)")
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,54 @@
 # evaluate_sentiment_siebert.py
 
-import pandas as pd
-from transformers import pipeline
-from sklearn.metrics import classification_report, confusion_matrix
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-# =====================
-# Load Binary Sentiment Model (Siebert)
-# =====================
-print("[+] Loading Siebert sentiment model...")
-sentiment_pipeline = pipeline(
-    "sentiment-analysis", 
-    model="siebert/sentiment-roberta-large-english"
-)
-
-def get_sentiment(text):
-    try:
-        result = sentiment_pipeline(text[:512])[0]
-        return result["label"].capitalize()  # returns 'POSITIVE' or 'NEGATIVE'
-    except:
-        return "Negative"  # fallback
-
-# =====================
-# Load and Filter Dataset
-# =====================
-print("[+] Loading dataset...")
-df = pd.read_csv("/Users/vibhabhavikatti/Documents/CS273 - NLP/Capstone/news_sentiment_analysis.csv")
-
-# Normalize and drop "Neutral"
-df["Sentiment"] = df["Sentiment"].str.capitalize()
-df = df[df["Sentiment"].isin(["Positive", "Negative"])]
-
-print(f"[+] Using {len(df)} Positive/Negative samples")
-
-# Optional: sample for speed
-# df = df.sample(1000, random_state=42)
-
-# =====================
-# Run Predictions
-# =====================
-print("[+] Predicting sentiments...")
-df["predicted"] = df["Description"].apply(get_sentiment)
-
-# =====================
-# Evaluation Report
-# =====================
-print("\n=== Classification Report ===")
-print(classification_report(df["Sentiment"], df["predicted"], labels=["Positive", "Negative"]))
-
-# =====================
-# Confusion Matrix
-# =====================
-cm = confusion_matrix(df["Sentiment"], df["predicted"], labels=["Positive", "Negative"])
-
-sns.heatmap(cm, annot=True, fmt='d', cmap="Greens", xticklabels=["Positive", "Negative"], yticklabels=["Positive", "Negative"])
-plt.xlabel("Predicted")
-plt.ylabel("Actual")
-plt.title("Confusion Matrix: Binary Sentiment (Siebert)")
-plt.show()
+import argparse
+from pipeline.evaluation import add_evaluation_args, checkpoint_path_for, load_labelled_csv, evaluate, format_stats
+
+MODEL_NAME = "siebert/sentiment-roberta-large-english"
+LABELS = ["Positive", "Negative"]
+
+def main():
+    args = add_evaluation_args(argparse.ArgumentParser(description="Evaluate the Siebert binary sentiment model."), MODEL_NAME).parse_args()
+
+    # =====================
+    # Load and Filter Dataset
+    # =====================
+    print("[+] Loading dataset...")
+    # Normalize and drop "Neutral"
+    texts, gold = load_labelled_csv(args.data, labels=LABELS, limit=args.limit)
+    print(f"[+] Using {len(texts)} Positive/Negative samples")
+
+    # =====================
+    # Run Predictions (batched, length-bucketed, resumable)
+    # =====================
+    print(f"[+] Predicting sentiments with {args.model}...")
+    predicted, report, stats = evaluate(
+        texts, gold, args.model, labels=LABELS, fallback_label="Negative",
+        batch_size=args.batch_size, num_workers=args.workers, max_length=args.max_length,
+        checkpoint_path=checkpoint_path_for(args, args.model),
+        token_store_dir=None if args.no_token_store else args.token_store, runtime=args.runtime)
+
+    # =====================
+    # Evaluation Report
+    # =====================
+    print("\n=== Classification Report ===")
+    print(report)
+    print("=== Throughput & Latency ===")
+    print(format_stats(stats))
+
+    # =====================
+    # Confusion Matrix
+    # =====================
+    if args.no_plot: return
+    from sklearn.metrics import confusion_matrix
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    cm = confusion_matrix(gold, predicted, labels=LABELS)
+
+    sns.heatmap(cm, annot=True, fmt='d', cmap="Greens", xticklabels=LABELS, yticklabels=LABELS)
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.title("Confusion Matrix: Binary Sentiment (Siebert)")
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+import traceback
+
+# ----------------------------------------------------------------------------
+# LOCAL TRANSFORMER CLASSIFIER
+# ----------------------------------------------------------------------------
+# transformers/torch (and onnxruntime for the ONNX backend) are optional: they
+# are only imported when a local backend is actually requested, so the
+# remote-only deployment does not need them.
+
+class LocalClassifier:
+    """
+    A sequence classifier loaded once into this process and run on CPU.
+
+    `classify` returns the same shape as the Hugging Face Inference API
+    (`[[{"label": ..., "score": ...}, ...]]`) so callers can parse remote and
+    local results with the same code.
+    """
+
+    def __init__(self, model_name, labels=None, max_length=512, device="cpu"):
+        import numpy as np
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        self.model_name = model_name
+        self.max_length = max_length
+        self.device = device
+        self._torch = torch
+        self._np = np
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device)
+        self.model.eval()
+        self.backend_id = "local"
+        config_labels = [self.model.config.id2label[i] for i in range(self.model.config.num_labels)]
+        self.labels = list(labels) if labels else config_labels
+        self._lock = threading.Lock() # One forward pass at a time keeps CPU threads from oversubscribing
+
+    def classify_batch(self, texts):
+        """Scores a list of texts in one forward pass; returns one label/score list per text."""
+        if not texts: return []
+        inputs = self.tokenizer(list(texts), return_tensors="pt", truncation=True, max_length=self.max_length, padding=True)
+        inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
+        with self._lock, self._torch.no_grad():
+            probs = self._torch.softmax(self.model(**inputs).logits, dim=-1).tolist()
+        return [[{"label": label, "score": score} for label, score in zip(self.labels, row)] for row in probs]
+
+    def classify_encoded(self, input_ids, attention_mask):
+        """Like classify_batch, for already tokenized rows (e.g. memory-mapped arrays from the token store)."""
+        if len(input_ids) == 0: return []
+        # np.array copies: token store rows are read-only mmap views, which torch must not alias
+        inputs = {"input_ids": self._torch.from_numpy(self._np.array(input_ids, dtype=self._np.int64)).to(self.device),
+                  "attention_mask": self._torch.from_numpy(self._np.array(attention_mask, dtype=self._np.int64)).to(self.device)}
+        with self._lock, self._torch.no_grad():
+            probs = self._torch.softmax(self.model(**inputs).logits, dim=-1).tolist()
+        return [[{"label": label, "score": score} for label, score in zip(self.labels, row)] for row in probs]
+
+    def classify(self, text):
+        try:
+            return [self.classify_batch([text])[0]]
+        except Exception as e:
+            print(f"Error during local inference with {self.model_name}: {e}"); traceback.print_exc()
+            return {"error": f"Local inference error ({self.model_name}): {e}"}
+
+
+# ----------------------------------------------------------------------------
+# ONNX RUNTIME CLASSIFIER
+# ----------------------------------------------------------------------------
+def onnx_model_dir(root, model_name):
+    """Directory pipeline/onnx_export.py writes `model_name` to."""
+    return os.path.join(root, model_name.strip('/').replace('/', '__'))
+
+
+class OnnxClassifier:
+    """
+    A classifier exported by pipeline/onnx_export.py, run with onnxruntime on
+    CPU. Same interface and output shape as LocalClassifier. `quantized` picks
+    the dynamic-int8 export (model.int8.onnx) over the fp32 one (model.onnx).
+    """
+
+    def __init__(self, model_dir, labels=None, max_length=512, quantized=True, threads=None):
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        self.model_name = model_dir
+        self.max_length = max_length
+        self._np = np
+        path = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(path): raise FileNotFoundError(f"{path} not found; run python -m pipeline.onnx_export first")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads: options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"]) # run() is thread-safe
+        self._input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, "labels.json"), 'r', encoding='utf-8') as f: export_labels = json.load(f)
+        self.labels = list(labels) if labels else export_labels
+        self.backend_id = "onnx-int8" if quantized else "onnx"
+
+    def classify_encoded(self, input_ids, attention_mask):
+        """Scores already tokenized rows; returns one label/score list per row."""
+        if len(input_ids) == 0: return []
+        np = self._np
+        feeds = {"input_ids": np.asarray(input_ids, dtype=np.int64), "attention_mask": np.asarray(attention_mask, dtype=np.int64)}
+        if "token_type_ids" in self._input_names: feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        logits = self.session.run(["logits"], {name: feeds[name] for name in self._input_names})[0]
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        probs = (exp / exp.sum(axis=-1, keepdims=True)).tolist()
+        return [[{"label": label, "score": score} for label, score in zip(self.labels, row)] for row in probs]
+
+    def classify_batch(self, texts):
+        if not texts: return []
+        inputs = self.tokenizer(list(texts), return_tensors="np", truncation=True, max_length=self.max_length, padding=True)
+        return self.classify_encoded(inputs["input_ids"], inputs["attention_mask"])
+
+    def classify(self, text):
+        try:
+            return [self.classify_batch([text])[0]]
+        except Exception as e:
+            print(f"Error during ONNX inference with {self.model_name}: {e}"); traceback.print_exc()
+            return {"error": f"ONNX inference error ({self.model_name}): {e}"}
+
+
+def load_local_classifiers(specs, torch_threads=None, runtime="torch", onnx_dir=None, quantized=True):
+    """
+    Loads every classifier in `specs` ({name: {"model": ..., "labels": ...}})
+    with PyTorch (`runtime="torch"`) or from ONNX exports under `onnx_dir`
+    (`runtime="onnx"`). Returns the successfully loaded ones; failures are
+    reported and skipped so the caller can fall back to the remote API for those names.
+    """
+    try:
+        if runtime == "onnx":
+            import onnxruntime
+        else:
+            import torch
+            if torch_threads: torch.set_num_threads(torch_threads)
+    except ImportError:
+        print(f"Warning: Local inference requires {'onnxruntime' if runtime == 'onnx' else 'torch'} and 'transformers' (pip install {'onnxruntime' if runtime == 'onnx' else 'torch'} transformers). Falling back to the remote API.")
+        return {}
+    classifiers = {}
+    for name, spec in specs.items():
+        print(f"[+] Loading local {name} model {spec['model']} ({runtime})...")
+        try:
+            if runtime == "onnx":
+                classifiers[name] = OnnxClassifier(onnx_model_dir(onnx_dir, spec["model"]), labels=spec.get("labels"), max_length=spec.get("max_length", 512), quantized=quantized, threads=torch_threads)
+            else:
+                classifiers[name] = LocalClassifier(spec["model"], labels=spec.get("labels"), max_length=spec.get("max_length", 512))
+        except Exception as e:
+            print(f"Warning: Could not load local {name} model {spec['model']}: {e}. Falling back to the remote API.")
+    return classifiers
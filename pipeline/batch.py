@@ -0,0 +1,47 @@
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------------------------------------------------------
+# BULK (JSONL) ANALYSIS HELPERS
+# ----------------------------------------------------------------------------
+# Used by POST /analyze/batch and analyze_batch.py. Every input line yields
+# exactly one output line, in input order, so an interrupted run resumes at
+# offset = number of output lines already written.
+
+
+def iter_batch_records(lines, offset=0):
+    """
+    Yields (index, record, error) for each non-blank JSONL line, skipping the
+    first `offset` records. `record` is the parsed object, or None with an
+    `error` message for lines that are not a JSON object.
+    """
+    index = -1
+    for line in lines:
+        if isinstance(line, bytes): line = line.decode('utf-8', errors='replace')
+        if not line.strip(): continue
+        index += 1
+        if index < offset: continue
+        try: record = json.loads(line)
+        except json.JSONDecodeError as e: yield index, None, f"Invalid JSON: {e}"; continue
+        if not isinstance(record, dict): yield index, None, "Each line must be a JSON object"; continue
+        yield index, record, None
+
+
+def ordered_parallel_map(fn, items, parallel, window=None):
+    """
+    Yields fn(item) for every item in input order while up to `parallel` calls
+    run at once. At most `window` (default 4 x parallel) items are submitted
+    ahead of the oldest unfinished one, which bounds memory for long inputs.
+    fn should not raise. Closing the generator early cancels queued items.
+    """
+    parallel = max(1, parallel); window = max(parallel, window or parallel * 4)
+    pool = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="batch")
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window: yield pending.popleft().result()
+        while pending: yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,97 @@
+import time
+import queue
+import threading
+import traceback
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pipeline.deadline import current_deadline
+
+# ----------------------------------------------------------------------------
+# MICRO-BATCHING SCHEDULER
+# ----------------------------------------------------------------------------
+class MicroBatcher:
+    """
+    Collects single-item requests from concurrent callers and runs them as one
+    batched call.
+
+    A batch is dispatched when `max_batch_size` items are waiting or
+    `max_wait_ms` after its first item arrived, whichever comes first. At most
+    `max_concurrent_batches` batches run at once; while all slots are busy new
+    items keep queueing, so batches grow with load instead of the number of
+    upstream calls. `batch_fn(items)` must return one result per item, in order.
+    It runs under the context of the item with the tightest deadline, so the
+    batch's upstream timeouts and retries stay within every caller's budget.
+    """
+
+    def __init__(self, name, batch_fn, max_batch_size=16, max_wait_ms=10, max_concurrent_batches=2):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent_batches))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_batches), thread_name_prefix=f"batch-{name}")
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "max_batch_size_seen": 0, "errors": 0}
+        self._collector = threading.Thread(target=self._collect_loop, name=f"batcher-{name}", daemon=True)
+        self._collector.start()
+
+    def submit(self, item):
+        """Queues one item; returns a Future resolving to its result."""
+        future = Future()
+        self._queue.put((item, future, contextvars.copy_context()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _collect_loop(self):
+        while True:
+            self._slots.acquire() # Wait for a free batch slot before forming the next batch
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run_batch, batch)
+
+    @staticmethod
+    def _batch_context(batch):
+        """The context of the item whose deadline expires first (the first item's if none has one)."""
+        def expires_at(context):
+            deadline = context.run(current_deadline)
+            return deadline.expires_at if deadline else float('inf')
+        return min((context for _, _, context in batch), key=expires_at).copy()
+
+    def _run_batch(self, batch):
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()] # Callers that gave up cancel their items
+        items = [item for item, _, _ in batch]
+        if not items: self._slots.release(); return
+        try:
+            results = self._batch_context(batch).run(self.batch_fn, items)
+            if not isinstance(results, list) or len(results) != len(items):
+                raise ValueError(f"batch function returned {len(results) if isinstance(results, list) else type(results).__name__} results for {len(items)} items")
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            print(f"Error running {self.name} batch of {len(items)}: {e}"); traceback.print_exc()
+            with self._stats_lock: self._stats["errors"] += 1
+            for _, future, _ in batch:
+                if not future.done(): future.set_exception(e)
+        finally:
+            with self._stats_lock:
+                self._stats["batches"] += 1; self._stats["items"] += len(items)
+                self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], len(items))
+            self._slots.release()
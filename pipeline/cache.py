@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import copy
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------------
+# KEY HELPERS
+# ----------------------------------------------------------------------------
+def normalize_text(text):
+    """Collapses whitespace so trivially different copies of a text share a key."""
+    if not isinstance(text, str): return ""
+    return " ".join(text.split())
+
+def make_cache_key(*parts):
+    """Content-addressed key: SHA-256 over the JSON encoding of all key parts."""
+    encoded = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+# ----------------------------------------------------------------------------
+# TIERED CACHE (in-memory LRU + SQLite persistent tier)
+# ----------------------------------------------------------------------------
+class TieredCache:
+    """
+    Two-tier cache for JSON-serializable values.
+    The memory tier is an LRU bounded by entry count; the disk tier is a SQLite
+    table bounded by total payload size, evicting least recently used rows.
+    Both tiers honour a per-entry TTL. Safe to share between threads.
+    """
+
+    def __init__(self, path, memory_entries=1024, disk_max_bytes=256 * 1024 * 1024, default_ttl=7 * 24 * 3600):
+        self.path = path
+        self.memory_entries = max(0, memory_entries)
+        self.disk_max_bytes = max(0, disk_max_bytes)
+        self.default_ttl = default_ttl
+        self._memory = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "expired": 0, "evictions": 0}
+        self._conn = None
+        self._disk_bytes = 0
+        self._open_disk()
+
+    def _open_disk(self):
+        directory = os.path.dirname(self.path)
+        try:
+            if directory and not os.path.exists(directory): os.makedirs(directory)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,
+                expires_at REAL, last_access REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+            self._conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+            self._conn.commit()
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open cache database {self.path}: {e}. Using memory tier only.")
+            self._conn = None
+
+    def get(self, key):
+        """Returns a copy of the cached value, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key); self._counters["memory_hits"] += 1
+                    return copy.deepcopy(value)
+                del self._memory[key]; self._counters["expired"] += 1
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute("SELECT value, size, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        raw, size, expires_at = row
+                        if expires_at is None or expires_at > now:
+                            self._conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key)); self._conn.commit()
+                            value = json.loads(raw)
+                            self._remember(key, expires_at, value); self._counters["disk_hits"] += 1
+                            return copy.deepcopy(value)
+                        self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,)); self._conn.commit()
+                        self._disk_bytes -= size; self._counters["expired"] += 1
+                except (sqlite3.Error, ValueError) as e:
+                    print(f"Warning: Cache read failed for {key[:12]}: {e}")
+            self._counters["misses"] += 1
+            return None
+
+    def peek(self, key):
+        """Like get(), but checks only the memory tier (where set() always writes) and leaves the counters alone."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or (entry[0] is not None and entry[0] <= time.time()): return None
+            return copy.deepcopy(entry[1])
+
+    def set(self, key, value, ttl=None):
+        """Stores a JSON-serializable value in both tiers."""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        try: raw = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e: print(f"Warning: Value for {key[:12]} is not cacheable: {e}"); return False
+        with self._lock:
+            self._remember(key, expires_at, copy.deepcopy(value)); self._counters["sets"] += 1
+            if self._conn is None: return True
+            size = len(raw.encode('utf-8'))
+            try:
+                old = self._conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                                   (key, raw, size, expires_at, time.time()))
+                self._disk_bytes += size - (old[0] if old else 0)
+                self._evict_disk()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Cache write failed for {key[:12]}: {e}"); return False
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is None: return
+            try:
+                row = self._conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,)); self._conn.commit(); self._disk_bytes -= row[0]
+            except sqlite3.Error as e: print(f"Warning: Cache delete failed for {key[:12]}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is None: return
+            try: self._conn.execute("DELETE FROM cache_entries"); self._conn.commit(); self._disk_bytes = 0
+            except sqlite3.Error as e: print(f"Warning: Cache clear failed: {e}")
+
+    def stats(self):
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+            return stats
+
+    # --- internal helpers (caller holds self._lock) ---
+    def _remember(self, key, expires_at, value):
+        if not self.memory_entries: return
+        self._memory[key] = (expires_at, value); self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False); self._counters["evictions"] += 1
+
+    def _evict_disk(self):
+        if not self.disk_max_bytes or self._disk_bytes <= self.disk_max_bytes: return
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        while self._disk_bytes > self.disk_max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access ASC LIMIT 64").fetchall()
+            if not rows: break
+            for key, size in rows:
+                if self._disk_bytes <= self.disk_max_bytes: break
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._disk_bytes -= size; self._counters["evictions"] += 1
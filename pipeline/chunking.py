@@ -0,0 +1,117 @@
+import re
+
+# ----------------------------------------------------------------------------
+# PARAGRAPH-AWARE CHUNKING
+# ----------------------------------------------------------------------------
+# scrape_article_content joins paragraphs with blank lines, so "\n\n" is the
+# natural window boundary. Paragraphs that alone exceed the budget are split
+# on sentence boundaries, and run-on sentences on word boundaries.
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+def approx_token_count(text):
+    """Cheap subword-token estimate (~1.3 tokens per whitespace word)."""
+    return int(len(text.split()) * 1.3) + 1
+
+
+def _pack(pieces, max_tokens, count_tokens, joiner):
+    """Greedily packs pieces into windows of at most `max_tokens`."""
+    windows, current, current_tokens = [], [], 0
+    for piece in pieces:
+        n = count_tokens(piece)
+        if current and current_tokens + n > max_tokens:
+            windows.append(joiner.join(current)); current, current_tokens = [], 0
+        current.append(piece); current_tokens += n
+    if current: windows.append(joiner.join(current))
+    return windows
+
+
+def _split_long_paragraph(paragraph, max_tokens, count_tokens):
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY.split(paragraph):
+        if count_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        # Size word groups from the estimated tokens per word of this sentence
+        per_window = max(1, int(len(words) * max_tokens / max(1, count_tokens(sentence))))
+        pieces.extend(' '.join(words[i:i + per_window]) for i in range(0, len(words), per_window))
+    return _pack(pieces, max_tokens, count_tokens, ' ')
+
+
+def split_into_windows(text, max_tokens=200, count_tokens=approx_token_count):
+    """
+    Splits text into windows of whole paragraphs that each fit `max_tokens`.
+    Short texts come back as a single window.
+    """
+    if not isinstance(text, str) or not text.strip(): return []
+    pieces = []
+    for paragraph in (p.strip() for p in text.split('\n\n')):
+        if not paragraph: continue
+        if count_tokens(paragraph) > max_tokens: pieces.extend(_split_long_paragraph(paragraph, max_tokens, count_tokens))
+        else: pieces.append(paragraph)
+    return _pack(pieces, max_tokens, count_tokens, '\n\n')
+
+
+def select_windows(windows, max_windows):
+    """Caps the number of windows, keeping evenly spaced ones so the whole document is represented."""
+    if max_windows <= 0 or len(windows) <= max_windows: return list(windows)
+    if max_windows == 1: return [windows[0]]
+    step = (len(windows) - 1) / (max_windows - 1)
+    return [windows[round(i * step)] for i in range(max_windows)]
+
+
+# ----------------------------------------------------------------------------
+# EXTRACTIVE INPUT COMPRESSION
+# ----------------------------------------------------------------------------
+# Instead of cutting an article after N characters, keep the sentences that
+# carry most of its content (SumBasic): a sentence scores the mean frequency
+# of its content words, and once one is picked its words are down-weighted so
+# the next pick adds something new. Lead sentences and sentences with numbers
+# or quotes get a bonus, since news puts the facts there.
+
+_CONTENT_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+STOPWORDS = frozenset("""a about after again against all also an and any are as at be because been before being between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i if in into is it its
+just more most no nor not now of off on once only or other our out over own said same say says she should so some such than that the their
+them then there these they this those through to too under until up very was we were what when where which while who whom why will with
+would you your""".split())
+
+
+def _content_words(sentence):
+    return [w for w in _CONTENT_WORD.findall(sentence.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def select_informative_sentences(text, max_chars):
+    """
+    Returns the most informative sentences of `text` that fit in `max_chars`,
+    in their original order (paragraph breaks kept). Short texts come back unchanged.
+    """
+    if not isinstance(text, str) or len(text) <= max_chars: return text
+    sentences = [] # (paragraph index, sentence)
+    for p, paragraph in enumerate(p for p in (p.strip() for p in text.split('\n\n')) if p):
+        sentences.extend((p, s.strip()) for s in SENTENCE_BOUNDARY.split(paragraph) if s.strip())
+    words = [set(_content_words(s)) for _, s in sentences]
+    counts = {}
+    for sentence_words in words:
+        for w in sentence_words: counts[w] = counts.get(w, 0) + 1
+    total = sum(counts.values()) or 1
+    weight = {w: n / total for w, n in counts.items()}
+    bonus = [(1.5 if i < 3 else 1.0) * (1.2 if re.search(r'\d|["“”]', s) else 1.0) for i, (_, s) in enumerate(sentences)]
+    chosen, used, remaining = set(), 0, set(range(len(sentences)))
+    while remaining:
+        best = max(remaining, key=lambda i: (bonus[i] * sum(weight[w] for w in words[i]) / len(words[i]) if words[i] else 0, -i))
+        remaining.discard(best)
+        cost = len(sentences[best][1]) + 2 # Plus the separator
+        if used + cost > max_chars: continue # Too long for what is left; a shorter sentence may still fit
+        chosen.add(best); used += cost
+        if max_chars - used < 20: break
+        for w in words[best]: weight[w] **= 2
+    if not chosen: return text[:max_chars]
+    parts, last_paragraph = [], None
+    for i in sorted(chosen):
+        paragraph, sentence = sentences[i]
+        if paragraph == last_paragraph: parts[-1] += " " + sentence
+        else: parts.append(sentence); last_paragraph = paragraph
+    return "\n\n".join(parts)
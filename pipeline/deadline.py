@@ -0,0 +1,93 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# ----------------------------------------------------------------------------
+# END-TO-END DEADLINES
+# ----------------------------------------------------------------------------
+# The active deadline lives in a context variable so it reaches the scraper and
+# the model clients without changing their signatures. Work handed to a thread
+# pool must be submitted through submit_with_context() to carry it along.
+
+_current_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage is started after the request's latency budget ran out."""
+
+
+class Deadline:
+    """A fixed point in time by which a request must be answered."""
+
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Applies a deadline of `seconds` to everything run inside the block (None/0 = no deadline)."""
+    if not seconds or seconds <= 0:
+        yield None
+        return
+    deadline = Deadline(seconds)
+    token = _current_deadline.set(deadline)
+    try: yield deadline
+    finally: _current_deadline.reset(token)
+
+
+def remaining_time(default=None):
+    """Seconds left on the active deadline, or `default` when there is none."""
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else default
+
+
+def budget_timeout(default, minimum=0.5):
+    """
+    A per-call timeout sized from the remaining budget: `default` capped by the
+    time left, but never below `minimum` so a call is not started with a zero timeout.
+    Raises DeadlineExceeded if the budget is already spent.
+    """
+    deadline = current_deadline()
+    if deadline is None: return default
+    if deadline.expired(): raise DeadlineExceeded(f"Latency budget of {deadline.budget:.0f} seconds exhausted.")
+    remaining = deadline.remaining()
+    return max(minimum, min(default, remaining)) if default else max(minimum, remaining)
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit() that runs fn under the caller's context (and so its deadline)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def hedged_call(fn, hedge_after, executor):
+    """
+    Runs fn(); if it has not finished after `hedge_after` seconds, starts one
+    identical backup call and returns whichever succeeds first. Only for
+    idempotent calls. Returns (result, hedged).
+    """
+    primary = submit_with_context(executor, fn)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done: return primary.result(), False
+    backup = submit_with_context(executor, fn)
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending: other.cancel()
+                return future.result(), True
+            error = future.exception()
+    raise error
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import struct
+import hashlib
+import threading
+
+try:
+    import numpy as np # Optional: vectorizes signatures, with identical values
+except ImportError:
+    np = None
+
+# ----------------------------------------------------------------------------
+# NEAR-DUPLICATE DETECTION (MinHash + LSH)
+# ----------------------------------------------------------------------------
+# Syndicated copies of one story differ in boilerplate, bylines and a few
+# edited sentences, so exact content hashes miss them. A MinHash signature of
+# the text's word shingles estimates Jaccard similarity between two articles;
+# LSH banding (rows of the signature hashed per band) finds candidate pairs
+# without comparing every pair.
+
+HASH_PRIME = (1 << 31) - 1 # Small enough that a*h+b (h < 2**32) fits in 64 bits for numpy
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class MinHasher:
+    """MinHash signatures over word `shingle_size`-grams with `num_perm` seeded hash permutations."""
+
+    def __init__(self, num_perm=128, shingle_size=4, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, HASH_PRIME), rng.randrange(0, HASH_PRIME)) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array([a for a, _ in self._perms], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self._perms], dtype=np.uint64)[:, None]
+
+    def shingles(self, text):
+        """Set of 32-bit hashes of the lowercase word k-grams (the whole text if it is shorter than k words)."""
+        words = _WORD.findall(text.lower()) if isinstance(text, str) else []
+        if not words: return set()
+        k = min(self.shingle_size, len(words))
+        return {int.from_bytes(hashlib.blake2b(" ".join(words[i:i + k]).encode('utf-8'), digest_size=4).digest(), 'little')
+                for i in range(len(words) - k + 1)}
+
+    def signature(self, text):
+        """Tuple of `num_perm` minimum hash values, or None for a text without words."""
+        hashes = self.shingles(text)
+        if not hashes: return None
+        if np is not None:
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+            return tuple(int(v) for v in ((self._a * values + self._b) % HASH_PRIME).min(axis=1))
+        return tuple(min((a * h + b) % HASH_PRIME for h in hashes) for a, b in self._perms)
+
+
+def estimate_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the share of signature positions that agree."""
+    if not sig_a or not sig_b or len(sig_a) != len(sig_b): return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def band_keys(signature, bands):
+    """One bucket key per LSH band; near-duplicates share at least one with high probability."""
+    rows = len(signature) // bands
+    return [hashlib.blake2b(struct.pack(f"<{rows}I", *signature[band * rows:(band + 1) * rows]), digest_size=8).hexdigest() for band in range(bands)]
+
+
+def cluster_near_duplicates(signatures, threshold=0.8, bands=32):
+    """
+    Groups indices whose signatures are at least `threshold` similar.
+    Returns clusters as index lists in input order; the first index of each
+    cluster is its representative. Items without a signature stay alone.
+    """
+    parent = list(range(len(signatures)))
+    def find(i):
+        while parent[i] != i: parent[i] = parent[parent[i]]; i = parent[i]
+        return i
+    buckets = {}
+    for i, signature in enumerate(signatures):
+        if signature is None: continue
+        for band, key in enumerate(band_keys(signature, bands)):
+            for j in buckets.setdefault((band, key), []):
+                if find(i) != find(j) and estimate_similarity(signature, signatures[j]) >= threshold:
+                    root_i, root_j = find(i), find(j); parent[max(root_i, root_j)] = min(root_i, root_j)
+            buckets[(band, key)].append(i)
+    clusters = {}
+    for i in range(len(signatures)): clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+
+class SignatureIndex:
+    """
+    Persistent MinHash index (SQLite, WAL mode) of analyzed articles, so a
+    near-duplicate of an article analyzed by an earlier request can reuse its
+    result. Entries carry a `model_key` (only matches with the current models
+    count) and expire after `ttl` seconds; the oldest are dropped beyond
+    `max_entries`.
+    """
+
+    def __init__(self, path, bands=32, ttl=None, max_entries=50000):
+        self.path = path
+        self.bands = bands
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "matches": 0, "added": 0}
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, signature BLOB NOT NULL, model_key TEXT NOT NULL,
+                analysis TEXT NOT NULL, created_at REAL NOT NULL)""")
+            conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket TEXT NOT NULL, doc_id INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands(band, bucket)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_doc ON bands(doc_id)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock: self._stats[name] += 1
+
+    def stats(self):
+        with self._lock: stats = dict(self._stats)
+        stats["entries"] = self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return stats
+
+    def find(self, signature, model_key, threshold=0.8):
+        """Best match as {"url", "similarity", "analysis"}, or None."""
+        if signature is None: return None
+        self._count("lookups")
+        conn = self._connect(); candidates = set()
+        for band, key in enumerate(band_keys(signature, self.bands)):
+            candidates.update(row[0] for row in conn.execute("SELECT doc_id FROM bands WHERE band = ? AND bucket = ?", (band, key)))
+        if not candidates: return None
+        min_created = time.time() - self.ttl if self.ttl else 0
+        best = None
+        placeholders = ",".join("?" * len(candidates))
+        rows = conn.execute(f"SELECT url, signature, analysis FROM documents WHERE id IN ({placeholders}) AND model_key = ? AND created_at >= ?",
+                            (*candidates, model_key, min_created))
+        for url, blob, analysis in rows:
+            similarity = estimate_similarity(signature, struct.unpack(f"<{len(blob) // 4}I", blob))
+            if similarity >= threshold and (best is None or similarity > best["similarity"]): best = {"url": url, "similarity": similarity, "analysis": analysis}
+        if best is None: return None
+        self._count("matches")
+        best["analysis"] = json.loads(best["analysis"])
+        return best
+
+    def add(self, url, signature, model_key, analysis):
+        """Indexes one analyzed article."""
+        if signature is None: return
+        with self._connect() as conn:
+            doc_id = conn.execute("INSERT INTO documents (url, signature, model_key, analysis, created_at) VALUES (?, ?, ?, ?, ?)",
+                                  (url, struct.pack(f"<{len(signature)}I", *signature), model_key, json.dumps(analysis), time.time())).lastrowid
+            conn.executemany("INSERT INTO bands (band, bucket, doc_id) VALUES (?, ?, ?)", [(band, key, doc_id) for band, key in enumerate(band_keys(signature, self.bands))])
+            if self.max_entries and doc_id % 100 == 0: # Trim now and then rather than on every insert
+                cutoff = doc_id - self.max_entries
+                conn.execute("DELETE FROM bands WHERE doc_id <= ?", (cutoff,))
+                conn.execute("DELETE FROM documents WHERE id <= ?", (cutoff,))
+        self._count("added")
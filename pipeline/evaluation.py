@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+
+# ----------------------------------------------------------------------------
+# OFFLINE EVALUATION ENGINE
+# ----------------------------------------------------------------------------
+# Runs a sequence classifier over a labelled CSV in batches. Texts are sorted
+# by length before batching so each batch pads to similar lengths, batches can
+# be spread over several CPU processes, and every finished batch is appended
+# to a JSONL checkpoint so an interrupted run resumes where it stopped. With a
+# token store, the dataset is tokenized once per tokenizer and later runs feed
+# the memory-mapped arrays straight to the model.
+# pandas / scikit-learn / torch / transformers are only needed for evaluation.
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'news_sentiment_analysis.csv')
+
+
+def load_labelled_csv(path=DEFAULT_DATASET, text_column="Description", label_column="Sentiment", labels=None, limit=None):
+    """Loads (texts, gold_labels) from a CSV; labels are capitalized and optionally restricted to `labels`."""
+    import pandas as pd
+    df = pd.read_csv(path)
+    df = df[df[text_column].notna() & df[label_column].notna()]
+    df[label_column] = df[label_column].astype(str).str.capitalize()
+    if labels: df = df[df[label_column].isin(labels)]
+    if limit: df = df.head(limit)
+    return df[text_column].astype(str).tolist(), df[label_column].tolist()
+
+
+def length_bucketed_batches(texts, batch_size, lengths=None):
+    """Index batches over `texts`, grouped by length (token `lengths` if known, else characters) so padding inside a batch is minimal."""
+    order = sorted(range(len(texts)), key=lambda i: lengths[i] if lengths is not None else len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def dataset_fingerprint(texts):
+    digest = hashlib.sha256()
+    for text in texts: digest.update(text.encode('utf-8')); digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def percentile(values, q):
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+# --- Checkpointing ---
+class PredictionCheckpoint:
+    """
+    Append-only JSONL file of predictions: a header line identifying the model
+    and dataset, then one line per finished batch. A header that does not match
+    the current run means the file is stale and it is started over.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.predictions = {} # index -> (label, score)
+        self.batch_latencies = [] # seconds per batch, for batches run in earlier sessions too
+        self._file = None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        try: header = json.loads(lines[0]) if lines else None
+        except ValueError: header = None
+        if header != self.header:
+            print(f"Checkpoint {self.path} belongs to a different model/dataset, starting over.")
+            os.remove(self.path); return 0
+        for line in lines[1:]:
+            try: record = json.loads(line)
+            except ValueError: continue # Partially written last line of an interrupted run
+            self.predictions.update({i: (label, score) for i, label, score in zip(record["indices"], record["labels"], record["scores"])})
+            self.batch_latencies.append(record["seconds"])
+        return len(self.predictions)
+
+    def append(self, indices, labels, scores, seconds):
+        self.predictions.update({i: (label, score) for i, label, score in zip(indices, labels, scores)})
+        self.batch_latencies.append(seconds)
+        if not self.path or None in labels: return # Failed batches are retried on resume
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory): os.makedirs(directory)
+            new_file = not os.path.exists(self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if new_file: self._file.write(json.dumps(self.header) + "\n")
+        self._file.write(json.dumps({"indices": indices, "labels": labels, "scores": scores, "seconds": seconds}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file: self._file.close(); self._file = None
+
+
+# --- Batch prediction (runs in the parent or in worker processes) ---
+_worker_classifier = None
+_worker_tokens = None
+
+
+def load_classifier(model_name, max_length=512, runtime="torch", threads=None):
+    """A classifier for `runtime`: "torch" (model name/path) or "onnx" / "onnx-int8" (an onnx_export output directory)."""
+    from pipeline.backends import LocalClassifier, OnnxClassifier
+    if runtime in ("onnx", "onnx-int8"): return OnnxClassifier(model_name, max_length=max_length, quantized=runtime == "onnx-int8", threads=threads)
+    import torch
+    if threads: torch.set_num_threads(threads)
+    return LocalClassifier(model_name, max_length=max_length)
+
+
+def _init_worker(model_name, max_length, torch_threads, tokens_directory=None, runtime="torch"):
+    global _worker_classifier, _worker_tokens
+    from pipeline.token_store import TokenizedDataset
+    _worker_classifier = load_classifier(model_name, max_length, runtime, torch_threads)
+    _worker_tokens = TokenizedDataset(tokens_directory) if tokens_directory else None # mmap: pages shared across workers
+
+
+def _predict_batch(task):
+    """Returns (indices, labels, scores, seconds) for one batch of (indices, texts); texts is None when using the token store."""
+    indices, texts = task
+    start = time.perf_counter()
+    try:
+        rows = _worker_classifier.classify_batch(texts) if texts is not None else _worker_classifier.classify_encoded(*_worker_tokens.batch(indices))
+        best = [max(row, key=lambda item: item["score"]) for row in rows]
+        labels, scores = [item["label"] for item in best], [round(item["score"], 6) for item in best]
+    except Exception as e:
+        print(f"Error predicting batch of {len(indices)}: {e}")
+        labels, scores = [None] * len(indices), [0.0] * len(indices)
+    return indices, labels, scores, time.perf_counter() - start
+
+
+def predict_dataset(texts, model_name, batch_size=32, num_workers=1, max_length=512, checkpoint_path=None, token_store_dir=None, runtime="torch", progress_every=10):
+    """
+    Predicts a label for every text. Returns (predictions, stats) where
+    predictions[i] is (model_label, score) or (None, 0.0) if its batch failed.
+    `token_store_dir` enables the tokenization precompute store (see pipeline.token_store);
+    `runtime` selects PyTorch or an ONNX export (see load_classifier).
+    """
+    fingerprint = dataset_fingerprint(texts)
+    header = {"model": model_name, "runtime": runtime, "max_length": max_length, "dataset": fingerprint, "rows": len(texts)}
+    checkpoint = PredictionCheckpoint(checkpoint_path, header)
+    resumed = checkpoint.load()
+    if resumed: print(f"[+] Resuming from checkpoint: {resumed}/{len(texts)} predictions already done.")
+    tokens = None
+    if token_store_dir and resumed < len(texts):
+        from transformers import AutoTokenizer
+        from pipeline.token_store import TokenStore
+        tokens = TokenStore(token_store_dir).load_or_precompute(AutoTokenizer.from_pretrained(model_name), texts, max_length, fingerprint)
+    batches = [[i for i in batch if i not in checkpoint.predictions] for batch in length_bucketed_batches(texts, batch_size, tokens.lengths if tokens else None)]
+    tasks = [(batch, None if tokens else [texts[i] for i in batch]) for batch in batches if batch]
+    num_workers = max(1, min(num_workers, len(tasks) or 1))
+    torch_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"[+] {len(tasks)} batches of up to {batch_size} texts on {num_workers} process(es), {torch_threads} torch thread(s) each.")
+
+    session_latencies = []; pool = None; start = end = time.perf_counter()
+    try:
+        if tasks and num_workers == 1:
+            _init_worker(model_name, max_length, torch_threads, tokens.directory if tokens else None, runtime); start = time.perf_counter(); results = map(_predict_batch, tasks)
+        elif tasks:
+            pool = multiprocessing.get_context("spawn").Pool(num_workers, initializer=_init_worker, initargs=(model_name, max_length, torch_threads, tokens.directory if tokens else None, runtime))
+            results = pool.imap_unordered(_predict_batch, tasks)
+        else: results = []
+        for n, (indices, labels, scores, seconds) in enumerate(results, 1):
+            if pool and n == 1: start = time.perf_counter() - seconds # Clock starts with the first batch, not worker model loading
+            checkpoint.append(indices, labels, scores, seconds); session_latencies.append((seconds, len(indices)))
+            if progress_every and n % progress_every == 0: print(f"    {n}/{len(tasks)} batches, {len(checkpoint.predictions)}/{len(texts)} texts")
+        end = time.perf_counter()
+        if pool: pool.close(); pool.join(); pool = None
+    finally:
+        checkpoint.close()
+        if pool: pool.terminate(); pool.join()
+    elapsed = end - start
+
+    predicted = sum(size for _, size in session_latencies)
+    per_text_ms = [seconds / size * 1000 for seconds, size in session_latencies for _ in range(size)]
+    batch_ms = [seconds * 1000 for seconds, _ in session_latencies]
+    stats = {
+        "texts": len(texts), "resumed": resumed, "predicted_this_run": predicted, "seconds": round(elapsed, 2),
+        "throughput_texts_per_s": round(predicted / elapsed, 2) if elapsed > 0 and predicted else None,
+        "batch_latency_ms": {f"p{q}": round(percentile(batch_ms, q), 1) if batch_ms else None for q in (50, 95, 99)},
+        "per_text_latency_ms": {f"p{q}": round(percentile(per_text_ms, q), 2) if per_text_ms else None for q in (50, 95, 99)},
+        "failed": sum(1 for label, _ in checkpoint.predictions.values() if label is None),
+    }
+    return [checkpoint.predictions.get(i, (None, 0.0)) for i in range(len(texts))], stats
+
+
+def evaluate(texts, gold, model_name, label_map=None, labels=None, fallback_label=None, **predict_kwargs):
+    """
+    Runs predict_dataset and scores it against `gold`. `label_map` maps model
+    labels to dataset labels (default: capitalize); failed predictions get
+    `fallback_label`. Returns (predicted_labels, report_text, stats).
+    """
+    from sklearn.metrics import classification_report
+    predictions, stats = predict_dataset(texts, model_name, **predict_kwargs)
+    def to_dataset_label(label):
+        if label is None: return fallback_label
+        return label_map.get(label, label) if label_map else str(label).capitalize()
+    predicted = [to_dataset_label(label) for label, _ in predictions]
+    report = classification_report(gold, predicted, labels=labels, zero_division=0)
+    return predicted, report, stats
+
+
+def format_stats(stats):
+    lines = [f"Texts: {stats['texts']} ({stats['resumed']} from checkpoint, {stats['predicted_this_run']} predicted in {stats['seconds']} s)"]
+    if stats["throughput_texts_per_s"]: lines.append(f"Throughput: {stats['throughput_texts_per_s']} texts/s")
+    lines.append("Batch latency (ms): " + ", ".join(f"{q}={v}" for q, v in stats["batch_latency_ms"].items()))
+    lines.append("Per-text latency (ms): " + ", ".join(f"{q}={v}" for q, v in stats["per_text_latency_ms"].items()))
+    if stats["failed"]: lines.append(f"Failed predictions (fallback label used): {stats['failed']}")
+    return "\n".join(lines)
+
+
+def add_evaluation_args(parser, default_model, default_batch_size=32):
+    """Command-line options shared by the evaluation scripts."""
+    parser.add_argument("--model", default=default_model, help=f"Model name or local path (default: {default_model})")
+    parser.add_argument("--data", default=os.getenv("EVAL_DATASET", DEFAULT_DATASET), help="Labelled CSV (default: news_sentiment_analysis.csv in the repo)")
+    parser.add_argument("--runtime", choices=["torch", "onnx", "onnx-int8"], default="torch", help="onnx/onnx-int8 expect --model to be a pipeline.onnx_export output directory")
+    parser.add_argument("--batch-size", type=int, default=default_batch_size)
+    parser.add_argument("--workers", type=int, default=1, help="CPU processes to shard batches over")
+    parser.add_argument("--max-length", type=int, default=512, help="Max tokens per text")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N rows")
+    parser.add_argument("--checkpoint", default=None, help="Predictions JSONL to resume from (default: eval_checkpoints/<model>.jsonl)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore and overwrite an existing checkpoint")
+    parser.add_argument("--token-store", default=os.getenv("EVAL_TOKEN_STORE", os.path.join('cache', 'tokens')), help="Directory for precomputed token arrays")
+    parser.add_argument("--no-token-store", action="store_true", help="Tokenize on the fly instead of using the token store")
+    parser.add_argument("--no-plot", action="store_true", help="Skip the confusion matrix plot")
+    return parser
+
+
+def checkpoint_path_for(args, model_name):
+    suffix = '' if args.runtime == 'torch' else '.' + args.runtime
+    path = args.checkpoint or os.path.join('eval_checkpoints', model_name.strip('/').replace('/', '__') + suffix + '.jsonl')
+    if args.no_resume and os.path.exists(path): os.remove(path)
+    return path
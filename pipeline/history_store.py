@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+
+# ----------------------------------------------------------------------------
+# HISTORY STORE (SQLite, WAL mode)
+# ----------------------------------------------------------------------------
+class HistoryStore:
+    """
+    Analysis history in a SQLite table with indexed id/date/input_type columns.
+
+    Inserts and deletes touch a single row, reads are paginated, and WAL mode
+    lets concurrent request threads (and processes) write without losing
+    entries. Rows are returned in the same dict shape the old history.json
+    used: {id, date, input_type, input_value, results}.
+    """
+
+    def __init__(self, path, legacy_json_path=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        self._local = threading.local() # One connection per thread; SQLite handles the locking
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY, date TEXT NOT NULL, input_type TEXT NOT NULL,
+                input_value TEXT, results TEXT NOT NULL, full_input_value TEXT)""")
+            if "full_input_value" not in {row[1] for row in conn.execute("PRAGMA table_info(history)")}: # Databases created before it
+                conn.execute("ALTER TABLE history ADD COLUMN full_input_value TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_date ON history(date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_history_input_type ON history(input_type, id)")
+        if legacy_json_path: self._import_legacy_json(legacy_json_path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_entry(row):
+        entry_id, date, input_type, input_value, results = row
+        try: results = json.loads(results)
+        except (TypeError, ValueError): results = {}
+        return {'id': entry_id, 'date': date, 'input_type': input_type, 'input_value': input_value, 'results': results}
+
+    def add(self, date, input_type, input_value, results, full_input_value=None):
+        """
+        Inserts one entry and returns its id (a millisecond timestamp, bumped if already taken).
+        `full_input_value` keeps the untruncated input when `input_value` is shortened for display.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO history (id, date, input_type, input_value, results, full_input_value) "
+                "SELECT MAX(COALESCE(MAX(id), 0) + 1, ?), ?, ?, ?, ?, ? FROM history",
+                (int(time.time() * 1000), date, input_type, input_value, json.dumps(results), full_input_value))
+            return cursor.lastrowid
+
+    def list(self, limit=20, offset=0, input_type=None):
+        """Newest-first page of entries, optionally filtered by input_type."""
+        query = "SELECT id, date, input_type, input_value, results FROM history"
+        params = []
+        if input_type: query += " WHERE input_type = ?"; params.append(input_type)
+        query += " ORDER BY id DESC LIMIT ? OFFSET ?"; params += [limit, offset]
+        return [self._row_to_entry(row) for row in self._connect().execute(query, params)]
+
+    def get(self, entry_id):
+        row = self._connect().execute("SELECT id, date, input_type, input_value, results FROM history WHERE id = ?", (entry_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def popular_values(self, input_type, since_id=0, limit=10):
+        """
+        Most frequent full input values (case-insensitive) among entries with id >= `since_id`,
+        as [(value, count)]; ties go to the most recent. Older display-truncated entries without
+        their full value (longer than 100 chars) are skipped.
+        """
+        rows = self._connect().execute(
+            "SELECT COALESCE(full_input_value, input_value) AS value, COUNT(*) AS n, MAX(id) AS last_id FROM history "
+            "WHERE input_type = ? AND id >= ? AND input_value IS NOT NULL AND (full_input_value IS NOT NULL OR length(input_value) <= 100) "
+            "GROUP BY lower(trim(value)) ORDER BY n DESC, last_id DESC LIMIT ?", (input_type, since_id, limit))
+        return [(value, n) for value, n, _ in rows]
+
+    def count(self, input_type=None):
+        if input_type: return self._connect().execute("SELECT COUNT(*) FROM history WHERE input_type = ?", (input_type,)).fetchone()[0]
+        return self._connect().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def delete(self, entry_id):
+        """Deletes one entry; returns True if it existed."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM history WHERE id = ?", (entry_id,)).rowcount > 0
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM history")
+
+    def trim(self, max_entries):
+        """Keeps only the newest `max_entries` rows (0 = unlimited)."""
+        if not max_entries: return 0
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM history WHERE id NOT IN (SELECT id FROM history ORDER BY id DESC LIMIT ?)", (max_entries,)).rowcount
+
+    def _import_legacy_json(self, json_path):
+        """One-time import of the old history.json into an empty table."""
+        if not os.path.exists(json_path) or self.count(): return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f: legacy = json.load(f)
+            if not isinstance(legacy, list): return
+            rows = []
+            for item in legacy:
+                try: rows.append((int(item['id']), item.get('date', ''), item.get('input_type', ''), item.get('input_value'), json.dumps(item.get('results', {}))))
+                except (KeyError, ValueError, TypeError): print(f"Warning: Skipping invalid legacy history item: {item}")
+            with self._connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO history (id, date, input_type, input_value, results) VALUES (?, ?, ?, ?, ?)", rows)
+            print(f"Imported {len(rows)} history entries from {json_path}.")
+        except Exception as e:
+            print(f"Warning: Could not import legacy history from {json_path}: {e}"); traceback.print_exc()
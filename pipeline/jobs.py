@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+
+# ----------------------------------------------------------------------------
+# PERSISTENT JOB QUEUE (SQLite + worker threads)
+# ----------------------------------------------------------------------------
+class JobQueue:
+    """
+    A local, SQLite-backed job queue served by a pool of worker threads.
+
+    `handler(payload, report_progress)` runs one job and returns a result dict;
+    a result containing "error" marks the job failed. Jobs with the same
+    `dedup_key` share one queued/running job. A claimed job carries its
+    worker's owner id and a lease that a heartbeat renews every lease/3
+    seconds; jobs whose lease expired (the process died) are re-queued by the
+    next claim, in this or any other process sharing the database.
+    """
+
+    def __init__(self, path, handler, num_workers=2, poll_interval=1.0, lease_seconds=60):
+        self.path = path
+        self.handler = handler
+        self.num_workers = max(0, num_workers)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._workers = []
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        conn = self._connect()
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, dedup_key TEXT, payload TEXT NOT NULL, status TEXT NOT NULL,
+            progress TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT, lease_expires REAL)""")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_expires", "REAL")): # Databases created before leases
+            if column not in columns: conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(dedup_key, status)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None) # Autocommit; multi-statement steps use BEGIN IMMEDIATE
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Starts the worker threads (idempotent)."""
+        if self._workers: return
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i+1}", daemon=True)
+            worker.start(); self._workers.append(worker)
+        if self._workers: threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        print(f"Job queue started with {self.num_workers} worker(s).")
+
+    def submit(self, payload, dedup_key=None):
+        """Queues a job. Returns (job_id, deduplicated) where `deduplicated` means an in-flight job was reused."""
+        existing = None
+        job_id = uuid.uuid4().hex
+        def insert(conn):
+            nonlocal existing
+            if dedup_key:
+                existing = conn.execute("SELECT id FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1", (dedup_key,)).fetchone()
+                if existing: return
+            now = time.time()
+            conn.execute("INSERT INTO jobs (id, dedup_key, payload, status, progress, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                         (job_id, dedup_key, json.dumps(payload), json.dumps({}), now, now))
+        self._transaction(insert)
+        if existing: return existing[0], True
+        with self._wakeup: self._wakeup.notify()
+        return job_id, False
+
+    def get(self, job_id):
+        """Job status dict, or None if unknown."""
+        row = self._connect().execute(
+            "SELECT id, payload, status, progress, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None: return None
+        job_id, payload, status, progress, result, error, attempts, created_at, updated_at = row
+        job = {"job_id": job_id, "status": status, "payload": json.loads(payload), "progress": json.loads(progress or '{}'),
+               "attempts": attempts, "created_at": created_at, "updated_at": updated_at}
+        if result is not None: job["result"] = json.loads(result)
+        if error is not None: job["error"] = error
+        return job
+
+    def counts(self):
+        return dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _claim(self):
+        """Atomically re-queues jobs with expired leases, then leases the oldest queued job and returns (id, payload)."""
+        def claim(conn):
+            now = time.time()
+            requeued = conn.execute("UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL, updated_at = ? WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)",
+                                    (now, now)).rowcount
+            if requeued: print(f"Re-queued {requeued} job(s) whose worker stopped.")
+            row = conn.execute("SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row: conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                                 (self.owner, now + self.lease_seconds, now, row[0]))
+            return row
+        row = self._transaction(claim)
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _transaction(self, fn):
+        """Runs fn(conn) inside BEGIN IMMEDIATE, which also serializes check-then-write steps across processes."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK"); raise
+        conn.execute("COMMIT")
+        return result
+
+    def _update(self, job_id, **fields):
+        """Updates a job this process still holds the lease of (a re-queued job belongs to its new worker)."""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND owner = ?", (*fields.values(), time.time(), job_id, self.owner))
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try: self._connect().execute("UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND owner = ?", (time.time() + self.lease_seconds, self.owner))
+            except sqlite3.Error as e: print(f"Warning: Could not renew job leases: {e}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not claim job: {e}"); claimed = None
+            if claimed is None:
+                with self._wakeup: self._wakeup.wait(timeout=self.poll_interval)
+                continue
+            job_id, payload = claimed
+            print(f"Job {job_id} started.")
+            report = lambda progress, job_id=job_id: self._update(job_id, progress=json.dumps(progress))
+            try:
+                result = self.handler(payload, report)
+                if isinstance(result, dict) and "error" in result:
+                    self._update(job_id, status='failed', error=str(result["error"]))
+                else:
+                    self._update(job_id, status='done', result=json.dumps(result))
+                print(f"Job {job_id} finished.")
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status='failed', error=f"Unexpected job error: {e}")
@@ -0,0 +1,98 @@
+import json
+
+# ----------------------------------------------------------------------------
+# INCREMENTAL JSON OBJECT PARSING (streamed LLM output)
+# ----------------------------------------------------------------------------
+# The LLM is asked for one flat JSON object. Scanning the characters as they
+# arrive (tracking strings, escapes and bracket depth) is enough to tell when
+# each top-level value is complete, so fields can be used before the response
+# ends and one malformed value does not invalidate the others.
+
+_WHITESPACE = " \t\r\n"
+
+
+class JSONObjectStream:
+    """
+    Parses the first top-level JSON object of a text that arrives in pieces.
+    feed() returns the (key, value) pairs completed by that piece; `fields`
+    holds all of them, `errors` the keys whose value did not parse and `done`
+    turns True at the object's closing brace. Text around the object is ignored.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.errors = {}
+        self.done = False
+        self._state = "start"
+        self._buffer = []
+        self._key = None
+        self._kind = None # "string", "container" or "primitive"
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if self.done: break
+            self._step(char, completed)
+        return completed
+
+    def _step(self, char, completed):
+        state = self._state
+        if state == "start":
+            if char == '{': self._state = "key_start"
+        elif state == "key_start":
+            if char == '"': self._state = "key"; self._buffer = []; self._escape = False
+            elif char == '}': self.done = True
+        elif state == "key":
+            if self._escape: self._escape = False
+            elif char == '\\': self._escape = True
+            elif char == '"':
+                try: self._key = json.loads('"' + "".join(self._buffer) + '"', strict=False)
+                except ValueError: self._key = "".join(self._buffer)
+                self._state = "colon"; return
+            self._buffer.append(char)
+        elif state == "colon":
+            if char == ':': self._state = "value_start"
+        elif state == "value_start":
+            if char in _WHITESPACE: return
+            if char == '}': self.errors[self._key] = "Missing value"; self.done = True; return
+            self._buffer = [char]; self._state = "value"; self._escape = False
+            if char == '"': self._kind = "string"; self._in_string = True
+            elif char in '{[': self._kind = "container"; self._depth = 1; self._in_string = False
+            else: self._kind = "primitive"
+        elif state == "value":
+            self._step_value(char, completed)
+        elif state == "after_value":
+            if char == ',': self._state = "key_start"
+            elif char == '}': self.done = True
+
+    def _step_value(self, char, completed):
+        if self._kind == "primitive":
+            if char in ',}' or char in _WHITESPACE:
+                self._complete(completed)
+                if char == ',': self._state = "key_start"
+                elif char == '}': self.done = True
+                return
+            self._buffer.append(char); return
+        self._buffer.append(char)
+        if self._in_string:
+            if self._escape: self._escape = False
+            elif char == '\\': self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._kind == "string": self._complete(completed)
+        elif char == '"': self._in_string = True
+        elif char in '{[': self._depth += 1
+        elif char in '}]':
+            self._depth -= 1
+            if self._depth == 0: self._complete(completed)
+
+    def _complete(self, completed):
+        raw = "".join(self._buffer)
+        self._state = "after_value"
+        try: value = json.loads(raw, strict=False) # strict=False: LLMs put raw newlines in strings
+        except ValueError as e: self.errors[self._key] = str(e); return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
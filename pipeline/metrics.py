@@ -0,0 +1,263 @@
+import re
+import sys
+import time
+import uuid
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ----------------------------------------------------------------------------
+# METRICS (Prometheus text format, no client library needed)
+# ----------------------------------------------------------------------------
+# Counters, gauges and histograms with labels, kept in one process-wide
+# registry and rendered by the /metrics route. Callback metrics read existing
+# stats() dicts (caches, breakers, single-flight) at scrape time.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs: return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames): raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        with self._lock: items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1 # Last slot is +Inf
+            self._values[key] = (counts, total + value)
+
+    def totals(self):
+        """{label_values: (count, sum)} for every label combination observed."""
+        with self._lock: return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def samples(self):
+        with self._lock: items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A counter or gauge whose values come from `collect()` -> {label_values_tuple: value} at render time."""
+
+    def __init__(self, name, documentation, labelnames, collect, kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def samples(self):
+        try: values = self._collect()
+        except Exception as e: print(f"Warning: Could not collect metric {self.name}: {e}"); return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics: raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()): return self.register(Counter(name, documentation, labelnames))
+    def gauge(self, name, documentation, labelnames=()): return self.register(Gauge(name, documentation, labelnames))
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS): return self.register(Histogram(name, documentation, labelnames, buckets))
+    def callback(self, name, documentation, labelnames, collect, kind="gauge"): return self.register(CallbackMetric(name, documentation, labelnames, collect, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock: metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics: lines.extend(metric.header()); lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline metrics shared by app.py and the scraper
+STAGE_SECONDS = REGISTRY.histogram("pipeline_stage_seconds", "Wall time of one pipeline stage call.", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("pipeline_stage_errors_total", "Pipeline stage calls that returned or raised an error.", ["stage"])
+STAGE_IN_FLIGHT = REGISTRY.gauge("pipeline_stage_in_flight", "Pipeline stage calls currently running.", ["stage"])
+UPSTREAM_SECONDS = REGISTRY.histogram("upstream_request_seconds", "Latency of individual upstream requests (each attempt).", ["upstream", "outcome"])
+UPSTREAM_RETRIES = REGISTRY.counter("upstream_retries_total", "Retried upstream requests.", ["upstream"])
+CACHE_LOOKUPS = REGISTRY.counter("cache_lookups_total", "Result and page cache lookups.", ["cache", "result"])
+ANALYSES = REGISTRY.counter("analyses_total", "Completed analyses by input type and outcome.", ["input_type", "outcome"])
+
+
+def observe_upstream(upstream, outcome, seconds):
+    UPSTREAM_SECONDS.observe(seconds, upstream=upstream, outcome=outcome)
+
+
+def observe_stage(stage, seconds, error=False):
+    """Records one stage call timed by the caller (for stages that are not a single block or function)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error: STAGE_ERRORS.inc(stage=stage)
+
+
+def _result_has_error(result):
+    return isinstance(result, dict) and "error" in result
+
+
+class StageSpan:
+    """Handle yielded by stage_span(); call fail() to count the stage as an error without raising."""
+
+    def __init__(self): self.failed = False
+    def fail(self): self.failed = True
+
+
+@contextmanager
+def stage_span(stage):
+    """Times the enclosed block as one call of `stage`, tracking it as in flight meanwhile."""
+    span = StageSpan(); start = time.perf_counter()
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    try: yield span
+    except BaseException: span.fail(); raise
+    finally:
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        if span.failed: STAGE_ERRORS.inc(stage=stage)
+
+
+def track_stage(stage, is_error=_result_has_error):
+    """Decorator form of stage_span(); a result for which `is_error(result)` is true counts as an error."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_span(stage) as span:
+                result = func(*args, **kwargs)
+                if is_error(result): span.fail()
+                return result
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------------
+# TRACE IDS
+# ----------------------------------------------------------------------------
+# Like the deadline, the current trace id lives in a context variable and
+# reaches pool threads through deadline.submit_with_context(). TraceLogStream
+# prefixes every printed line with it.
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+
+
+_TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:12]
+
+
+def valid_trace_id(value):
+    """`value` if it is safe to use as a trace id (e.g. a client's X-Request-ID), else None."""
+    return value if isinstance(value, str) and _TRACE_ID_PATTERN.match(value) else None
+
+
+def current_trace_id():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_scope(trace_id=None):
+    """Runs the block under `trace_id` (a new id if None); yields the id."""
+    token = _current_trace.set(trace_id or new_trace_id())
+    try: yield _current_trace.get()
+    finally: _current_trace.reset(token)
+
+
+class TraceLogStream:
+    """Wraps a text stream and prefixes each line written under an active trace with "[trace_id] "."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local() # Whether this thread's last write ended a line
+
+    def write(self, text):
+        trace_id = _current_trace.get()
+        at_line_start = getattr(self._local, 'at_line_start', True)
+        if text: self._local.at_line_start = text.endswith('\n')
+        if not trace_id or not text: return self._stream.write(text)
+        lines = text.split('\n')
+        prefixed = [f"[{trace_id}] {line}" if line and (i > 0 or at_line_start) else line for i, line in enumerate(lines)]
+        self._stream.write('\n'.join(prefixed))
+        return len(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def install_trace_logging():
+    """Prefixes stdout lines with the active trace id (idempotent)."""
+    if not isinstance(sys.stdout, TraceLogStream): sys.stdout = TraceLogStream(sys.stdout)
@@ -0,0 +1,81 @@
+import os
+import json
+import inspect
+import argparse
+
+from pipeline.backends import onnx_model_dir
+
+# ----------------------------------------------------------------------------
+# ONNX EXPORT + DYNAMIC INT8 QUANTIZATION
+# ----------------------------------------------------------------------------
+# Writes, per model, <output>/<model-slug>/ with:
+#   model.onnx       fp32 graph (dynamic batch and sequence axes)
+#   model.int8.onnx  dynamically quantized weights (int8 MatMul/Gemm)
+#   tokenizer files, config.json, labels.json
+# which OnnxClassifier (CLASSIFIER_BACKEND=onnx) loads.
+#
+#   python -m pipeline.onnx_export --model siebert/sentiment-roberta-large-english --model bucketresearch/politicalBiasBERT
+
+DEFAULT_ONNX_DIR = os.path.join('models', 'onnx')
+DEFAULT_MODELS = ["siebert/sentiment-roberta-large-english", "bucketresearch/politicalBiasBERT"]
+
+
+def export_classifier(model_name, output_root=DEFAULT_ONNX_DIR, opset=17, quantize=True):
+    """Exports one sequence classifier to ONNX (and int8); returns its output directory."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    output_dir = onnx_model_dir(output_root, model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"[+] Exporting {model_name} to {output_dir}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    sample = tokenizer(["A short sample sentence for tracing.", "Another one."], return_tensors="pt", padding=True)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__(); self.inner = inner
+        def forward(self, *inputs):
+            return self.inner(**dict(zip(input_names, inputs))).logits
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {} # TorchScript exporter
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}; dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(LogitsOnly(model).eval(), tuple(sample[name] for name in input_names), fp32_path, input_names=input_names,
+                          output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=opset, **export_kwargs)
+    tokenizer.save_pretrained(output_dir); model.config.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "labels.json"), 'w', encoding='utf-8') as f:
+        json.dump([model.config.id2label[i] for i in range(model.config.num_labels)], f)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, os.path.join(output_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    check_export(model, tokenizer, output_dir, quantize)
+    return output_dir
+
+
+def check_export(model, tokenizer, output_dir, quantized):
+    """Compares ONNX outputs with PyTorch on a few sentences and prints the largest probability difference."""
+    import torch
+    from pipeline.backends import OnnxClassifier
+    texts = ["The new policy was widely praised by economists.", "Critics slammed the reckless and corrupt plan.", "The meeting is on Tuesday."]
+    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+    with torch.no_grad(): reference = torch.softmax(model(**inputs).logits, dim=-1).tolist()
+    for variant in ([False, True] if quantized else [False]):
+        rows = OnnxClassifier(output_dir, quantized=variant).classify_batch(texts)
+        diff = max(abs(item["score"] - p) for row, ref in zip(rows, reference) for item, p in zip(row, ref))
+        size_mb = os.path.getsize(os.path.join(output_dir, "model.int8.onnx" if variant else "model.onnx")) / 1e6
+        print(f"    {'int8' if variant else 'fp32'}: {size_mb:.1f} MB, max |p_onnx - p_torch| = {diff:.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the sentiment/bias classifiers to ONNX with dynamic int8 quantization.")
+    parser.add_argument("--model", action="append", help=f"Model name or path (repeatable, default: {' '.join(DEFAULT_MODELS)})")
+    parser.add_argument("--output", default=os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR))
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+    for name in args.model or DEFAULT_MODELS:
+        export_classifier(name, args.output, opset=args.opset, quantize=not args.no_quantize)
@@ -0,0 +1,246 @@
+import os
+import json
+import copy
+import math
+import time
+import random
+import hashlib
+import threading
+
+# ----------------------------------------------------------------------------
+# UPSTREAM RECORD / REPLAY
+# ----------------------------------------------------------------------------
+# In "record" mode every wrapped upstream call runs for real and its response
+# and latency are appended to <directory>/<upstream>.jsonl. In "replay" mode the
+# recorded response is returned instead, after sleeping for a latency drawn
+# from a LatencyModel, and errors can be injected at a given rate. A drawn
+# latency longer than the call's own timeout ends in the upstream's timeout
+# error after that timeout, like the real client would. Draws are
+# seeded per (upstream, key, n-th call of that key), so a replay is
+# reproducible regardless of thread scheduling.
+#
+# Fixture line: {"key": ..., "group": ..., "response": ..., "latency": seconds}
+#           or  {"key": ..., "group": ..., "exception": "message", "latency": seconds}
+# A key function may return (group, key): unrecorded keys then fall back only
+# to responses of the same group (e.g. the same model URL or prompt template).
+
+MODES = ("off", "record", "replay")
+
+
+def fixture_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:24]
+
+
+def parse_upstream_settings(spec, convert=str):
+    """
+    Parses "llm=lognormal:1.5,0.6; hf=fixed:0.2" into {"llm": ..., "hf": ...}
+    (values passed through `convert`); an entry without "name=" applies to all ("*").
+    """
+    settings = {}
+    for entry in (spec or "").split(';'):
+        if not entry.strip(): continue
+        name, sep, value = entry.partition('=')
+        if not sep: name, value = "*", entry
+        settings[name.strip()] = convert(value.strip())
+    return settings
+
+
+class LatencyModel:
+    """
+    How long a replayed call takes:
+      recorded          the recorded latency (default)
+      recorded*F        the recorded latency scaled by F
+      none              no delay
+      fixed:S           always S seconds
+      uniform:A,B       uniform between A and B seconds
+      lognormal:M,S     log-normal with median M seconds and shape S (heavy tail)
+    """
+
+    def __init__(self, spec="recorded"):
+        self.spec = spec.strip().lower()
+        name, _, args = self.spec.partition(':')
+        self.scale = 1.0
+        if name.startswith('recorded*'): self.scale = float(name.split('*', 1)[1]); name = 'recorded'
+        self.name = name
+        self.args = [float(a) for a in args.split(',')] if args else []
+        expected = {"recorded": 0, "none": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+        if name not in expected or len(self.args) != expected[name]: raise ValueError(f"Invalid latency model '{spec}' (see LatencyModel)")
+
+    def sample(self, recorded, rng):
+        if self.name == "recorded": return max(0.0, recorded * self.scale)
+        if self.name == "none": return 0.0
+        if self.name == "fixed": return self.args[0]
+        if self.name == "uniform": return rng.uniform(*self.args)
+        return rng.lognormvariate(math.log(self.args[0]), self.args[1])
+
+
+class UpstreamReplay:
+    """
+    Record/replay for upstream calls. `latency` and `error_rates` map an
+    upstream name (or "*" for all) to a LatencyModel and an error probability.
+    Replaying a key that was never recorded falls back to a recorded response
+    of the same upstream and group chosen by the key's hash, unless `strict`.
+    """
+
+    def __init__(self, directory, mode="replay", latency=None, error_rates=None, strict=False, seed=0):
+        if mode not in MODES: raise ValueError(f"Invalid replay mode '{mode}', expected one of {MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.latency = {name: model if isinstance(model, LatencyModel) else LatencyModel(model) for name, model in (latency or {}).items()}
+        self.error_rates = dict(error_rates or {})
+        self.strict = strict
+        self.seed = seed
+        self._fixtures = {} # upstream -> {key: record}
+        self._fallback_keys = {} # upstream -> {group: sorted keys with a response}
+        self._occurrences = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        if mode == "record": os.makedirs(directory, exist_ok=True)
+        if mode == "replay": self._load()
+
+    def _load(self):
+        if not os.path.isdir(self.directory): raise FileNotFoundError(f"Replay fixture directory {self.directory} not found; record fixtures first")
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.jsonl'): continue
+            upstream = name[:-len('.jsonl')]; records = {}
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except json.JSONDecodeError: continue # Tolerate a line cut off while recording
+                    records[record["key"]] = record
+            self._fixtures[upstream] = records; groups = {}
+            for key, record in sorted(records.items()):
+                if "response" in record: groups.setdefault(record.get("group", ""), []).append(key)
+            self._fallback_keys[upstream] = groups
+            print(f"[+] Loaded {len(records)} {upstream} fixture(s) from {self.directory}")
+
+    def _count(self, upstream, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(upstream, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def stats(self):
+        with self._lock: return {"mode": self.mode, **{upstream: dict(counts) for upstream, counts in self._stats.items()}}
+
+    @staticmethod
+    def _split_key(key):
+        return key if isinstance(key, tuple) else ("", key)
+
+    def _record(self, upstream, key, latency, response=None, exception=None):
+        group, key = self._split_key(key)
+        record = {"key": key, "group": group, "latency": round(latency, 4)}
+        if exception is not None: record["exception"] = str(exception)
+        else: record["response"] = response
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(os.path.join(self.directory, f"{upstream}.jsonl"), 'a', encoding='utf-8') as f: f.write(line)
+        self._count(upstream, "recorded")
+
+    def _lookup(self, upstream, key):
+        """The fixture for `key` (or a fallback), or None."""
+        group, key = self._split_key(key)
+        records = self._fixtures.get(upstream, {})
+        if key in records: self._count(upstream, "hit"); return records[key]
+        fallback = self._fallback_keys.get(upstream, {}).get(group)
+        if self.strict or not fallback: self._count(upstream, "missing"); return None
+        self._count(upstream, "fallback")
+        return records[fallback[int(key, 16) % len(fallback)]] # Keys are fixture_key() hex digests
+
+    def _rng(self, upstream, key):
+        with self._lock:
+            n = self._occurrences[(upstream, key)] = self._occurrences.get((upstream, key), 0) + 1
+        return random.Random(f"{self.seed}:{upstream}:{key}:{n}")
+
+    def _delay_and_fault(self, upstream, calls, timeout=None):
+        """
+        Sleeps for the modelled latency of `calls` ([(key, recorded_latency)],
+        several for one batched request: the slowest item counts), but at most
+        `timeout` seconds. Returns "timeout" if the latency exceeded it, "error"
+        if an error should be injected, else None.
+        """
+        rngs = [self._rng(upstream, key) for key, _ in calls]
+        model = self.latency.get(upstream) or self.latency.get("*") or LatencyModel()
+        delay = max(model.sample(latency, rng) for (_, latency), rng in zip(calls, rngs))
+        rate = self.error_rates.get(upstream, self.error_rates.get("*", 0.0))
+        inject = any(rng.random() < rate for rng in rngs) # Drawn before sleeping so the sequence does not depend on timeouts
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout); self._count(upstream, "timeout"); return "timeout"
+        if delay > 0: time.sleep(delay)
+        if inject: self._count(upstream, "injected_error"); return "error"
+        return None
+
+    def wrap(self, upstream, fn, key_fn, on_error, encode=None, decode=None, timeout_of=None, on_timeout=None):
+        """
+        Wraps fn for record/replay. `key_fn(*args, **kwargs)` names the call,
+        `on_error(message)` returns (or raises) the upstream's own error result,
+        `encode`/`decode` convert responses to and from JSON-serializable form.
+        `timeout_of(*args, **kwargs)` reads the call's timeout, and `on_timeout(message)`
+        (default on_error) produces the client's timeout error.
+        """
+        if self.mode == "off": return fn
+        encode = encode or (lambda response: response); decode = decode or (lambda stored: stored)
+
+        def recorded(*args, **kwargs):
+            key = key_fn(*args, **kwargs); start = time.perf_counter()
+            try: response = fn(*args, **kwargs)
+            except Exception as e: self._record(upstream, key, time.perf_counter() - start, exception=e); raise
+            self._record(upstream, key, time.perf_counter() - start, response=encode(response))
+            return response
+
+        def replayed(*args, **kwargs):
+            key = key_fn(*args, **kwargs)
+            record = self._lookup(upstream, key)
+            if record is None: return on_error(f"No recorded {upstream} response (replay)")
+            timeout = timeout_of(*args, **kwargs) if timeout_of else None
+            fault = self._delay_and_fault(upstream, [(key, record.get("latency", 0.0))], timeout)
+            if fault == "timeout": return (on_timeout or on_error)(f"{upstream} call timed out after {timeout:.1f} seconds (replay)")
+            if fault: return on_error(f"Injected {upstream} error (replay)")
+            if "exception" in record: return on_error(f"{record['exception']} (replayed)")
+            return decode(copy.deepcopy(record["response"]))
+
+        return recorded if self.mode == "record" else replayed
+
+    def wrap_batched(self, upstream, fn, key_fn, on_error, is_error=lambda response: isinstance(response, dict) and "error" in response,
+                     timeout_of=None, on_timeout=None):
+        """
+        Like wrap() for fn(*args, inputs) whose last argument is one input or a
+        list, with one result per list item; `key_fn(*args, item)` names an item.
+        Items are recorded separately, so a replay does not depend on how
+        micro-batching grouped them. Recorded error results and exceptions are
+        replayed through on_error.
+        """
+        if self.mode == "off": return fn
+
+        def recorded(*args):
+            *leading, inputs = args
+            items = inputs if isinstance(inputs, list) else [inputs]
+            start = time.perf_counter()
+            try: response = fn(*args)
+            except Exception as e:
+                for item in items: self._record(upstream, key_fn(*leading, item), time.perf_counter() - start, exception=e)
+                raise
+            latency = time.perf_counter() - start
+            for i, item in enumerate(items):
+                if is_error(response): item_response = response
+                elif isinstance(inputs, list): item_response = [response[i]] if isinstance(response, list) and i < len(response) else {"error": "Missing batch item"}
+                else: item_response = response
+                self._record(upstream, key_fn(*leading, item), latency, response=item_response)
+            return response
+
+        def replayed(*args):
+            *leading, inputs = args
+            items = inputs if isinstance(inputs, list) else [inputs]
+            keys = [key_fn(*leading, item) for item in items]
+            records = [self._lookup(upstream, key) for key in keys]
+            if any(record is None for record in records): return on_error(f"No recorded {upstream} response (replay)")
+            timeout = timeout_of(*args) if timeout_of else None
+            fault = self._delay_and_fault(upstream, [(key, record.get("latency", 0.0)) for key, record in zip(keys, records)], timeout)
+            if fault == "timeout": return (on_timeout or on_error)(f"{upstream} call timed out after {timeout:.1f} seconds (replay)")
+            if fault: return on_error(f"Injected {upstream} error (replay)")
+            for record in records:
+                if "exception" in record: return on_error(f"{record['exception']} (replayed)")
+                if is_error(record["response"]): return on_error(f"{record['response']['error']} (replayed)")
+            responses = [copy.deepcopy(record["response"]) for record in records]
+            return [response[0] for response in responses] if isinstance(inputs, list) else responses[0]
+
+        return recorded if self.mode == "record" else replayed
@@ -0,0 +1,164 @@
+import time
+import threading
+from collections import deque
+
+# ----------------------------------------------------------------------------
+# CIRCUIT BREAKER
+# ----------------------------------------------------------------------------
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker over a rolling time window.
+
+    closed    -> calls pass; each outcome and latency is recorded. Once the
+                 window holds `min_calls` calls and the error rate (or the
+                 share of calls slower than `slow_call_seconds`) reaches its
+                 threshold, the circuit opens.
+    open      -> calls are rejected immediately for `open_seconds`.
+    half-open -> up to `half_open_max_calls` probe calls pass; a success
+                 closes the circuit, a failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, window_seconds=60, min_calls=5, error_rate_threshold=0.5,
+                 slow_call_seconds=20, slow_rate_threshold=0.8, open_seconds=30, half_open_max_calls=1):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, min_calls)
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._calls = deque() # (finished_at, ok, latency)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0][0] > self.window_seconds: self._calls.popleft()
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN; self._probes = 0
+        return self._state
+
+    def _trip(self, now, reason):
+        self._state = self.OPEN; self._opened_at = now; self._probes = 0
+        print(f"Circuit for {self.name} OPEN ({reason}); failing fast for {self.open_seconds:.0f} seconds.")
+
+    @property
+    def state(self):
+        with self._lock: return self._current_state(time.time())
+
+    def is_open(self):
+        """True while calls would be rejected (does not use up a half-open probe)."""
+        return self.state == self.OPEN
+
+    def allow(self):
+        """Returns True if a call may proceed now; counts half-open probes."""
+        with self._lock:
+            state = self._current_state(time.time())
+            if state == self.CLOSED: return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1; return True
+            self._rejected += 1
+            return False
+
+    def record(self, ok, latency):
+        """Records the outcome of one call that allow() let through."""
+        now = time.time()
+        slow = self.slow_call_seconds and latency >= self.slow_call_seconds
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                if ok and not slow:
+                    self._state = self.CLOSED; self._calls.clear()
+                    print(f"Circuit for {self.name} CLOSED (probe succeeded in {latency:.2f} seconds).")
+                else: self._trip(now, "probe failed" if not ok else f"probe took {latency:.1f} seconds")
+                return
+            self._calls.append((now, ok, latency)); self._prune(now)
+            if state != self.CLOSED or len(self._calls) < self.min_calls: return
+            error_rate = sum(1 for _, call_ok, _ in self._calls if not call_ok) / len(self._calls)
+            slow_rate = sum(1 for _, _, call_latency in self._calls if self.slow_call_seconds and call_latency >= self.slow_call_seconds) / len(self._calls)
+            if error_rate >= self.error_rate_threshold: self._trip(now, f"error rate {error_rate:.0%} over {len(self._calls)} calls")
+            elif slow_rate >= self.slow_rate_threshold: self._trip(now, f"{slow_rate:.0%} of calls slower than {self.slow_call_seconds:.0f} seconds")
+
+    def call(self, func, *args, **kwargs):
+        """Runs func through the breaker; exceptions count as failures and are re-raised."""
+        if not self.allow(): raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open).")
+        start = time.time()
+        try: result = func(*args, **kwargs)
+        except Exception: self.record(False, time.time() - start); raise
+        self.record(True, time.time() - start)
+        return result
+
+    def latency_percentile(self, q=0.95):
+        """Latency percentile of successful calls in the window, or None with fewer than `min_calls` samples."""
+        with self._lock:
+            self._prune(time.time())
+            latencies = sorted(latency for _, ok, latency in self._calls if ok)
+        if len(latencies) < self.min_calls: return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    def stats(self):
+        with self._lock:
+            now = time.time(); state = self._current_state(now); self._prune(now)
+            calls = list(self._calls)
+            latencies = sorted(latency for _, _, latency in calls)
+            return {
+                "state": state, "window_calls": len(calls),
+                "error_rate": round(sum(1 for _, ok, _ in calls if not ok) / len(calls), 3) if calls else 0.0,
+                "p95_latency": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+                "rejected": self._rejected,
+                "reopens_in": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == self.OPEN else 0.0,
+            }
+
+
+# ----------------------------------------------------------------------------
+# RETRY BUDGET
+# ----------------------------------------------------------------------------
+class RetryBudget:
+    """
+    Process-wide cap on retries: within a rolling window, retries may make up
+    at most `ratio` of first attempts, plus `min_retries` to keep low traffic
+    working. When upstreams fail broadly, requests stop retrying instead of
+    multiplying the load.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=10, window_seconds=60):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+        self._denied = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window_seconds: events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.time(); self._requests.append(now); self._prune(now)
+
+    def try_retry(self):
+        """Withdraws one retry from the budget; False if it is exhausted."""
+        with self._lock:
+            now = time.time(); self._prune(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self._denied += 1; return False
+            self._retries.append(now); return True
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.time())
+            return {"requests": len(self._requests), "retries": len(self._retries), "denied": self._denied,
+                    "available": max(0, int(self.min_retries + self.ratio * len(self._requests)) - len(self._retries))}
@@ -0,0 +1,89 @@
+import copy
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from pipeline.deadline import remaining_time
+
+# ----------------------------------------------------------------------------
+# SINGLE-FLIGHT REQUEST COALESCING
+# ----------------------------------------------------------------------------
+class _Flight:
+    """One in-flight computation: its future plus the events emitted so far."""
+
+    def __init__(self):
+        self.future = Future()
+        self.events = []
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, on_event):
+        with self.lock:
+            for stage, data in self.events: on_event(stage, copy.deepcopy(data)) # Late joiners first get a replay
+            self.subscribers.append(on_event)
+
+    def unsubscribe(self, on_event):
+        with self.lock:
+            if on_event in self.subscribers: self.subscribers.remove(on_event)
+
+    def emit(self, stage, data):
+        with self.lock:
+            self.events.append((stage, data))
+            for on_event in self.subscribers:
+                try: on_event(stage, data if on_event is self.subscribers[0] else copy.deepcopy(data))
+                except Exception as e: print(f"Warning: Event subscriber failed on {stage}: {e}")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation.
+
+    The first caller (the leader) runs the function; callers arriving while it
+    is in flight wait for it and receive a deep copy of its result (or its
+    exception). Nothing is kept once the call completes - results that should
+    outlive the flight belong in a cache. A follower waits no longer than its
+    own active deadline; if the flight has not finished by then it makes the
+    call itself, under whatever budget it has left.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0, "timeouts": 0}
+
+    def do(self, key, fn):
+        """Returns fn(), sharing one call among concurrent callers with the same key."""
+        return self.do_with_events(key, lambda emit: fn())
+
+    def do_with_events(self, key, fn, on_event=None):
+        """
+        Like do(), for functions that report progress: fn(emit) calls
+        emit(stage, data), and every caller's `on_event` receives those events
+        (followers joining late get the earlier ones replayed first).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader: flight = self._flights[key] = _Flight()
+            self._stats["leaders" if is_leader else "followers"] += 1
+        if on_event is not None: flight.subscribe(on_event)
+        if not is_leader:
+            print(f"Coalesced {self.name} request ({str(key)[:12]}) onto an in-flight call.")
+            try: return copy.deepcopy(flight.future.result(timeout=remaining_time()))
+            except FutureTimeoutError:
+                if on_event is not None: flight.unsubscribe(on_event)
+                with self._lock: self._stats["timeouts"] += 1
+                print(f"Warning: In-flight {self.name} call ({str(key)[:12]}) outlasted this request's deadline, running it separately.")
+                return fn(on_event or (lambda stage, data: None))
+        try:
+            result = fn(flight.emit)
+            flight.future.set_result(copy.deepcopy(result)) # Followers must not see the leader's later mutations
+            return result
+        except BaseException as e:
+            flight.future.set_exception(e); raise
+        finally:
+            with self._lock: self._flights.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
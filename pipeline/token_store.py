@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import hashlib
+
+# ----------------------------------------------------------------------------
+# TOKENIZATION PRECOMPUTE STORE (memory-mapped .npy)
+# ----------------------------------------------------------------------------
+# A dataset is tokenized once per tokenizer and saved as
+#   <root>/<tokenizer-slug>/<key>/{input_ids,attention_mask,lengths,positions}.npy + meta.json
+# where <key> covers the tokenizer name and version, max_length and the dataset
+# contents. Arrays are opened with mmap_mode='r', so later runs (and every
+# evaluation worker process) share the pages instead of re-tokenizing.
+# ids/mask rows are stored sorted by length (stable, like length_bucketed_batches),
+# so a length bucket is a contiguous slice of the map; `positions` maps a
+# dataset index to its row and `lengths` stays in dataset order.
+# numpy is only needed by the evaluation tooling that uses this module.
+
+DEFAULT_TOKEN_STORE = os.path.join('cache', 'tokens')
+STORE_LAYOUT = 2 # Part of the store key; bump when the array layout changes
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Identifies a tokenizer by name, library version and vocabulary/config contents."""
+    import transformers
+    digest = hashlib.sha256()
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None: digest.update(backend.to_str().encode('utf-8')) # Fast tokenizers: full serialized pipeline
+    else: digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode('utf-8'))
+    digest.update(json.dumps(getattr(tokenizer, 'init_kwargs', {}), sort_keys=True, default=str).encode('utf-8'))
+    return {"name": tokenizer.name_or_path, "transformers": transformers.__version__, "vocab_sha256": digest.hexdigest()[:16]}
+
+
+class TokenizedDataset:
+    """Memory-mapped token arrays for one dataset: ids/mask are [rows, width] in length order, lengths and positions are [rows]."""
+
+    def __init__(self, directory):
+        import numpy as np
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f: self.meta = json.load(f)
+        self.input_ids = np.load(os.path.join(directory, 'input_ids.npy'), mmap_mode='r')
+        self.attention_mask = np.load(os.path.join(directory, 'attention_mask.npy'), mmap_mode='r')
+        self.lengths = np.load(os.path.join(directory, 'lengths.npy'), mmap_mode='r')
+        self.positions = np.load(os.path.join(directory, 'positions.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def batch(self, indices):
+        """
+        (input_ids, attention_mask) for dataset `indices`, trimmed to the longest row in the batch.
+        A full length bucket is a slice view of the map; other index sets (e.g. a bucket with
+        rows already checkpointed) are gathered into a copy.
+        """
+        if not len(indices): return self.input_ids[:0, :0], self.attention_mask[:0, :0]
+        rows = [int(self.positions[i]) for i in indices]
+        width = int(max(self.lengths[i] for i in indices))
+        if rows == list(range(rows[0], rows[0] + len(rows))):
+            return self.input_ids[rows[0]:rows[-1] + 1, :width], self.attention_mask[rows[0]:rows[-1] + 1, :width]
+        return self.input_ids[rows, :width], self.attention_mask[rows, :width]
+
+
+class TokenStore:
+    """Finds or builds TokenizedDataset directories under `root`."""
+
+    def __init__(self, root=DEFAULT_TOKEN_STORE):
+        self.root = root
+
+    def _directory(self, fingerprint, max_length, dataset_key):
+        key = hashlib.sha256(json.dumps([fingerprint, max_length, dataset_key, STORE_LAYOUT], sort_keys=True).encode('utf-8')).hexdigest()[:20]
+        slug = fingerprint["name"].strip('/').replace('/', '__').replace(os.sep, '__')
+        return os.path.join(self.root, slug, key)
+
+    def load(self, tokenizer, max_length, dataset_key):
+        """The stored arrays for this tokenizer/dataset, or None if not precomputed yet."""
+        directory = self._directory(tokenizer_fingerprint(tokenizer), max_length, dataset_key)
+        if not os.path.exists(os.path.join(directory, 'meta.json')): return None
+        try: return TokenizedDataset(directory)
+        except (OSError, ValueError) as e: print(f"Warning: Ignoring unreadable token store {directory}: {e}"); return None
+
+    def precompute(self, tokenizer, texts, max_length, dataset_key, batch_size=1024):
+        """Tokenizes `texts` once and writes the arrays; returns the memory-mapped TokenizedDataset."""
+        import numpy as np
+        fingerprint = tokenizer_fingerprint(tokenizer)
+        directory = self._directory(fingerprint, max_length, dataset_key)
+        encoded = []
+        for start in range(0, len(texts), batch_size):
+            encoded.extend(tokenizer(list(texts[start:start + batch_size]), truncation=True, max_length=max_length)["input_ids"])
+        lengths = np.array([len(ids) for ids in encoded], dtype=np.int32)
+        width = int(lengths.max()) if len(lengths) else 0
+        order = np.argsort(lengths, kind='stable') # Same order as length_bucketed_batches, so buckets are contiguous rows
+        positions = np.empty(len(encoded), dtype=np.int64); positions[order] = np.arange(len(encoded))
+        input_ids = np.full((len(encoded), width), tokenizer.pad_token_id or 0, dtype=np.int32)
+        attention_mask = np.zeros((len(encoded), width), dtype=np.int8)
+        for row, index in enumerate(order):
+            ids = encoded[index]; input_ids[row, :len(ids)] = ids; attention_mask[row, :len(ids)] = 1
+
+        tmp_directory = directory + '.tmp'
+        if os.path.exists(tmp_directory): shutil.rmtree(tmp_directory)
+        os.makedirs(tmp_directory)
+        np.save(os.path.join(tmp_directory, 'input_ids.npy'), input_ids)
+        np.save(os.path.join(tmp_directory, 'attention_mask.npy'), attention_mask)
+        np.save(os.path.join(tmp_directory, 'lengths.npy'), lengths)
+        np.save(os.path.join(tmp_directory, 'positions.npy'), positions)
+        with open(os.path.join(tmp_directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({"tokenizer": fingerprint, "max_length": max_length, "dataset": dataset_key, "rows": len(encoded), "width": width}, f, indent=2)
+        if os.path.exists(directory): shutil.rmtree(directory)
+        os.replace(tmp_directory, directory) # Readers never see a half-written store
+        print(f"[+] Stored {len(encoded)} tokenized rows ({input_ids.nbytes / 1e6:.1f} MB ids) in {directory}")
+        return TokenizedDataset(directory)
+
+    def load_or_precompute(self, tokenizer, texts, max_length, dataset_key):
+        stored = self.load(tokenizer, max_length, dataset_key)
+        if stored is not None and len(stored) == len(texts):
+            print(f"[+] Using precomputed tokens from {stored.directory}")
+            return stored
+        return self.precompute(tokenizer, texts, max_length, dataset_key)
+
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import traceback
+
+from pipeline.cache import normalize_text
+
+# ----------------------------------------------------------------------------
+# TOPIC WATCHES (scheduled, incremental topic analysis)
+# ----------------------------------------------------------------------------
+# A watched topic is re-searched every `interval_seconds`. Each watch keeps an
+# index of the articles it has seen (normalized URL -> content fingerprint and
+# per-article analysis), so a refresh only scrapes URLs that are new or due
+# for a recheck, only classifies articles whose content changed, and updates
+# the topic aggregate by adding/removing those articles' contributions.
+
+BIAS_LABELS = ('Left', 'Center', 'Right')
+
+
+def content_fingerprint(text):
+    """Hash of an article's text that ignores whitespace-only differences."""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def is_valid_article(article):
+    """Same rule as the topic aggregation in app.py: both classifiers produced a result."""
+    return article.get('sentiment_binary') is not None and 'error' not in str(article.get('bias_label', 'Error')).lower()
+
+
+class TopicAggregate:
+    """
+    Running counts behind a topic's overall sentiment, bias and credibility.
+    add()/remove() apply one article's contribution, so replacing a changed
+    article costs O(1) instead of re-aggregating every article. Articles marked
+    "duplicate_of" another are not counted. Serializable via to_dict()/from_dict()
+    for storage next to the watch.
+    """
+
+    def __init__(self, valid=0, positive=0, bias_score_sum=0.0, labels=None, credibility=None):
+        self.valid = valid
+        self.positive = positive
+        self.bias_score_sum = bias_score_sum
+        self.labels = dict(labels or {}) # bias label -> [count, score_sum] (insertion order breaks ties, like statistics.mode)
+        self.credibility = dict(credibility or {}) # credibility level -> count, over all articles
+
+    def _apply(self, article, credibility_level, sign):
+        if article.get('duplicate_of'): return # Near-duplicate copies count once, through their representative
+        if credibility_level: self.credibility[credibility_level] = self.credibility.get(credibility_level, 0) + sign
+        if self.credibility.get(credibility_level) == 0: del self.credibility[credibility_level]
+        if not is_valid_article(article): return
+        score = article.get('bias_score', 0) or 0; label = article.get('bias_label', 'N/A')
+        self.valid += sign; self.positive += sign * (article.get('sentiment_binary') == 1); self.bias_score_sum += sign * score
+        count, total = self.labels.get(label, [0, 0.0])
+        if count + sign <= 0: self.labels.pop(label, None)
+        else: self.labels[label] = [count + sign, total + sign * score]
+
+    def add(self, article, credibility_level=None): self._apply(article, credibility_level, 1)
+    def remove(self, article, credibility_level=None): self._apply(article, credibility_level, -1)
+
+    def sentiment(self):
+        """(label, value) as in the /analyze result, or ("Error", 0) without valid articles."""
+        if not self.valid: return "Error", 0
+        return ("Positive", 100) if self.positive / self.valid >= 0.5 else ("Negative", 0)
+
+    def bias(self):
+        """(most frequent label, mean bias score)."""
+        if not self.valid: return 'N/A', 0
+        label = max(self.labels, key=lambda name: self.labels[name][0]) # First-inserted wins ties
+        return label, int(round(self.bias_score_sum / self.valid, 6))
+
+    def credibility_level(self):
+        return max(self.credibility, key=self.credibility.get) if self.credibility else "Medium"
+
+    def sentiment_distribution(self):
+        if not self.valid: return {"Positive": 0, "Negative": 0, "Neutral": 0}
+        return {"Positive": int(self.positive / self.valid * 100), "Negative": int((self.valid - self.positive) / self.valid * 100), "Neutral": 0}
+
+    def bias_distribution(self):
+        """Mean bias score per label."""
+        return {label: int(round(self.labels[label][1] / self.labels[label][0], 6)) if label in self.labels else 0 for label in BIAS_LABELS}
+
+    def to_dict(self):
+        return {"valid": self.valid, "positive": self.positive, "bias_score_sum": self.bias_score_sum, "labels": self.labels, "credibility": self.credibility}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**(data or {}))
+
+
+class TopicWatchStore:
+    """
+    Watched topics and their seen-article index in SQLite (WAL mode).
+
+    watches:        one row per topic, with its schedule, the serialized
+                    TopicAggregate, the latest result and refresh status.
+    watch_articles: (watch_id, normalized URL) -> content fingerprint, the
+                    article's analysis and when it was first/last seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory): os.makedirs(directory)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""CREATE TABLE IF NOT EXISTS watches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, topic_key TEXT NOT NULL UNIQUE,
+            interval_seconds REAL NOT NULL, created_at REAL NOT NULL, next_run_at REAL NOT NULL,
+            last_run_at REAL, status TEXT, aggregate TEXT, results TEXT)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_watches_next_run ON watches(next_run_at)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS watch_articles (
+            watch_id INTEGER NOT NULL, url_key TEXT NOT NULL, url TEXT NOT NULL, content_hash TEXT,
+            analysis TEXT NOT NULL, first_seen REAL NOT NULL, last_seen REAL NOT NULL,
+            checked_at REAL NOT NULL, changed_at REAL NOT NULL, PRIMARY KEY (watch_id, url_key))""")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None) # Autocommit; multi-statement steps use BEGIN IMMEDIATE
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try: result = fn(conn)
+        except BaseException: conn.execute("ROLLBACK"); raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def topic_key(topic):
+        return " ".join(topic.lower().split())
+
+    @staticmethod
+    def _row_to_watch(row, with_results=False):
+        watch_id, topic, interval_seconds, created_at, next_run_at, last_run_at, status, aggregate, results = row
+        watch = {"id": watch_id, "topic": topic, "interval_seconds": interval_seconds, "created_at": created_at,
+                 "next_run_at": next_run_at, "last_run_at": last_run_at, "status": json.loads(status) if status else None,
+                 "aggregate": json.loads(aggregate) if aggregate else None}
+        if with_results: watch["results"] = json.loads(results) if results else None
+        return watch
+
+    _WATCH_COLUMNS = "id, topic, interval_seconds, created_at, next_run_at, last_run_at, status, aggregate, results"
+
+    def add(self, topic, interval_seconds):
+        """Registers a topic (due immediately). Returns (watch, created); an existing watch of the same topic gets the new interval."""
+        key = self.topic_key(topic); now = time.time()
+        def upsert(conn):
+            row = conn.execute("SELECT id FROM watches WHERE topic_key = ?", (key,)).fetchone()
+            if row: conn.execute("UPDATE watches SET interval_seconds = ? WHERE id = ?", (interval_seconds, row[0])); return row[0], False
+            cursor = conn.execute("INSERT INTO watches (topic, topic_key, interval_seconds, created_at, next_run_at) VALUES (?, ?, ?, ?, ?)",
+                                  (topic.strip(), key, interval_seconds, now, now))
+            return cursor.lastrowid, True
+        watch_id, created = self._transaction(upsert)
+        return self.get(watch_id), created
+
+    def get(self, watch_id, with_results=False):
+        row = self._connect().execute(f"SELECT {self._WATCH_COLUMNS} FROM watches WHERE id = ?", (watch_id,)).fetchone()
+        return self._row_to_watch(row, with_results) if row else None
+
+    def list(self):
+        return [self._row_to_watch(row) for row in self._connect().execute(f"SELECT {self._WATCH_COLUMNS} FROM watches ORDER BY id")]
+
+    def delete(self, watch_id):
+        """Removes a watch and its article index; returns True if it existed."""
+        def delete(conn):
+            conn.execute("DELETE FROM watch_articles WHERE watch_id = ?", (watch_id,))
+            return conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,)).rowcount > 0
+        return self._transaction(delete)
+
+    def due(self, now=None):
+        """Ids of watches whose next run is due, most overdue first."""
+        rows = self._connect().execute("SELECT id FROM watches WHERE next_run_at <= ? ORDER BY next_run_at", (now or time.time(),))
+        return [row[0] for row in rows]
+
+    def claim(self, watch_id, lease_seconds):
+        """
+        Takes a due watch for one refresh by moving its next run `lease_seconds` ahead
+        (the refresh then sets the real next run). Returns the watch, or None if it was
+        deleted or is no longer due (another process claimed it).
+        """
+        def claim(conn):
+            now = time.time()
+            if not conn.execute("UPDATE watches SET next_run_at = ? WHERE id = ? AND next_run_at <= ?", (now + lease_seconds, watch_id, now)).rowcount: return None
+            return conn.execute(f"SELECT {self._WATCH_COLUMNS} FROM watches WHERE id = ?", (watch_id,)).fetchone()
+        row = self._transaction(claim)
+        return self._row_to_watch(row) if row else None
+
+    def schedule(self, watch_id, next_run_at):
+        return self._connect().execute("UPDATE watches SET next_run_at = ? WHERE id = ?", (next_run_at, watch_id)).rowcount > 0
+
+    def articles(self, watch_id):
+        """{url_key: article row} for every indexed article of the watch, oldest first."""
+        rows = self._connect().execute(
+            "SELECT url_key, url, content_hash, analysis, first_seen, last_seen, checked_at, changed_at FROM watch_articles "
+            "WHERE watch_id = ? ORDER BY first_seen, url_key", (watch_id,))
+        return {url_key: {"url_key": url_key, "url": url, "content_hash": content_hash, "analysis": json.loads(analysis), "first_seen": first_seen,
+                          "last_seen": last_seen, "checked_at": checked_at, "changed_at": changed_at}
+                for url_key, url, content_hash, analysis, first_seen, last_seen, checked_at, changed_at in rows}
+
+    def save_refresh(self, watch_id, upserts, seen, checked, evicted, aggregate, results, status, next_run_at):
+        """
+        Applies one refresh atomically: `upserts` are article rows (new or
+        re-analyzed), `seen`/`checked` are url_keys found in the search results
+        / re-scraped without changes, `evicted` url_keys leave the index.
+        `results` None keeps the stored result.
+        """
+        now = time.time()
+        def apply(conn):
+            for article in upserts:
+                conn.execute(
+                    "INSERT INTO watch_articles (watch_id, url_key, url, content_hash, analysis, first_seen, last_seen, checked_at, changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(watch_id, url_key) DO UPDATE SET url = excluded.url, "
+                    "content_hash = excluded.content_hash, analysis = excluded.analysis, last_seen = excluded.last_seen, "
+                    "checked_at = excluded.checked_at, changed_at = excluded.changed_at",
+                    (watch_id, article["url_key"], article["url"], article["content_hash"], json.dumps(article["analysis"]), now, now, now, now))
+            conn.executemany("UPDATE watch_articles SET last_seen = ? WHERE watch_id = ? AND url_key = ?", [(now, watch_id, key) for key in seen])
+            conn.executemany("UPDATE watch_articles SET checked_at = ? WHERE watch_id = ? AND url_key = ?", [(now, watch_id, key) for key in checked])
+            conn.executemany("DELETE FROM watch_articles WHERE watch_id = ? AND url_key = ?", [(watch_id, key) for key in evicted])
+            fields = {"last_run_at": now, "next_run_at": next_run_at, "status": json.dumps(status), "aggregate": json.dumps(aggregate.to_dict())}
+            if results is not None: fields["results"] = json.dumps(results)
+            conn.execute(f"UPDATE watches SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?", (*fields.values(), watch_id))
+        self._transaction(apply)
+
+    def record_failure(self, watch_id, status, next_run_at):
+        self._connect().execute("UPDATE watches SET last_run_at = ?, next_run_at = ?, status = ? WHERE id = ?",
+                                (time.time(), next_run_at, json.dumps(status), watch_id))
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM watches").fetchone()[0]
+
+
+class TopicWatcher:
+    """
+    Scheduler thread: every `poll_interval` seconds (or when woken) it runs
+    `refresh(watch)` for each due watch, one at a time. Each watch is claimed
+    first, so processes sharing the database never refresh it concurrently; a
+    claim not followed by a result (the process died) lapses after
+    `lease_seconds`. refresh() reschedules the watch itself; if it raises, the
+    watch is retried after its interval.
+    """
+
+    def __init__(self, store, refresh, poll_interval=30, lease_seconds=900):
+        self.store = store
+        self.refresh = refresh
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Starts the scheduler thread (idempotent)."""
+        if self._thread: return
+        self._thread = threading.Thread(target=self._loop, name="topic-watcher", daemon=True)
+        self._thread.start()
+        print(f"Topic watcher started ({self.store.count()} watch(es), polling every {self.poll_interval:.0f} seconds).")
+
+    def wake(self):
+        with self._wakeup: self._wakeup.notify()
+
+    def _loop(self):
+        while True:
+            try: due = self.store.due()
+            except sqlite3.Error as e: print(f"Warning: Could not read topic watches: {e}"); due = []
+            for watch_id in due:
+                try: watch = self.store.claim(watch_id, self.lease_seconds)
+                except sqlite3.Error as e: print(f"Warning: Could not claim topic watch {watch_id}: {e}"); continue
+                if watch is None: continue # Deleted meanwhile or claimed by another process
+                try: self.refresh(watch)
+                except Exception as e:
+                    traceback.print_exc()
+                    self.store.record_failure(watch_id, {"error": f"Unexpected refresh error: {e}"}, time.time() + watch["interval_seconds"])
+            with self._wakeup: self._wakeup.wait(timeout=self.poll_interval)
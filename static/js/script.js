@@ -551,6 +551,101 @@ document.addEventListener("DOMContentLoaded", function () {
     if (summaryTab) activateTab(summaryTab);
   };
 
+  // --- Streaming analysis (/analyze/stream, Server-Sent Events) ---
+  const throwResponseError = (response) =>
+    response
+      .json()
+      .catch(() => {
+        throw new Error(`HTTP error ${response.status}: ${response.statusText}`);
+      })
+      .then((errData) => {
+        throw new Error(errData.error || `HTTP error ${response.status}`);
+      });
+
+  const describeStreamEvent = (stage, data, progress) => {
+    const label = (index) =>
+      progress.total > 1 ? ` for article ${index + 1} of ${progress.total}` : "";
+    if (stage === "scrape") {
+      progress.total = (data.articles || []).length;
+      return progress.total > 1
+        ? `Found ${progress.total} articles. Running sentiment, bias and summary models...`
+        : "Content ready. Running sentiment, bias and summary models...";
+    }
+    if (stage === "sentiment") return `Sentiment ready${label(data.index)}...`;
+    if (stage === "bias") return `Political bias ready${label(data.index)}...`;
+    if (stage === "llm_field" && data.field === "summary")
+      return `Summary ready${label(data.index)}, extracting findings...`;
+    if (stage === "llm") return `Summary and findings ready${label(data.index)}...`;
+    return null;
+  };
+
+  // Falls back to the blocking /analyze endpoint if the stream cannot be read
+  const fetchAnalysis = (payload) =>
+    fetch("/analyze", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "application/json",
+      },
+      body: JSON.stringify(payload),
+    }).then((response) => {
+      if (!response.ok) return throwResponseError(response);
+      const contentType = response.headers.get("content-type");
+      if (contentType && contentType.indexOf("application/json") !== -1) {
+        return response.json();
+      }
+      throw new Error("Received non-JSON response from server.");
+    });
+
+  const streamAnalysis = (payload) =>
+    fetch("/analyze/stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      body: JSON.stringify(payload),
+    }).then((response) => {
+      if (response.status === 404 || !response.body) return fetchAnalysis(payload);
+      if (!response.ok) return throwResponseError(response);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const progress = { total: 0 };
+      let buffer = "";
+      let finalData = null;
+
+      const handleEvent = (rawEvent) => {
+        let stage = "message";
+        let dataText = "";
+        rawEvent.split("\n").forEach((line) => {
+          if (line.startsWith("event:")) stage = line.slice(6).trim();
+          else if (line.startsWith("data:")) dataText += line.slice(5).trim();
+        });
+        if (!dataText) return; // keep-alive comment
+        const data = JSON.parse(dataText);
+        if (stage === "result") finalData = data;
+        else if (stage === "error") throw new Error(data.error || "Analysis failed.");
+        else {
+          const message = describeStreamEvent(stage, data, progress);
+          if (message && loadingMessage) loadingMessage.textContent = message;
+        }
+      };
+
+      const pump = () =>
+        reader.read().then(({ done, value }) => {
+          if (value) buffer += decoder.decode(value, { stream: true });
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            handleEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+          }
+          if (!done) return pump();
+          if (!finalData) throw new Error("Analysis stream ended unexpectedly.");
+          return finalData;
+        });
+      return pump();
+    });
+
   // --- Event Listeners ---
   if (contentInput)
     contentInput.addEventListener("input", () => {
@@ -608,39 +703,12 @@ document.addEventListener("DOMContentLoaded", function () {
       }
       showSection("loading");
       setAnalyzeButtonLoading(true);
-      fetch("/analyze", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Accept: "application/json",
-        },
-        body: JSON.stringify({
-          input_type: currentInputType,
-          input_value: input,
-        }),
-      })
-        .then((response) => {
-          if (!response.ok) {
-            return response
-              .json()
-              .catch(() => {
-                throw new Error(
-                  `HTTP error ${response.status}: ${response.statusText}`,
-                );
-              })
-              .then((errData) => {
-                throw new Error(
-                  errData.error || `HTTP error ${response.status}`,
-                );
-              });
-          }
-          const contentType = response.headers.get("content-type");
-          if (contentType && contentType.indexOf("application/json") !== -1) {
-            return response.json();
-          } else {
-            throw new Error("Received non-JSON response from server.");
-          }
-        })
+      const payload = {
+        input_type: currentInputType,
+        input_value: input,
+      };
+      const defaultLoadingText = loadingMessage ? loadingMessage.textContent : "";
+      streamAnalysis(payload)
         .then((data) => {
           if (data.error) {
             throw new Error(data.error);
@@ -655,6 +723,7 @@ document.addEventListener("DOMContentLoaded", function () {
           showSection("error");
         })
         .finally(() => {
+          if (loadingMessage) loadingMessage.textContent = defaultLoadingText;
           if (loadingState && loadingState.classList.contains("hidden")) {
             setAnalyzeButtonLoading(false);
           }
@@ -0,0 +1,167 @@
+from bs4 import BeautifulSoup
+from functools import lru_cache
+from bs4.dammit import EncodingDetector
+import lxml.html
+from lxml import etree
+
+# Elements that never contain article text (removed before extraction)
+BOILERPLATE_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'aside', 'header', 'form', 'button', 'input', 'select', 'textarea'])
+CONTAINER_TAGS = frozenset(['article', 'main', 'section'])
+DIV_ID_KEYWORDS = ('content', 'article', 'post', 'body')
+DIV_CLASS_KEYWORDS = ('content', 'article', 'post', 'body', 'story', 'main')
+MIN_FALLBACK_PARAGRAPH_CHARS = 50
+
+_utf8_parser = lxml.html.HTMLParser(encoding='utf-8')
+
+
+@lru_cache(maxsize=None)
+def _parser_for(encoding):
+    return lxml.html.HTMLParser(encoding=encoding)
+
+
+def _stripped_len(text):
+    return len(text.strip()) if text else 0
+
+
+def _is_text_element(node):
+    """True for real, non-boilerplate elements (comments and PIs have non-string tags)."""
+    return isinstance(node.tag, str) and node.tag not in BOILERPLATE_TAGS
+
+
+def _stripped_text(element):
+    """Equivalent of BeautifulSoup's get_text(strip=True), skipping boilerplate subtrees."""
+    pieces = []
+    frames = [(element, iter(element))]
+    if element.text and element.text.strip(): pieces.append(element.text.strip())
+    while frames:
+        node, children = frames[-1]
+        child = next(children, None)
+        if child is None:
+            frames.pop()
+            if frames and node.tail and node.tail.strip(): pieces.append(node.tail.strip())
+            continue
+        if _is_text_element(child):
+            if child.text and child.text.strip(): pieces.append(child.text.strip())
+            frames.append((child, iter(child)))
+            continue
+        if child.tail and child.tail.strip(): pieces.append(child.tail.strip())
+    return ''.join(pieces)
+
+
+def _paragraphs(root):
+    """All <p> elements under `root` in document order, skipping boilerplate subtrees."""
+    found = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.tag == 'p' and node is not root: found.append(node)
+        stack.extend(child for child in reversed(node) if _is_text_element(child))
+    return found
+
+
+def _parse(html):
+    """
+    Parses into an lxml tree. Bytes are handled the way BeautifulSoup's lxml
+    builder does: lxml decodes them with each encoding EncodingDetector
+    suggests in turn, and the first one it accepts wins.
+    """
+    if not html.strip(): return None
+    if isinstance(html, str):
+        try: return lxml.html.document_fromstring(html.encode('utf-8'), parser=_utf8_parser)
+        except (etree.ParserError, ValueError): return None
+    detector = EncodingDetector(html, is_html=True)
+    for encoding in detector.encodings:
+        try: return lxml.html.document_fromstring(detector.markup, parser=_parser_for(encoding))
+        except (etree.ParserError, ValueError, LookupError): continue
+    return None
+
+
+def extract_article_text(html, url):
+    """
+    Extracts the main article text from raw HTML in a single bottom-up pass.
+
+    Produces the same output as extract_article_text_soup: boilerplate
+    elements are skipped (not decomposed), the text length of every candidate
+    container is accumulated from its children as the walk unwinds, and only
+    the winning container's paragraphs are turned into text.
+    """
+    root = _parse(html)
+    if root is None: return ''
+
+    containers, id_divs, class_divs = [], [], []
+    # Each frame: [element, child iterator, stripped text length so far, candidate slot or None]
+    frames = [[root, iter(root), _stripped_len(root.text), None]]
+    while frames:
+        frame = frames[-1]
+        child = next(frame[1], None)
+        if child is None:
+            frames.pop()
+            if frame[3] is not None: frame[3][1] = frame[2]
+            if frames: frames[-1][2] += frame[2]
+            continue
+        frame[2] += _stripped_len(child.tail) # Tail text belongs to the parent, even after boilerplate
+        if not _is_text_element(child): continue
+        slot = None
+        if child.tag in CONTAINER_TAGS:
+            slot = [child, 0]; containers.append(slot)
+        elif child.tag == 'div':
+            element_id = child.get('id')
+            if element_id and any(k in element_id for k in DIV_ID_KEYWORDS):
+                slot = [child, 0]; id_divs.append(slot)
+            classes = (child.get('class') or '').split()
+            if any(k in c for c in classes for k in DIV_CLASS_KEYWORDS):
+                slot = slot or [child, 0]; class_divs.append(slot)
+        frames.append([child, iter(child), _stripped_len(child.text), slot])
+
+    candidates = containers or id_divs or class_divs
+    if candidates:
+        # max() keeps the first of equally long containers, matching the original heuristic
+        best_container = max(candidates, key=lambda slot: slot[1])[0]
+        texts = (_stripped_text(p) for p in _paragraphs(best_container))
+        content = '\n\n'.join(t for t in texts if t)
+    else:
+        print(f"Warning: Could not find specific article container for {url}. Falling back to body paragraphs.")
+        texts = (_stripped_text(p) for p in _paragraphs(root))
+        content = '\n\n'.join(t for t in texts if len(t) > MIN_FALLBACK_PARAGRAPH_CHARS)
+    return content.strip()
+
+
+def extract_article_text_soup(html, url):
+    """
+    Reference BeautifulSoup implementation of the extraction heuristic.
+    Kept for equivalence checks and benchmarks; calls get_text() on every
+    candidate container, so nested layouts make it quadratic.
+    """
+    soup = BeautifulSoup(html, 'lxml') # Use lxml for better parsing
+
+    # Remove common non-content elements
+    for element in soup(list(BOILERPLATE_TAGS)):
+        element.decompose()
+
+    # --- Content Extraction Logic ---
+    # 1. Try common article tags/classes
+    potential_containers = soup.find_all(['article', 'main', 'section'])
+    if not potential_containers:
+        # 2. Try divs with common content-related IDs or classes
+        potential_containers = soup.find_all('div', id=lambda x: x and ('content' in x or 'article' in x or 'post' in x or 'body' in x))
+        if not potential_containers:
+             potential_containers = soup.find_all('div', class_=lambda x: x and any(c in x for c in ['content', 'article', 'post', 'body', 'story', 'main']))
+
+    # 3. If specific containers found, prioritize the largest one
+    best_container = None
+    if potential_containers:
+        best_container = max(potential_containers, key=lambda tag: len(tag.get_text(strip=True)))
+
+    # 4. Extract text: from best container or fallback to body paragraphs
+    if best_container:
+        # Get text, ensuring paragraphs are separated
+        paragraphs = best_container.find_all('p')
+        content = '\n\n'.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+    else:
+        # Fallback: Get all paragraphs from the body, filter short ones
+        print(f"Warning: Could not find specific article container for {url}. Falling back to body paragraphs.")
+        all_paragraphs = soup.find_all('p')
+        content = '\n\n'.join(p.get_text(strip=True) for p in all_paragraphs if len(p.get_text(strip=True)) > 50) # Min paragraph length
+
+    # Basic cleanup
+    return content.strip()
@@ -1,17 +1,142 @@
+import os
+import threading
+import traceback
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin # Added urljoin
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse, urljoin, urlunparse # Added urljoin
 import time # Added for potential delays
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from web_scraper.page_cache import PageCache
+from web_scraper.search_cache import SearchCache, normalize_query
+from web_scraper.extractor import extract_article_text
+from pipeline.singleflight import SingleFlight
+from pipeline.deadline import DeadlineExceeded, budget_timeout, remaining_time, submit_with_context
+from pipeline.metrics import CACHE_LOOKUPS, observe_upstream, track_stage
 
 # Consider a more robust user agent
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# --- Fetch Engine Settings ---
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "15"))
+SCRAPE_MAX_WORKERS = int(os.getenv("SCRAPE_MAX_WORKERS", "8")) # Cap on total concurrent scrapes
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+SCRAPE_HOST_DELAY = float(os.getenv("SCRAPE_HOST_DELAY", "0.5")) # Min seconds between request starts to one host
+
+# --- Page Cache Settings ---
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1").lower() in ("1", "true", "yes", "on")
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", os.path.join('cache', 'pages.sqlite3'))
+PAGE_CACHE_FRESH_SECONDS = float(os.getenv("PAGE_CACHE_FRESH_SECONDS", "3600")) # Served without revalidation
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", "512"))
+EXTRACTOR_VERSION = "1" # Bump when extract_article_text changes so cached text is re-extracted
+
+page_cache = PageCache(PAGE_CACHE_PATH, PAGE_CACHE_FRESH_SECONDS, PAGE_CACHE_MAX_MB * 1024 * 1024) if PAGE_CACHE_ENABLED else None
+
+# --- Search Settings ---
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "20"))
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1").lower() in ("1", "true", "yes", "on")
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join('cache', 'searches.sqlite3'))
+SEARCH_CACHE_FRESH_SECONDS = float(os.getenv("SEARCH_CACHE_FRESH_SECONDS", "900")) # Served without a refresh
+SEARCH_CACHE_STALE_SECONDS = float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "86400")) # Served while a background search refreshes it
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+search_cache = SearchCache(SEARCH_CACHE_PATH, SEARCH_CACHE_FRESH_SECONDS, SEARCH_CACHE_STALE_SECONDS, SEARCH_CACHE_MAX_ENTRIES) if SEARCH_CACHE_ENABLED else None
+search_refresh_executor = ThreadPoolExecutor(max_workers=max(1, int(os.getenv("SEARCH_REFRESH_WORKERS", "2"))), thread_name_prefix="search-refresh")
+
+
+def _build_session():
+    """Creates a keep-alive session whose connection pool matches the worker count."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=SCRAPE_MAX_WORKERS, pool_maxsize=SCRAPE_MAX_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Shared across all scrapes so connections to the same host are reused
+http_session = _build_session()
+
+
+class HostRateLimiter:
+    """
+    Per-host politeness limiter: caps concurrent requests to one host and
+    spaces out request starts by a minimum delay. Different hosts never
+    wait on each other.
+    """
+
+    def __init__(self, per_host_concurrency=2, min_delay=0.5):
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.min_delay = max(0.0, min_delay)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return self._semaphores[host]
+
+    def acquire(self, host):
+        """Blocks until a request to `host` may start."""
+        self._semaphore(host).acquire()
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start_at + self.min_delay
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+
+host_limiter = HostRateLimiter(SCRAPE_PER_HOST_CONCURRENCY, SCRAPE_HOST_DELAY)
+scrape_executor = ThreadPoolExecutor(max_workers=max(1, SCRAPE_MAX_WORKERS), thread_name_prefix="scrape")
+
+
+def polite_get(url, headers=None, timeout=None):
+    """GETs a URL through the shared session, respecting the per-host limiter."""
+    host = urlparse(url).netloc.lower()
+    host_limiter.acquire(host)
+    start = time.perf_counter(); outcome = "error"
+    try:
+        response = http_session.get(url, headers=headers, timeout=timeout or budget_timeout(SCRAPE_TIMEOUT)) # Shrinks with the request's remaining budget
+        outcome = "ok" if response.status_code < 400 else "http_error"
+        return response
+    except requests.exceptions.Timeout: outcome = "timeout"; raise
+    finally:
+        host_limiter.release(host)
+        observe_upstream("scrape", outcome, time.perf_counter() - start)
+
+
+def is_usable_content(content):
+    """True when a scrape result looks like article text rather than an error message."""
+    return bool(content) and isinstance(content, str) and "error" not in content.lower() and "no extractable" not in content.lower()
+
+scrape_flights = SingleFlight("scrape") # Concurrent requests for one URL share a single fetch
+search_flights = SingleFlight("search")
+
+def normalize_url(url):
+    """Canonical form used to key URLs: scheme added if missing, lowercase scheme/host, no fragment or default port."""
+    url = url.strip()
+    parsed = urlparse(url if '://' in url else 'https://' + url)
+    scheme = parsed.scheme.lower(); netloc = parsed.netloc.lower()
+    if (scheme, netloc.rsplit(':', 1)[-1]) in (('http', '80'), ('https', '443')): netloc = netloc.rsplit(':', 1)[0]
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, parsed.query, ''))
+
+@track_stage("scrape", is_error=lambda content: not is_usable_content(content))
 def scrape_article_content(url):
+    """Scrapes an article's text (see fetch_article_content); concurrent calls for the same URL are coalesced."""
+    return scrape_flights.do(normalize_url(url), lambda: fetch_article_content(url))
+
+def fetch_article_content(url):
     """
     Scrapes the main textual content from a given news article URL.
     Improved with basic error handling and content extraction logic.
+    Pages are served from the local page cache when fresh, and revalidated
+    with a conditional GET when stale.
     """
     try:
         # Add http scheme if missing
@@ -19,7 +144,23 @@ def scrape_article_content(url):
         if not parsed_url.scheme:
             url = 'https://' + url
 
-        response = requests.get(url, headers=HEADERS, timeout=15) # Increased timeout
+        cached = page_cache.get(url) if page_cache else None
+        if cached and cached['extractor_version'] != EXTRACTOR_VERSION and cached['body']:
+            # Extraction logic changed since this page was stored: re-extract from the cached body
+            cached['text'] = extract_article_text(cached['body'], url)
+            page_cache.update_text(url, cached['text'], EXTRACTOR_VERSION)
+        if cached and cached['is_fresh'] and cached['text']:
+            page_cache.record_hit(); CACHE_LOOKUPS.inc(cache="pages", result="hit")
+            print(f"Page cache hit for {url} (~{len(cached['text'])} characters)")
+            return cached['text']
+
+        # Shared keep-alive session + per-host politeness
+        response = polite_get(url, headers=PageCache.conditional_headers(cached) if cached and cached['text'] else None)
+        if response.status_code == 304 and cached and cached['text']:
+            page_cache.touch(url); page_cache.record_hit(revalidated=True); CACHE_LOOKUPS.inc(cache="pages", result="revalidated")
+            print(f"Page not modified, using cached content for {url}")
+            return cached['text']
+        if page_cache: CACHE_LOOKUPS.inc(cache="pages", result="miss")
         response.raise_for_status() # Check for HTTP errors
 
         # Check content type - proceed only if likely HTML
@@ -27,46 +168,19 @@ def scrape_article_content(url):
         if 'html' not in content_type:
             return f"Error: URL {url} does not point to an HTML page (Content-Type: {content_type})."
 
-        soup = BeautifulSoup(response.content, 'lxml') # Use lxml for better parsing
-
-        # Remove common non-content elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'aside', 'header', 'form', 'button', 'input', 'select', 'textarea']):
-            element.decompose()
-
-        # --- Content Extraction Logic ---
-        # 1. Try common article tags/classes
-        potential_containers = soup.find_all(['article', 'main', 'section'])
-        if not potential_containers:
-            # 2. Try divs with common content-related IDs or classes
-            potential_containers = soup.find_all('div', id=lambda x: x and ('content' in x or 'article' in x or 'post' in x or 'body' in x))
-            if not potential_containers:
-                 potential_containers = soup.find_all('div', class_=lambda x: x and any(c in x for c in ['content', 'article', 'post', 'body', 'story', 'main']))
-
-        # 3. If specific containers found, prioritize the largest one
-        best_container = None
-        if potential_containers:
-            best_container = max(potential_containers, key=lambda tag: len(tag.get_text(strip=True)))
-
-        # 4. Extract text: from best container or fallback to body paragraphs
-        if best_container:
-            # Get text, ensuring paragraphs are separated
-            paragraphs = best_container.find_all('p')
-            content = '\n\n'.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
-        else:
-            # Fallback: Get all paragraphs from the body, filter short ones
-            print(f"Warning: Could not find specific article container for {url}. Falling back to body paragraphs.")
-            all_paragraphs = soup.find_all('p')
-            content = '\n\n'.join(p.get_text(strip=True) for p in all_paragraphs if len(p.get_text(strip=True)) > 50) # Min paragraph length
-
-        # Basic cleanup
-        content = content.strip()
+        content = extract_article_text(response.content, url)
 
         if not content:
             return f"Error: No extractable article content found at {url} after filtering."
 
+        if page_cache:
+            page_cache.store(url, response.content, content_type, response.headers.get('ETag'),
+                             response.headers.get('Last-Modified'), content, EXTRACTOR_VERSION)
         print(f"Successfully scraped ~{len(content)} characters from {url}")
         return content
 
+    except DeadlineExceeded:
+        return f"Error: Latency budget exhausted before scraping URL {url}."
     except requests.exceptions.Timeout:
         return f"Error: Request timed out for URL {url}."
     except requests.exceptions.HTTPError as e:
@@ -87,22 +201,73 @@ try:
 except ImportError:
     print("Error: duckduckgo_search library not found. Please install it: pip install -U duckduckgo_search")
     # Define dummy functions or raise error if DDGS is critical
-    def search_article_urls(topic, max_results=5): return []
+    def search_article_urls(topic, max_results=5, use_cache=True): return []
     DDGS = None
 
 
-def search_article_urls(topic, max_results=5):
-    """Searches DuckDuckGo for article URLs related to a topic."""
+@track_stage("search", is_error=lambda urls: not urls) # No URLs fails a topic analysis
+def search_article_urls(topic, max_results=5, use_cache=True):
+    """
+    Searches DuckDuckGo for article URLs related to a topic. Identical concurrent searches share one query.
+    Cached results are returned without searching; stale ones are refreshed in the background meanwhile.
+    `use_cache=False` always searches (and still updates the cache).
+    """
     if DDGS is None:
          return [] # Return empty list if library failed to import
+    cached = search_cache.get(topic, max_results) if search_cache and use_cache else None
+    if cached is not None:
+        CACHE_LOOKUPS.inc(cache="search", result="hit" if cached["is_fresh"] else "stale")
+        if not cached["is_fresh"]:
+            print(f"Serving cached search results for '{topic}' ({cached['age'] / 60:.0f} min old), refreshing in the background.")
+            refresh_search(topic, cached["max_results"]) # Refresh the whole entry so larger requests stay covered
+        return cached["urls"]
+    if search_cache and use_cache: CACHE_LOOKUPS.inc(cache="search", result="miss")
+    return search_and_store(topic, max_results)
+
+
+def search_and_store(topic, max_results=5):
+    """Runs the search (coalesced with identical in-flight ones) and caches a non-empty result."""
+    def search():
+        urls = run_search(topic, max_results)
+        if search_cache: search_cache.store(topic, max_results, urls)
+        return urls
+    return search_flights.do((normalize_query(topic), max_results), search)
+
 
-    urls = []
+refreshing_searches = set()
+refreshing_searches_lock = threading.Lock()
+
+def refresh_search(topic, max_results=5):
+    """Queues a background search that updates the cache; returns False if one is already queued for this query."""
+    key = (normalize_query(topic), max_results)
+    with refreshing_searches_lock:
+        if key in refreshing_searches: return False
+        refreshing_searches.add(key)
+    def refresh():
+        try: search_and_store(topic, max_results) # Outside any request: no latency budget applies
+        except Exception as e: print(f"Warning: Background search refresh for '{topic}' failed: {e}")
+        finally:
+            with refreshing_searches_lock: refreshing_searches.discard(key)
+    search_refresh_executor.submit(refresh)
+    return True
+
+
+def prefetch_searches(topics, max_results=5):
+    """Warms the search cache for `topics` (e.g. popular ones) that lack a fresh entry; returns how many searches were queued."""
+    if DDGS is None or search_cache is None: return 0
+    return sum(1 for topic in topics if not search_cache.is_fresh(topic, max_results) and refresh_search(topic, max_results))
+
+
+def run_search(topic, max_results=5):
+    """Runs one DuckDuckGo text search (see search_article_urls)."""
+
+    urls = []; start = time.perf_counter()
     try:
         print(f"Searching DuckDuckGo for: {topic} (max_results={max_results})")
         # Use DDGS context manager
-        with DDGS(headers=HEADERS, timeout=20) as ddgs:
+        with DDGS(headers=HEADERS, timeout=max(1, int(budget_timeout(SEARCH_TIMEOUT)))) as ddgs:
             # Iterate through results - text search often yields good news links
-            for r in ddgs.text(topic, max_results=max_results * 2): # Fetch more to filter later if needed
+            for r in ddgs.text(topic, max_results=max_results):
                 if 'href' in r:
                     # Basic filtering: avoid common non-article domains if needed
                     # parsed_href = urlparse(r['href'])
@@ -111,37 +276,70 @@ def search_article_urls(topic, max_results=5):
                 if len(urls) >= max_results:
                     break # Stop once we have enough URLs
         print(f"Found {len(urls)} potential URLs.")
+        observe_upstream("duckduckgo", "ok", time.perf_counter() - start)
         return urls
     except Exception as e:
+        observe_upstream("duckduckgo", "error", time.perf_counter() - start)
         print(f"Error during DuckDuckGo search for '{topic}': {e}")
         return [] # Return empty list on error
 
 
-def fetch_articles_for_topic(topic, max_articles=5):
-    """Searches for a topic and scrapes content for the found URLs."""
+def fetch_articles_for_topic(topic, max_articles=5, stop_after=None):
+    """
+    Searches for a topic and scrapes the found URLs in parallel.
+    Results keep the search order. If `stop_after` is set, returns as soon as
+    that many usable articles have been scraped and drops the remaining ones.
+    """
     print(f"--- Fetching and scraping articles for topic: {topic} ---")
     urls = search_article_urls(topic, max_results=max_articles)
 
-    results = []
     if not urls:
         print("No URLs found for the topic.")
-        return results
+        return []
 
-    for i, url in enumerate(urls):
+    results = scrape_urls(urls, stop_after=stop_after)
+    print(f"--- Finished processing for topic: {topic} ---")
+    return results
+
+
+def scrape_urls(urls, stop_after=None):
+    """
+    Scrapes `urls` in parallel within the current latency budget and returns
+    [{'url', 'content'}] in input order (see fetch_articles_for_topic).
+    """
+    results = []
+
+    def scrape(i, url):
         print(f"\n🔗 ({i+1}/{len(urls)}) Scraping: {url}")
-        # Add a small delay between requests to be polite
-        time.sleep(0.5)
-        content = scrape_article_content(url)
-        results.append({
-            'url': url,
-            'content': content # Return full content or error message
-        })
-        # Optional: Stop early if enough successful scrapes occur
-        # successful_scrapes = sum(1 for r in results if 'error' not in r.get('content', '').lower())
-        # if successful_scrapes >= max_articles:
-        #     break
+        return scrape_article_content(url)
 
-    print(f"--- Finished processing for topic: {topic} ---")
+    futures = {submit_with_context(scrape_executor, scrape, i, url): i for i, url in enumerate(urls)}
+    contents = {}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=remaining_time(), return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                future.cancel()
+            print(f"Latency budget exhausted, returning {len(contents)} of {len(urls)} scraped URL(s).")
+            break
+        for future in done:
+            try:
+                contents[futures[future]] = future.result()
+            except Exception as e:
+                contents[futures[future]] = f"Error: Unexpected error during scraping: {e}"
+        if stop_after and sum(1 for c in contents.values() if is_usable_content(c)) >= stop_after:
+            for future in pending:
+                future.cancel() # Queued scrapes are dropped; running ones finish in the background
+            print(f"Early stop: {stop_after} usable articles scraped, skipping {len(pending)} remaining URL(s).")
+            break
+
+    for i, url in enumerate(urls):
+        if i in contents:
+            results.append({
+                'url': url,
+                'content': contents[i] # Return full content or error message
+            })
     return results
 
 
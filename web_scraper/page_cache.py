@@ -0,0 +1,126 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+class PageCache:
+    """
+    On-disk HTTP page cache for scraped articles, backed by SQLite.
+
+    Each entry keeps the raw response body together with its ETag and
+    Last-Modified validators and the text extracted from it. Entries younger
+    than `fresh_seconds` are served without touching the network; older ones
+    are revalidated with a conditional GET. The table is bounded by total
+    stored bytes and evicts the least recently used pages first.
+    """
+
+    def __init__(self, path, fresh_seconds=3600, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        self._counters = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._total_bytes = 0
+        self._conn = None
+        directory = os.path.dirname(path)
+        try:
+            if directory and not os.path.exists(directory): os.makedirs(directory)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, body BLOB NOT NULL, content_type TEXT, etag TEXT, last_modified TEXT,
+                text TEXT, extractor_version TEXT, size INTEGER NOT NULL, fetched_at REAL NOT NULL, last_access REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+            self._conn.commit()
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open page cache {path}: {e}. Page caching disabled.")
+            self._conn = None
+
+    @property
+    def enabled(self):
+        return self._conn is not None
+
+    def get(self, url):
+        """Returns the cached entry for `url` as a dict (with an `is_fresh` flag), or None."""
+        if self._conn is None: return None
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT body, content_type, etag, last_modified, text, extractor_version, fetched_at FROM pages WHERE url = ?",
+                    (url,)).fetchone()
+                if row is None:
+                    self._counters["misses"] += 1
+                    return None
+                self._conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url)); self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Page cache read failed for {url}: {e}")
+                return None
+        body, content_type, etag, last_modified, text, extractor_version, fetched_at = row
+        return {
+            "body": body, "content_type": content_type, "etag": etag, "last_modified": last_modified,
+            "text": text, "extractor_version": extractor_version, "fetched_at": fetched_at,
+            "is_fresh": (time.time() - fetched_at) < self.fresh_seconds,
+        }
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since headers for revalidating a cached entry."""
+        headers = {}
+        if entry and entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_hit(self, revalidated=False):
+        with self._lock:
+            self._counters["revalidated" if revalidated else "fresh_hits"] += 1
+
+    def touch(self, url):
+        """Marks a cached page as freshly validated (after a 304 response)."""
+        if self._conn is None: return
+        with self._lock:
+            try: self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url)); self._conn.commit()
+            except sqlite3.Error as e: print(f"Warning: Page cache update failed for {url}: {e}")
+
+    def update_text(self, url, text, extractor_version):
+        """Replaces the extracted text of a cached page (e.g. after the extractor changed)."""
+        if self._conn is None: return
+        with self._lock:
+            try:
+                self._conn.execute("UPDATE pages SET text = ?, extractor_version = ? WHERE url = ?", (text, extractor_version, url))
+                self._conn.commit()
+            except sqlite3.Error as e: print(f"Warning: Page cache update failed for {url}: {e}")
+
+    def store(self, url, body, content_type, etag, last_modified, text, extractor_version):
+        """Stores (or replaces) a fetched page and its extracted text."""
+        if self._conn is None: return
+        size = len(body or b"") + len((text or "").encode('utf-8'))
+        if self.max_bytes and size > self.max_bytes: return
+        now = time.time()
+        with self._lock:
+            try:
+                old = self._conn.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pages (url, body, content_type, etag, last_modified, text, extractor_version, size, fetched_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, sqlite3.Binary(body or b""), content_type, etag, last_modified, text, extractor_version, size, now, now))
+                self._total_bytes += size - (old[0] if old else 0); self._counters["stores"] += 1
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Page cache write failed for {url}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "total_bytes": self._total_bytes}
+
+    def _evict(self):
+        # Caller holds self._lock
+        while self.max_bytes and self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT url, size FROM pages ORDER BY last_access ASC LIMIT 32").fetchall()
+            if not rows: break
+            for url, size in rows:
+                if self._total_bytes <= self.max_bytes: break
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._total_bytes -= size; self._counters["evictions"] += 1
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+def normalize_query(query):
+    """Cache key for a search query: lowercase with collapsed whitespace."""
+    return " ".join(str(query).lower().split())
+
+
+class SearchCache:
+    """
+    On-disk cache of search result URLs per normalized query, backed by SQLite.
+
+    Entries younger than `fresh_seconds` are served as is. Older entries are
+    still served until `stale_seconds` (stale-while-revalidate: the caller
+    refreshes them in the background); after that they count as misses.
+    An entry holds the URLs of the largest `max_results` searched so far, so
+    smaller requests for the same query are served from it too. The table is
+    bounded by `max_entries` and evicts the least recently used queries first.
+    """
+
+    def __init__(self, path, fresh_seconds=900, stale_seconds=86400, max_entries=5000):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = max(stale_seconds, fresh_seconds)
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._conn = None
+        directory = os.path.dirname(path)
+        try:
+            if directory and not os.path.exists(directory): os.makedirs(directory)
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS searches (
+                query_key TEXT PRIMARY KEY, query TEXT NOT NULL, max_results INTEGER NOT NULL, urls TEXT NOT NULL,
+                fetched_at REAL NOT NULL, last_access REAL NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_last_access ON searches(last_access)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not open search cache {path}: {e}. Search caching disabled.")
+            self._conn = None
+
+    @property
+    def enabled(self):
+        return self._conn is not None
+
+    def get(self, query, max_results):
+        """
+        Returns {"urls", "age", "is_fresh", "max_results"} for a cached search that
+        covers `max_results`, or None (missing, too small or older than stale_seconds).
+        `max_results` in the result is the entry's own size, for refreshing it whole.
+        """
+        if self._conn is None: return None
+        key = normalize_query(query)
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT max_results, urls, fetched_at FROM searches WHERE query_key = ?", (key,)).fetchone()
+                age = time.time() - row[2] if row else None
+                if row is None or row[0] < max_results or age >= self.stale_seconds:
+                    self._counters["misses"] += 1
+                    return None
+                self._conn.execute("UPDATE searches SET last_access = ? WHERE query_key = ?", (time.time(), key)); self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Search cache read failed for '{query}': {e}")
+                return None
+            is_fresh = age < self.fresh_seconds
+            self._counters["fresh_hits" if is_fresh else "stale_hits"] += 1
+        return {"urls": json.loads(row[1])[:max_results], "age": age, "is_fresh": is_fresh, "max_results": row[0]}
+
+    def is_fresh(self, query, max_results):
+        """True if a fresh entry covers `max_results` (does not count as a lookup)."""
+        if self._conn is None: return False
+        with self._lock:
+            try: row = self._conn.execute("SELECT max_results, fetched_at FROM searches WHERE query_key = ?", (normalize_query(query),)).fetchone()
+            except sqlite3.Error: return False
+        return bool(row) and row[0] >= max_results and time.time() - row[1] < self.fresh_seconds
+
+    def store(self, query, max_results, urls):
+        """
+        Stores the URLs found for a query; empty results (failed searches) are not cached.
+        A smaller search does not replace a larger entry unless that one is past stale_seconds.
+        """
+        if self._conn is None or not urls: return
+        now = time.time()
+        with self._lock:
+            try:
+                stored = self._conn.execute(
+                    "INSERT INTO searches (query_key, query, max_results, urls, fetched_at, last_access) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(query_key) DO UPDATE SET query = excluded.query, max_results = excluded.max_results, urls = excluded.urls, "
+                    "fetched_at = excluded.fetched_at, last_access = excluded.last_access "
+                    "WHERE excluded.max_results >= searches.max_results OR searches.fetched_at < ?",
+                    (normalize_query(query), query, max_results, json.dumps(urls), now, now, now - self.stale_seconds)).rowcount
+                self._counters["stores"] += stored
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Search cache write failed for '{query}': {e}")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0] if self._conn else 0
+            return {**self._counters, "entries": entries}
+
+    def _evict(self):
+        # Caller holds self._lock
+        if not self.max_entries: return
+        excess = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute("DELETE FROM searches WHERE query_key IN (SELECT query_key FROM searches ORDER BY last_access ASC LIMIT ?)", (excess,))
+            self._counters["evictions"] += excess